@@ -0,0 +1,149 @@
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.flows import FLOWS, TICK_SIZE, seed_book
+from trade.order_matching import OrderBook
+from trade.replay import REPLAY_EPOCH
+
+# Run with ``python -m benchmarks.bench_matching`` from the repository root.
+# Every (flow, depth) case runs in a fresh process, so its peak RSS is its
+# own, and each operation is timed on its own to get latency percentiles.
+# Operations are reported as add (an order that rested without trading),
+# match (an order that traded) and cancel.
+
+DEFAULT_DEPTHS = (10, 100, 1_000, 10_000, 100_000)
+PERCENTILES = (('p50', 0.50), ('p99', 0.99), ('p99_9', 0.999))
+
+def run_case(flow: str, depth: int, events: int, seed: int) -> dict:
+    """Seed a book ``depth`` levels deep, then time ``events`` events of ``flow`` against it."""
+    book = OrderBook(tick_size=TICK_SIZE, clock=lambda: REPLAY_EPOCH)
+    book.add_orders(order for _, order in seed_book(depth))
+    stream = list(FLOWS[flow](seed, events, depth))
+
+    latencies: Dict[str, List[int]] = {'add': [], 'match': [], 'cancel': []}
+    add_order = book.add_order
+    cancel_order = book.cancel_order
+    clock = time.perf_counter_ns
+    start = clock()
+    for action, payload in stream:
+        if action == 'add':
+            before = clock()
+            trades = add_order(payload)
+            elapsed = clock() - before
+            latencies['match' if trades else 'add'].append(elapsed)
+        else:
+            before = clock()
+            cancel_order(payload)
+            latencies['cancel'].append(clock() - before)
+    seconds = (clock() - start) / 1e9
+
+    return {
+        'flow': flow,
+        'depth': depth,
+        'events': len(stream),
+        'seconds': seconds,
+        'events_per_second': len(stream) / seconds if seconds else None,
+        'operations': {name: _summarize(values) for name, values in latencies.items()},
+        'levels': {'bids': len(book.bids), 'asks': len(book.asks)},
+        'peak_rss_kb': _peak_rss_kb(),
+    }
+
+def _summarize(latencies: List[int]) -> dict:
+    if not latencies:
+        return {'count': 0}
+    latencies.sort()
+    count = len(latencies)
+    summary = {'count': count, 'ops_per_second': count / (sum(latencies) / 1e9)}
+    # Nearest-rank percentiles, in nanoseconds
+    for name, quantile in PERCENTILES:
+        summary[f'{name}_ns'] = latencies[min(count - 1, int(quantile * count))]
+    summary['max_ns'] = latencies[-1]
+    return summary
+
+def _peak_rss_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(flows, depths, events: int, seed: int) -> dict:
+    context = mp.get_context('spawn')
+    cases = []
+    for flow in flows:
+        for depth in depths:
+            # One process per case so peak RSS and heap state do not carry over
+            with context.Pool(1) as pool:
+                case = pool.apply(run_case, (flow, depth, events, seed))
+            _print_case(case)
+            cases.append(case)
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'events': events,
+        'cases': cases,
+    }
+
+def _print_case(case: dict):
+    parts = [f"{case['flow']:>12} depth={case['depth']:<7} {case['events_per_second']:>10,.0f} events/s"]
+    for name, summary in case['operations'].items():
+        if summary['count']:
+            parts.append(f"{name} p50={summary['p50_ns'] / 1000:.1f}us p99.9={summary['p99_9_ns'] / 1000:.1f}us")
+    parts.append(f"rss={case['peak_rss_kb'] / 1024:.0f}MB")
+    print('  '.join(parts), flush=True)
+
+def compare(baseline: dict, current: dict):
+    """Print each case's throughput and p99 latency relative to a baseline run."""
+    previous = {(case['flow'], case['depth']): case for case in baseline['cases']}
+    print(f"Compared with {baseline.get('commit') or 'baseline'} (ratios above 1 are slower)")
+    for case in current['cases']:
+        old = previous.get((case['flow'], case['depth']))
+        if old is None:
+            continue
+        parts = [f"{case['flow']:>12} depth={case['depth']:<7} "
+                 f"throughput x{old['events_per_second'] / case['events_per_second']:.2f}"]
+        for name, summary in case['operations'].items():
+            old_summary = old['operations'].get(name, {})
+            if summary['count'] and old_summary.get('count'):
+                parts.append(f"{name} p99 x{summary['p99_ns'] / old_summary['p99_ns']:.2f}")
+        print('  '.join(parts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the order matcher on synthetic order flow")
+    parser.add_argument('--flows', default=','.join(FLOWS), help="Comma-separated flows to run")
+    parser.add_argument('--depths', default=','.join(map(str, DEFAULT_DEPTHS)),
+                        help="Comma-separated book depths (price levels per side)")
+    parser.add_argument('--events', type=int, default=100_000, help="Timed events per case")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the order flow generators")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    flows = args.flows.split(',')
+    unknown = [flow for flow in flows if flow not in FLOWS]
+    if unknown:
+        parser.error(f"Unknown flows {', '.join(unknown)}; choose from {', '.join(FLOWS)}")
+    results = run_suite(flows, [int(depth) for depth in args.depths.split(',')], args.events, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
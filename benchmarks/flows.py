@@ -0,0 +1,120 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from typing import Iterator, List
+
+from trade.order_matching import Order
+from trade.replay import REPLAY_EPOCH, ReplayEvent
+
+# Synthetic order flow for benchmarking the matcher. Every generator takes a
+# seed and yields replay events (see trade.replay), so the same seed always
+# produces the same stream and a stream can also be fed to replay().
+# Prices are whole ticks around MID_TICKS; ``depth`` is the number of price
+# levels per side the flow spreads its resting orders over.
+
+TICK_SIZE = Decimal('0.01')
+MID_TICKS = 100_000
+SYMBOL = 'BENCH'
+
+def power_law_size(rng: random.Random, alpha: float = 1.5, minimum: int = 1, maximum: int = 10_000) -> int:
+    """Pareto-distributed order size: mostly small orders with a heavy tail."""
+    return min(maximum, int(minimum * (1.0 - rng.random()) ** (-1.0 / alpha)))
+
+def level_offset(rng: random.Random, depth: int) -> int:
+    """Distance from the touch in levels, 1 to ``depth``, concentrated near the top of the book."""
+    return min(depth, power_law_size(rng, alpha=1.2))
+
+def price(ticks: int) -> Decimal:
+    return ticks * TICK_SIZE
+
+class _Flow:
+    """Shared bookkeeping: order ids, Poisson arrival times and resting ids to cancel."""
+    def __init__(self, seed: int, depth: int, rate: float = 100_000.0):
+        self.rng = random.Random(seed)
+        self.depth = depth
+        self.rate = rate
+        self.count = 0
+        self.time = REPLAY_EPOCH
+        self.resting: List[str] = []
+
+    def arrival(self):
+        # Exponential gaps between arrivals make a Poisson process of ``rate`` events per second
+        self.time += timedelta(seconds=self.rng.expovariate(self.rate))
+        return self.time
+
+    def passive(self, quantity: int) -> ReplayEvent:
+        side = self.rng.choice(('BUY', 'SELL'))
+        offset = level_offset(self.rng, self.depth)
+        ticks = MID_TICKS - offset if side == 'BUY' else MID_TICKS + offset
+        self.count += 1
+        order_id = f'p{self.count}'
+        self.resting.append(order_id)
+        return 'add', Order(order_id, SYMBOL, side, price(ticks), quantity, self.arrival())
+
+    def aggressive(self, quantity: int, levels: int = 1) -> ReplayEvent:
+        # IOC so an unfilled remainder never rests across the mid
+        side = self.rng.choice(('BUY', 'SELL'))
+        ticks = MID_TICKS + levels if side == 'BUY' else MID_TICKS - levels
+        self.count += 1
+        return 'add', Order(f'a{self.count}', SYMBOL, side, price(ticks), quantity, self.arrival(),
+                            time_in_force='IOC')
+
+    def cancel(self) -> ReplayEvent:
+        # Swap-remove a random resting id; it may have traded since, making the cancel a miss
+        resting = self.resting
+        index = self.rng.randrange(len(resting))
+        resting[index], resting[-1] = resting[-1], resting[index]
+        self.arrival()
+        return 'cancel', resting.pop()
+
+def seed_book(depth: int, orders_per_level: int = 2, quantity: int = 100) -> Iterator[ReplayEvent]:
+    """Resting orders on ``depth`` levels each side of the mid, to start a benchmark from."""
+    count = 0
+    for offset in range(1, depth + 1):
+        for side, ticks in (('BUY', MID_TICKS - offset), ('SELL', MID_TICKS + offset)):
+            for _ in range(orders_per_level):
+                count += 1
+                yield 'add', Order(f's{count}', SYMBOL, side, price(ticks), quantity, REPLAY_EPOCH)
+
+def poisson_flow(seed: int, events: int, depth: int) -> Iterator[ReplayEvent]:
+    """Poisson arrivals of power-law sized orders: 60% passive, 15% marketable, 25% cancels."""
+    flow = _Flow(seed, depth)
+    rng = flow.rng
+    for _ in range(events):
+        draw = rng.random()
+        if draw < 0.25 and flow.resting:
+            yield flow.cancel()
+        elif draw < 0.40:
+            yield flow.aggressive(power_law_size(rng))
+        else:
+            yield flow.passive(power_law_size(rng))
+
+def market_maker_flow(seed: int, events: int, depth: int) -> Iterator[ReplayEvent]:
+    """Cancel-heavy quoting: small quotes near the touch, most cancelled before they trade."""
+    flow = _Flow(seed, min(depth, 10))
+    rng = flow.rng
+    for _ in range(events):
+        draw = rng.random()
+        if draw < 0.50 and flow.resting:
+            yield flow.cancel()
+        elif draw < 0.55:
+            yield flow.aggressive(power_law_size(rng, maximum=500))
+        else:
+            yield flow.passive(rng.randint(1, 10) * 10)
+
+def sweep_flow(seed: int, events: int, depth: int) -> Iterator[ReplayEvent]:
+    """Aggressors that take out several levels at once, with passive orders refilling the book."""
+    flow = _Flow(seed, depth)
+    rng = flow.rng
+    for _ in range(events):
+        if rng.random() < 0.10:
+            levels = rng.randint(2, 20)
+            yield flow.aggressive(levels * rng.randint(100, 300), levels)
+        else:
+            yield flow.passive(power_law_size(rng, maximum=1_000))
+
+FLOWS = {
+    'poisson': poisson_flow,
+    'market_maker': market_maker_flow,
+    'sweep': sweep_flow,
+}
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from typing import List
+
+from benchmarks.flows import FLOWS, TICK_SIZE, seed_book
+from trade.gateway import OrderGateway
+
+# Run with ``python -m benchmarks.load_gateway`` from the repository root.
+# Starts an OrderGateway on a Unix socket in this process and connects many
+# simulated NDJSON clients to it, each sending its own seeded flow, then
+# reports request throughput and request-to-response latency percentiles.
+
+def _requests(flow: str, client: int, events: int, depth: int, seed: int) -> List[bytes]:
+    lines = []
+    prefix = f'c{client}-'
+    for action, payload in FLOWS[flow](seed + client, events, depth):
+        if action == 'add':
+            message = {'action': 'add', 'symbol': payload.symbol, 'order_id': prefix + payload.order_id,
+                       'side': payload.side, 'price': str(payload.price), 'quantity': payload.quantity,
+                       'time_in_force': payload.time_in_force}
+        else:
+            message = {'action': 'cancel', 'symbol': 'BENCH', 'order_id': prefix + payload}
+        lines.append(json.dumps(message).encode() + b'\n')
+    return lines
+
+async def _client(path: str, requests: List[bytes], latencies: List[int], window: int, chunk: int = 64):
+    reader, writer = await asyncio.open_unix_connection(path)
+    sent: List[int] = []
+    answered = 0
+    progress = asyncio.Event()
+
+    async def send():
+        for start in range(0, len(requests), chunk):
+            # Keep at most ``window`` requests unanswered, so latency is the gateway's, not our backlog's
+            while len(sent) - answered >= window:
+                progress.clear()
+                await progress.wait()
+            now = time.perf_counter_ns()
+            sent.extend([now] * len(requests[start:start + chunk]))
+            writer.writelines(requests[start:start + chunk])
+            # Waits while the gateway is not reading: its inbound queue is full
+            await writer.drain()
+        writer.write_eof()
+
+    async def receive():
+        # Every request gets exactly one ack or reject, in request order
+        nonlocal answered
+        while answered < len(requests):
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith((b'{"type":"ack"', b'{"type":"reject"')):
+                latencies.append(time.perf_counter_ns() - sent[answered])
+                answered += 1
+                progress.set()
+
+    await asyncio.gather(send(), receive())
+    writer.close()
+
+async def run(clients: int, events: int, flow: str, depth: int, seed: int, queue_size: int,
+              window: int) -> dict:
+    gateway = OrderGateway(TICK_SIZE, queue_size=queue_size)
+    gateway.book('BENCH').add_orders(order for _, order in seed_book(depth))
+    path = os.path.join(tempfile.mkdtemp(), 'gateway.sock')
+    await gateway.start_unix(path)
+    requests = [_requests(flow, client, events, depth, seed) for client in range(clients)]
+    latencies: List[int] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(path, client_requests, latencies, window) for client_requests in requests))
+    seconds = time.perf_counter() - start
+    await gateway.close()
+    os.remove(path)
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'clients': clients,
+        'requests': count,
+        'seconds': seconds,
+        'requests_per_second': count / seconds,
+        **{f'{name}_us': latencies[min(count - 1, int(quantile * count))] / 1000
+           for name, quantile in (('p50', 0.50), ('p99', 0.99), ('p99_9', 0.999))},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the order gateway with simulated clients")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--events', type=int, default=2_000, help="Requests per client")
+    parser.add_argument('--flow', default='poisson', choices=list(FLOWS))
+    parser.add_argument('--depth', type=int, default=100, help="Levels per side to seed the book with")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--queue-size', type=int, default=4096, help="Gateway inbound queue bound")
+    parser.add_argument('--window', type=int, default=256, help="Unanswered requests each client allows")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.clients, args.events, args.flow, args.depth, args.seed, args.queue_size,
+                             args.window))
+    print(f"{result['clients']} clients, {result['requests']} requests in {result['seconds']:.2f}s "
+          f"({result['requests_per_second']:,.0f}/s), latency p50={result['p50_us']:.0f}us "
+          f"p99={result['p99_us']:.0f}us p99.9={result['p99_9_us']:.0f}us")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == "__main__":
+    main()
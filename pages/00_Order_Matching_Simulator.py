@@ -1,19 +1,60 @@
 import streamlit as st
+import os
 import sys
 from decimal import Decimal
 from datetime import datetime
 import pandas as pd
 from trade.order_matching import OrderBook, Order
+from trade.trade_store import TradeStore
 
 st.title("Order Matching System")
 
-# Initialize OrderBook and populate with sample OPTI orders
+# Price increment for every simulated symbol; books match on integer ticks
+TICK_SIZE = Decimal("0.01")
+# Books are checkpointed here on request and reloaded on a cold start
+CHECKPOINT_DIR = os.path.join("data", "checkpoints")
+# Most recent trades each book keeps for the trade history table
+TRADE_CAPACITY = 10_000
+
+def new_trade_store():
+    return TradeStore(TICK_SIZE, capacity=TRADE_CAPACITY)
+
+def checkpoint_path(symbol):
+    return os.path.join(CHECKPOINT_DIR, f"{symbol}.ckpt")
+
+def save_book(symbol):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    st.session_state.order_books[symbol].save_checkpoint(checkpoint_path(symbol))
+
+def changed_book(symbol):
+    # Writing a checkpoint is opt-in; by default nothing is written under the working directory
+    if st.session_state.get("auto_checkpoint"):
+        save_book(symbol)
+
+def load_books():
+    """Load every checkpointed book, keyed by symbol."""
+    books = {}
+    if os.path.isdir(CHECKPOINT_DIR):
+        for file_name in sorted(os.listdir(CHECKPOINT_DIR)):
+            if file_name.endswith(".ckpt"):
+                symbol = file_name[:-len(".ckpt")]
+                books[symbol] = OrderBook.load_checkpoint(os.path.join(CHECKPOINT_DIR, file_name))
+                books[symbol].trades = new_trade_store()
+    return books
+
+# Initialize OrderBook from the last checkpoints, or populate with sample OPTI orders
 if 'order_books' not in st.session_state:
-    st.session_state.order_books = {}
-    st.session_state.order_counter = 0
-    
+    st.session_state.order_books = load_books()
+    # Continue numbering after the highest restored order id
+    st.session_state.order_counter = max(
+        (int(order_id[len("order_"):]) for book in st.session_state.order_books.values()
+         for order_id in book.orders if order_id.startswith("order_") and order_id[len("order_"):].isdigit()),
+        default=0
+    )
+
+if "OPTI" not in st.session_state.order_books:
     # Create OPTI order book and populate with sample orders
-    opti_book = OrderBook()
+    opti_book = OrderBook(tick_size=TICK_SIZE, trade_store=new_trade_store())
     sample_orders = [
         Order("sim_sell_1", "OPTI", "SELL", Decimal("1.20"), 1000, datetime.now()),
         Order("sim_sell_2", "OPTI", "SELL", Decimal("1.15"), 500, datetime.now()),
@@ -28,9 +69,13 @@ if 'order_books' not in st.session_state:
     
     st.session_state.order_books["OPTI"] = opti_book
 
-# Add this near the top where other session state variables are initialized
-if 'trade_history' not in st.session_state:
-    st.session_state.trade_history = []
+st.sidebar.subheader("Checkpoints")
+st.sidebar.checkbox("Checkpoint after every change", key="auto_checkpoint",
+                    help=f"Write the changed book to {CHECKPOINT_DIR} after each order and cancel")
+if st.sidebar.button("Save checkpoints", help=f"Write every book to {CHECKPOINT_DIR}"):
+    for symbol in st.session_state.order_books:
+        save_book(symbol)
+    st.sidebar.success(f"Saved {len(st.session_state.order_books)} books to {CHECKPOINT_DIR}")
 
 # Function to generate unique order IDs
 def get_next_order_id():
@@ -52,6 +97,13 @@ with col1:
         
         # Add order type selection
         order_type = st.selectbox("Order Type", ["LIMIT", "MARKET"])
+        # Market orders never rest, so GTC and POST_ONLY only apply to limit orders
+        time_in_force = st.selectbox(
+            "Time in Force",
+            ["GTC", "IOC", "FOK", "POST_ONLY"] if order_type == "LIMIT" else ["IOC", "FOK"],
+            help="GTC rests, IOC cancels the unfilled rest, FOK fills completely or not at all, "
+                 "POST_ONLY only adds liquidity"
+        )
         
         side = st.selectbox("Side", ["BUY", "SELL"])
         
@@ -62,7 +114,7 @@ with col1:
             # For market orders, show the best matching price
             best_price = None
             if symbol in st.session_state.order_books:
-                snapshot = st.session_state.order_books[symbol].get_order_book_snapshot()
+                snapshot = st.session_state.order_books[symbol].get_order_book_snapshot(depth=1)
                 if side == "BUY":
                     best_price = snapshot['best_ask']
                 else:  # SELL
@@ -81,12 +133,8 @@ with col1:
             try:
                 order_id = get_next_order_id()
                 
-                # For market orders, set price to 0 for buys (will match lowest ask)
-                # or infinity for sells (will match highest bid)
-                if order_type == "MARKET":
-                    price = Decimal('0') if side == "BUY" else Decimal('999999')
-                else:
-                    price = Decimal(str(price))
+                # Market orders carry no price; they take the resting orders' prices
+                price = None if order_type == "MARKET" else Decimal(str(price))
                 
                 new_order = Order(
                     order_id=order_id,
@@ -94,32 +142,28 @@ with col1:
                     side=side,
                     price=price,
                     quantity=quantity,
-                    timestamp=datetime.now()
+                    timestamp=datetime.now(),
+                    order_type=order_type,
+                    time_in_force=time_in_force
                 )
                 
                 # Initialize order book for symbol if it doesn't exist
                 if symbol not in st.session_state.order_books:
-                    st.session_state.order_books[symbol] = OrderBook()
+                    st.session_state.order_books[symbol] = OrderBook(tick_size=TICK_SIZE,
+                                                                     trade_store=new_trade_store())
                 
                 trades = st.session_state.order_books[symbol].add_order(new_order)
+                changed_book(symbol)
                 if trades:
                     st.success(f"Order matched and FILLED! Generated {len(trades)} trades")
-                    # Add trades to trade history
                     for trade in trades:
-                        trade_details = {
-                            'Symbol': symbol,
-                            'Price': float(trade.price),
-                            'Quantity': trade.quantity,
-                            'Timestamp': datetime.now(),
-                            'Buy Order': trade.buy_order_id,
-                            'Sell Order': trade.sell_order_id
-                        }
-                        st.session_state.trade_history.append(trade_details)
                         st.write(f"Trade executed at ${trade.price}: {trade.quantity} units")
                     st.rerun()
                 else:
-                    if order_type == "MARKET":
-                        st.error("No matching orders available for market order")
+                    if new_order.status == "REJECTED":
+                        st.error("Post-only order would have crossed the book and was rejected")
+                    elif new_order.status == "CANCELLED":
+                        st.error(f"No matching orders available; {time_in_force} order cancelled")
                     else:
                         st.success(f"Limit order placed successfully! ID: {order_id}")
             except Exception as e:
@@ -151,6 +195,7 @@ with col2:
             if cancel_button:
                 symbol, order_id = order_to_cancel
                 if st.session_state.order_books[symbol].cancel_order(order_id):
+                    changed_book(symbol)
                     st.success(f"Order {order_id} cancelled successfully!")
                 else:
                     st.error("Failed to cancel order")
@@ -203,7 +248,9 @@ if st.session_state.order_books:
                 'Symbol': symbol,
                 'Order ID': order.order_id,
                 'Side': order.side,
-                'Price': float(order.price),
+                'Type': order.order_type,
+                'TIF': order.time_in_force,
+                'Price': float(order.price) if order.price is not None else None,
                 'Quantity': order.quantity,
                 'Filled': order.filled_quantity,
                 'Status': order.status
@@ -218,8 +265,21 @@ else:
 
 # Display Trade History
 st.subheader("Trade History")
-if st.session_state.trade_history:
-    trades_df = pd.DataFrame(st.session_state.trade_history)
+# Each book records its own trades; build the table from their column views
+trade_frames = []
+for symbol, book in st.session_state.order_books.items():
+    if len(book.trades):
+        columns = book.trades.to_numpy()
+        trade_frames.append(pd.DataFrame({
+            'Symbol': symbol,
+            'Price': columns['price_ticks'] * float(TICK_SIZE),
+            'Quantity': columns['quantity'],
+            'Timestamp': columns['timestamp'],
+            'Buy Order': columns['buy_order_id'].astype(str),
+            'Sell Order': columns['sell_order_id'].astype(str)
+        }))
+if trade_frames:
+    trades_df = pd.concat(trade_frames, ignore_index=True)
     trades_df = trades_df.sort_values('Timestamp', ascending=False)
     st.dataframe(trades_df, hide_index=True)
 else:
@@ -0,0 +1,123 @@
+import random
+from decimal import Decimal
+from typing import Iterator, List, Optional, Tuple
+
+# A brute-force order book to check OrderBook against on random flow. It
+# keeps each side's resting orders as one list of [price, arrival, order_id,
+# quantity] and sorts the contra side into price-time priority on every
+# incoming order, so its matching is easy to read rather than fast.
+
+class ReferenceBook:
+    def __init__(self):
+        self.bids: List[list] = []
+        self.asks: List[list] = []
+        self.arrivals = 0
+        self.status = {}
+        self.time_in_force = {}
+
+    def add(self, order_id: str, side: str, price: Optional[Decimal], quantity: int,
+            order_type: str = 'LIMIT', time_in_force: str = 'GTC') -> List[tuple]:
+        """Match an order and return (buy_order_id, sell_order_id, price, quantity) fills."""
+        self.time_in_force[order_id] = time_in_force
+        buying = side == 'BUY'
+        contra = self.asks if buying else self.bids
+        contra.sort(key=(lambda o: (o[0], o[1])) if buying else (lambda o: (-o[0], o[1])))
+
+        def crosses(resting):
+            return order_type == 'MARKET' or (resting[0] <= price if buying else resting[0] >= price)
+
+        available = sum(resting[3] for resting in contra if crosses(resting))
+        if time_in_force == 'POST_ONLY' and available:
+            self.status[order_id] = 'REJECTED'
+            return []
+        if time_in_force == 'FOK' and available < quantity:
+            self.status[order_id] = 'CANCELLED'
+            return []
+        fills = []
+        while quantity and contra and crosses(contra[0]):
+            resting = contra[0]
+            fill = min(quantity, resting[3])
+            quantity -= fill
+            resting[3] -= fill
+            buyer, seller = (order_id, resting[2]) if buying else (resting[2], order_id)
+            fills.append((buyer, seller, resting[0], fill))
+            if not resting[3]:
+                self.status[resting[2]] = 'FILLED'
+                contra.pop(0)
+        if not quantity:
+            self.status[order_id] = 'FILLED'
+        elif time_in_force in ('IOC', 'FOK') or order_type == 'MARKET':
+            self.status[order_id] = 'CANCELLED'
+        else:
+            self.arrivals += 1
+            (self.bids if buying else self.asks).append([price, self.arrivals, order_id, quantity])
+            self.status[order_id] = 'ACTIVE'
+        return fills
+
+    def cancel(self, order_id: str) -> bool:
+        for resting_orders in (self.bids, self.asks):
+            for resting in resting_orders:
+                if resting[2] == order_id:
+                    resting_orders.remove(resting)
+                    self.status[order_id] = 'CANCELLED'
+                    return True
+        return False
+
+    def amend(self, order_id: str, quantity: Optional[int] = None,
+              price: Optional[Decimal] = None) -> Optional[List[tuple]]:
+        """Reduce a resting order in place, or re-enter it at the back of the queue; None if it cannot be amended."""
+        for side, resting_orders in (('BUY', self.bids), ('SELL', self.asks)):
+            for resting in resting_orders:
+                if resting[2] != order_id:
+                    continue
+                quantity = resting[3] if quantity is None else quantity
+                price = resting[0] if price is None else price
+                if price == resting[0] and quantity <= resting[3]:
+                    resting[3] = quantity
+                    return []
+                time_in_force = self.time_in_force[order_id]
+                contra = self.asks if side == 'BUY' else self.bids
+                if time_in_force == 'POST_ONLY' and any(
+                        (o[0] <= price if side == 'BUY' else o[0] >= price) for o in contra):
+                    return None
+                resting_orders.remove(resting)
+                return self.add(order_id, side, price, quantity, 'LIMIT', time_in_force)
+        return None
+
+    def depth(self) -> Tuple[list, list]:
+        """Aggregate (price, quantity) per level: bids best first, then asks best first."""
+        def levels(resting_orders):
+            totals = {}
+            for price, _, _, quantity in resting_orders:
+                totals[price] = totals.get(price, 0) + quantity
+            return sorted(totals.items())
+        return levels(self.bids)[::-1], levels(self.asks)
+
+    def queue(self, side: str, price: Decimal) -> List[str]:
+        """Ids resting at ``price`` on ``side`` in time priority."""
+        resting_orders = self.bids if side == 'BUY' else self.asks
+        return [o[2] for o in sorted(resting_orders, key=lambda o: o[1]) if o[0] == price]
+
+def random_flow(seed: int, count: int, amends: float = 0.0) -> Iterator[tuple]:
+    """('add', (order_id, side, price, quantity, order_type, time_in_force)) and ('cancel', order_id) events.
+
+    With ``amends``, that share of events are ('amend', (order_id, quantity,
+    price)) of a recent order, with either field possibly None.
+    """
+    rng = random.Random(seed)
+    order_ids = []
+    for k in range(count):
+        draw = rng.random()
+        if order_ids and draw < 0.3:
+            yield 'cancel', rng.choice(order_ids)
+            continue
+        if order_ids and draw < 0.3 + amends:
+            quantity = rng.choice([None, rng.randint(1, 60)])
+            price = rng.choice([None, Decimal(rng.randint(950, 1050)) / 10])
+            yield 'amend', (rng.choice(order_ids[-50:]), quantity, price)
+            continue
+        order_type = 'MARKET' if rng.random() < 0.1 else 'LIMIT'
+        time_in_force = rng.choice(['GTC', 'GTC', 'IOC', 'FOK'] + (['POST_ONLY'] if order_type == 'LIMIT' else []))
+        price = Decimal(rng.randint(950, 1050)) / 10 if order_type == 'LIMIT' else None
+        order_ids.append(str(k))
+        yield 'add', (str(k), rng.choice(['BUY', 'SELL']), price, rng.randint(1, 60), order_type, time_in_force)
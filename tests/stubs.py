@@ -0,0 +1,27 @@
+import importlib.util
+import sys
+import types
+
+# The backtest modules import the app's UI and exchange libraries at module
+# level but never use them in the functions under test. Where one is not
+# installed it is replaced by an empty module, so those tests run without
+# the app's full environment.
+
+UI_AND_EXCHANGE_MODULES = ('streamlit', 'plotly', 'plotly.graph_objs', 'plotly.subplots', 'plotly.express',
+                           'ccxt', 'statsmodels', 'statsmodels.api', 'pytz')
+
+def stub_missing_modules():
+    """Put an empty module in sys.modules for each UI or exchange module that is not installed."""
+    packages = {name.partition('.')[0] for name in UI_AND_EXCHANGE_MODULES}
+    missing = {package for package in packages
+               if package not in sys.modules and importlib.util.find_spec(package) is None}
+    for name in UI_AND_EXCHANGE_MODULES:
+        if name.partition('.')[0] not in missing:
+            continue
+        module = types.ModuleType(name)
+        if name == 'plotly.subplots':
+            module.make_subplots = None
+        sys.modules[name] = module
+        parent, _, child = name.rpartition('.')
+        if parent:
+            setattr(sys.modules[parent], child, module)
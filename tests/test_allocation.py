@@ -0,0 +1,95 @@
+import random
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from tests.reference_book import ReferenceBook, random_flow
+from trade.allocation import FifoAllocation, FifoLmmAllocation, ProRataAllocation
+from trade.order_matching import Order, OrderBook, PriceLevel
+
+NOW = datetime(2024, 1, 1)
+PRICE = Decimal('100')
+
+def level(*sizes):
+    """A level of sell orders s0, s1, ... of the given sizes, in that time priority."""
+    price_level = PriceLevel(PRICE, PRICE)
+    for k, size in enumerate(sizes):
+        price_level.append(Order(f's{k}', 'X', 'SELL', PRICE, size, NOW))
+    return price_level
+
+def allocated(policy, price_level, quantity):
+    return [(order.order_id, fill) for order, fill in policy.allocate(price_level, quantity)]
+
+def test_pro_rata_splits_in_proportion_to_size():
+    assert allocated(ProRataAllocation(), level(10, 30, 60), 50) == [('s0', 5), ('s1', 15), ('s2', 30)]
+
+def test_pro_rata_rounds_down_and_gives_the_remainder_in_time_priority():
+    assert allocated(ProRataAllocation(), level(1, 1, 1), 2) == [('s0', 1), ('s1', 1)]
+    # floor shares 3, 3, 3 leave 1 lot, which goes to the oldest order with room
+    assert allocated(ProRataAllocation(), level(10, 10, 10), 10) == [('s0', 4), ('s1', 3), ('s2', 3)]
+
+def test_pro_rata_drops_shares_below_the_minimum():
+    # s0's share of 1 is under the minimum of 2; the lot left over goes back to s0 by time priority
+    assert allocated(ProRataAllocation(minimum=2), level(5, 95), 20) == [('s0', 1), ('s1', 19)]
+    # Dropped lots are handed out by time priority, so s0 can still end up with them
+    assert allocated(ProRataAllocation(minimum=5), level(10, 90), 20) == [('s0', 2), ('s1', 18)]
+    assert allocated(ProRataAllocation(minimum=5), level(90, 10), 20) == [('s0', 20)]
+
+def test_lmm_carve_out_comes_first_then_time_priority():
+    price_level = level(50, 50)
+    policy = FifoLmmAllocation(lambda order: order.order_id == 's1', share=0.4)
+    assert dict(allocated(policy, price_level, 50)) == {'s1': 20, 's0': 30}
+
+def test_lmm_carve_out_rounds_down_and_is_shared_in_time_priority():
+    policy = FifoLmmAllocation(lambda order: order.order_id != 's0', share=0.5)
+    # carve-out int(15 * 0.5) = 7: s1 takes its 5, s2 the other 2, then s0 gets the 8 left
+    assert dict(allocated(policy, level(20, 5, 20), 15)) == {'s1': 5, 's2': 2, 's0': 8}
+
+def test_lmm_orders_also_take_part_in_the_remainder():
+    policy = FifoLmmAllocation(lambda order: order.order_id == 's0', share=0.25)
+    assert allocated(policy, level(30, 30), 40) == [('s0', 30), ('s1', 10)]
+
+def test_fifo_policy_book_matches_the_reference():
+    reference, book = ReferenceBook(), OrderBook(tick_size=Decimal('0.1'), allocation=FifoAllocation())
+    for action, payload in random_flow(0, 2000):
+        if action == 'add':
+            order_id, side, price, quantity, order_type, time_in_force = payload
+            trades = book.add_order(Order(order_id, 'X', side, price, quantity, NOW, order_type, time_in_force))
+            assert [(t.buy_order_id, t.sell_order_id, t.price, t.quantity) for t in trades] == reference.add(*payload)
+        else:
+            assert book.cancel_order(payload) == reference.cancel(payload)
+
+POLICIES = [ProRataAllocation(), ProRataAllocation(minimum=3),
+            FifoLmmAllocation(lambda order: int(order.order_id) % 3 == 0, share=0.5)]
+
+@pytest.mark.parametrize('policy', POLICIES, ids=['pro_rata', 'pro_rata_minimum', 'lmm'])
+@pytest.mark.parametrize('seed', range(3))
+def test_policies_keep_the_book_consistent(policy, seed):
+    rng = random.Random(seed)
+    book = OrderBook(tick_size=Decimal('0.1'), allocation=policy)
+    order_ids = []
+    for k in range(2000):
+        draw = rng.random()
+        if order_ids and draw < 0.2:
+            book.cancel_order(rng.choice(order_ids))
+            continue
+        if order_ids and draw < 0.3:
+            book.amend_order(rng.choice(order_ids), quantity=rng.randint(1, 40))
+            continue
+        side = rng.choice(['BUY', 'SELL'])
+        open_quantity = {order_id: book.orders[order_id].quantity for order_id in order_ids}
+        order = Order(str(k), 'X', side, Decimal(rng.randint(990, 1010)) / 10, rng.randint(1, 80), NOW)
+        trades = book.add_order(order)
+        order_ids.append(order.order_id)
+        assert sum(trade.quantity for trade in trades) == order.filled_quantity
+        for trade in trades:
+            assert 0 < trade.quantity <= open_quantity[trade.sell_order_id if side == 'BUY' else trade.buy_order_id]
+        for levels in (book.bids, book.asks):
+            for price_level in levels.values():
+                orders = list(price_level)
+                assert orders and price_level.count == len(orders)
+                assert price_level.quantity == sum(o.quantity for o in orders)
+                assert all(o.quantity > 0 and o.status == 'ACTIVE' for o in orders)
+        if book.bids and book.asks:
+            assert book.bids.peekitem(-1)[0] < book.asks.peekitem(0)[0]
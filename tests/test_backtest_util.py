@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.stubs import stub_missing_modules
+
+stub_missing_modules()
+
+from utils import backtest_util  # noqa: E402
+from utils.stats_util import zscore  # noqa: E402
+
+# The vectorized one-sided backtests against the per-row loops they
+# replaced, written out plainly here: same trades, same records, same
+# cumulative PnL, down to the last bit.
+
+SYMBOLS = ['S0', 'S1', 'S2']
+MINUTES = 1500
+PAIRS = backtest_util.get_pairs(SYMBOLS)
+
+def make_prices(seed, gaps=0.0):
+    """Random-walk prices, each symbol stamped at its own second of the minute.
+
+    With ``gaps``, that share of rows is dropped and as many again get a
+    NaN close.
+    """
+    rng = np.random.default_rng(seed)
+    minutes = pd.date_range('2024-01-01', periods=MINUTES, freq='min')
+    frames = []
+    for k, symbol in enumerate(SYMBOLS):
+        close = 100 * (k + 1) * np.exp(np.cumsum(rng.normal(0, 0.002, MINUTES)))
+        frame = pd.DataFrame({'timestamp': minutes + pd.Timedelta(seconds=7 * k), 'symbol': symbol,
+                              'close': close, 'bid': close * 0.9995, 'ask': close * 1.0005})
+        if gaps:
+            frame.loc[rng.random(MINUTES) < gaps, 'close'] = np.nan
+            frame = frame[rng.random(MINUTES) >= gaps]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def by_minute(prices, symbol):
+    """``symbol``'s rows keyed by minute, the last row of each minute kept."""
+    rows = prices[prices['symbol'] == symbol].assign(minute=prices['timestamp'].dt.floor('min'))
+    return rows.drop_duplicates('minute', keep='last').set_index('minute')
+
+def reference_bid_ask(prices, threshold, position_size, stop_loss_limit, profit_limit, maker_fee, reinvest, window):
+    pnl_list = []
+    gross_cum = net_cum = 0
+    stop_loss_limit, profit_limit, maker_fee = stop_loss_limit / 100, profit_limit / 100, maker_fee / 100
+    for asset1, asset2 in zip(PAIRS['Asset1'], PAIRS['Asset2']):
+        merged = by_minute(prices, asset1).join(by_minute(prices, asset2), how='inner', lsuffix='_1', rsuffix='_2')
+        size = position_size / len(PAIRS)
+        is_open, entry, lots = False, 0, 0
+        z_scores = zscore(merged['close_1'] / merged['close_2'], window)
+        for timestamp, ask, bid, z in zip(merged['timestamp_1'], merged['ask_1'], merged['bid_1'], z_scores):
+            record = {'pair': f'{asset1}-{asset2}', 'timestamp': timestamp, 'z_score': z, 'strategy': 'One-sided'}
+            if not is_open:
+                if z < -threshold:
+                    is_open, entry, lots = True, ask, size / ask
+                    pnl_list.append({**record, 'action': 'Open Position', 'price': ask, 'lots': lots, 'gross_pnl': 0,
+                                     'net_pnl': 0, 'cumulative_gross_pnl': gross_cum, 'cumulative_net_pnl': net_cum})
+            else:
+                change = (bid - entry) / entry
+                if change <= -stop_loss_limit or change >= profit_limit:
+                    is_open = False
+                    gross = lots * (bid - entry)
+                    net = gross - maker_fee * size
+                    action = 'Closed with Stop Loss' if change <= -stop_loss_limit else 'Closed with Profit'
+                    pnl_list.append({**record, 'action': action, 'price': bid, 'lots': lots, 'gross_pnl': gross,
+                                     'net_pnl': net, 'cumulative_gross_pnl': gross_cum, 'cumulative_net_pnl': net_cum})
+                    gross_cum, net_cum = gross_cum + gross, net_cum + net
+                    if reinvest:
+                        size += net
+    return pnl_list
+
+def close_series(prices, window):
+    """(minutes, {pair: (z-scores, asset1 closes)}) on the minutes at which any symbol has a row."""
+    minutes = prices['timestamp'].dt.floor('min').drop_duplicates().sort_values()
+    closes = {symbol: by_minute(prices, symbol)['close'].reindex(minutes) for symbol in SYMBOLS}
+    series = {(a1, a2): (zscore(closes[a1] / closes[a2], window), closes[a1])
+              for a1, a2 in zip(PAIRS['Asset1'], PAIRS['Asset2'])}
+    return list(minutes), series
+
+def reference_close(prices, threshold, position_size, stop_loss_limit, profit_limit, maker_fee, window):
+    pnl_list = []
+    gross_cum = net_cum = 0
+    stop_loss_limit, profit_limit, maker_fee = stop_loss_limit / 100, profit_limit / 100, maker_fee / 100
+    size = position_size / len(PAIRS)
+    minutes, series = close_series(prices, window)
+    for (asset1, asset2), (z_scores, closes) in series.items():
+        is_open, entry, lots = False, 0, 0
+        for minute, close, z in zip(minutes, closes, z_scores):
+            record = {'pair': f'{asset1}-{asset2}', 'timestamp': minute, 'z_score': z, 'strategy': 'One-sided'}
+            if not is_open:
+                if z < -threshold and close > 0:
+                    is_open, entry, lots = True, close, size / close
+                    pnl_list.append({**record, 'action': 'Open Position', 'price': close, 'lots': lots,
+                                     'gross_pnl': '', 'net_pnl': '',
+                                     'cumulative_gross_pnl': gross_cum, 'cumulative_net_pnl': net_cum})
+            else:
+                change = (close - entry) / entry
+                if change <= -stop_loss_limit or change >= profit_limit:
+                    is_open = False
+                    gross = lots * (close - entry)
+                    net = gross - maker_fee * size
+                    gross_cum, net_cum = gross_cum + gross, net_cum + net
+                    action = 'Closed with Stop Loss' if change <= -stop_loss_limit else 'Closed with Profit'
+                    pnl_list.append({**record, 'action': action, 'price': close, 'lots': lots, 'gross_pnl': gross,
+                                     'net_pnl': net, 'cumulative_gross_pnl': gross_cum, 'cumulative_net_pnl': net_cum})
+    return pnl_list
+
+def reference_synthetic(prices, threshold, position_size, stop_loss_limit, profit_limit, maker_fee, window):
+    pnl_list = []
+    gross_cum = net_cum = 0
+    stop_loss_limit, profit_limit, maker_fee = stop_loss_limit / 100, profit_limit / 100, maker_fee / 100
+    minutes, series = close_series(prices, window)
+    for (asset1, asset2), (z_scores, closes) in series.items():
+        is_open, entry, lots = False, 0, 0
+        for minute, close, z in zip(minutes, closes, z_scores):
+            record = {'Pair': f'{asset1}-{asset2}', 'Timestamp': minute, 'Z-Score': z, 'Strategy': 'One-sided'}
+            if not is_open:
+                ask = backtest_util.get_ask(close, 0.1)
+                if z < -threshold and ask > 0:
+                    is_open, entry, lots = True, ask, position_size / ask
+                    pnl_list.append({**record, 'Action': 'Open Position', 'Price': ask, 'Lots': lots,
+                                     'Gross PnL': '', 'Net PnL': '',
+                                     'Cumulative Gross PnL': gross_cum, 'Cumulative Net PnL': net_cum})
+            else:
+                bid = backtest_util.get_bid(entry, 0.1)
+                change = (bid - entry) / entry
+                if change <= -stop_loss_limit or change >= profit_limit:
+                    is_open = False
+                    gross = lots * (bid - entry)
+                    net = lots * (bid - entry) - maker_fee * position_size
+                    gross_cum, net_cum = gross_cum + gross, net_cum + net
+                    action = 'Closed with Stop Loss' if change <= -stop_loss_limit else 'Closed with Profit'
+                    pnl_list.append({**record, 'Action': action, 'Price': bid, 'Gross PnL': gross, 'Net PnL': net,
+                                     'Cumulative Gross PnL': gross_cum, 'Cumulative Net PnL': net_cum})
+    return pnl_list
+
+def expected_frame(pnl_list, columns, extra=None):
+    frame = pd.DataFrame([{**record, **(extra or {})} for record in pnl_list])[columns]
+    if 'gross_pnl' in frame:
+        frame['gross_pnl'] = pd.to_numeric(frame['gross_pnl'], errors='coerce').fillna(0)
+    return frame
+
+CASES = [(0, 0.0, None, 1.5, 0.5, 0.5), (1, 0.02, None, 1.0, 0.3, 0.6), (2, 0.02, 240, 1.5, 0.4, 0.4)]
+CASE_IDS = ['expanding', 'gaps', 'rolling']
+
+@pytest.mark.parametrize('seed, gaps, window, threshold, stop_loss_limit, profit_limit', CASES, ids=CASE_IDS)
+@pytest.mark.parametrize('reinvest', [True, False])
+def test_bid_ask_matches_the_row_loop(seed, gaps, window, threshold, stop_loss_limit, profit_limit, reinvest):
+    prices = make_prices(seed, gaps)
+    result = backtest_util.backtest_zscores_one_sided_bid_ask(
+        prices, PAIRS, threshold, 1000, stop_loss_limit, profit_limit, 'ex', 1, maker_fee=0.1, reinvest=reinvest,
+        window=window)
+    expected = reference_bid_ask(prices, threshold, 1000, stop_loss_limit, profit_limit, 0.1, reinvest, window)
+    assert len(expected) > 10
+    pd.testing.assert_frame_equal(result, expected_frame(expected, result.columns, {'exchange': 'ex', 'run_id': 1}),
+                                  check_exact=True)
+
+@pytest.mark.parametrize('seed, gaps, window, threshold, stop_loss_limit, profit_limit', CASES, ids=CASE_IDS)
+def test_close_matches_the_row_loop(seed, gaps, window, threshold, stop_loss_limit, profit_limit):
+    prices = make_prices(seed, gaps)
+    result = backtest_util.backtest_zscores_one_sided_close(
+        prices, PAIRS, threshold, 1000, stop_loss_limit, profit_limit, 0.1, True, 'ex', 1, window=window)
+    expected = reference_close(prices, threshold, 1000, stop_loss_limit, profit_limit, 0.1, window)
+    assert len(expected) > 10
+    pd.testing.assert_frame_equal(result, expected_frame(expected, result.columns, {'exchange': 'ex', 'run_id': 1}),
+                                  check_exact=True)
+
+@pytest.mark.parametrize('seed, gaps, window, threshold, stop_loss_limit, profit_limit', CASES, ids=CASE_IDS)
+def test_synthetic_matches_the_row_loop(seed, gaps, window, threshold, stop_loss_limit, profit_limit):
+    prices = make_prices(seed, gaps)
+    # A profit limit under the synthetic spread closes every trade on the next row
+    for profit_limit in (profit_limit, -0.1):
+        result = backtest_util.backtest_zscores_one_sided_ba_synthetic(
+            prices, PAIRS, threshold, 1000, stop_loss_limit, profit_limit, window=window)
+        expected = reference_synthetic(prices, threshold, 1000, stop_loss_limit, profit_limit, 0.1, window)
+        pd.testing.assert_frame_equal(result, expected_frame(expected, result.columns), check_exact=True)
+
+@pytest.mark.parametrize('strategy', backtest_util.PARALLEL_STRATEGIES)
+@pytest.mark.parametrize('window', [None, 240])
+def test_parallel_in_pair_order_matches_serial(strategy, window):
+    prices = make_prices(1, gaps=0.02)
+    result = backtest_util.backtest_zscores_one_sided_parallel(
+        prices, PAIRS, 1.0, 1000, 0.3, 0.6, 'ex', 1, strategy=strategy, order='pair', processes=2,
+        start_method='fork', window=window)
+    if strategy == 'bid_ask':
+        serial = backtest_util.backtest_zscores_one_sided_bid_ask(prices, PAIRS, 1.0, 1000, 0.3, 0.6, 'ex', 1,
+                                                                  window=window)
+    else:
+        serial = backtest_util.backtest_zscores_one_sided_close(prices, PAIRS, 1.0, 1000, 0.3, 0.6, 0.1, True,
+                                                                'ex', 1, window=window)
+    pd.testing.assert_frame_equal(result, serial, check_exact=True)
+
+def daily_sharpe(closed, prices, position_size):
+    """Annualized Sharpe ratio of ``closed`` trades' net PnL per UTC day of ``prices``."""
+    days = pd.date_range(prices['timestamp'].min().floor('D'), prices['timestamp'].max().floor('D'), freq='D')
+    daily = closed.groupby(closed['timestamp'].dt.floor('D'))['net_pnl'].sum().reindex(days, fill_value=0)
+    returns = daily.to_numpy(dtype=np.float64) / position_size
+    volatility = returns.std(ddof=1)
+    return returns.mean() / volatility * np.sqrt(365) if volatility > 0 else np.nan
+
+@pytest.mark.parametrize('strategy', backtest_util.SWEEP_STRATEGIES)
+@pytest.mark.parametrize('window', [None, 240])
+def test_sweep_matches_one_backtest_per_combination(strategy, window):
+    prices = make_prices(1, gaps=0.02)
+    result = backtest_util.sweep_zscores_one_sided(prices, PAIRS, [1.0, 1.5], [0.3, 0.5], [0.4, 0.6], [0, 0.1], 1000,
+                                                   strategy=strategy, window=window)
+    assert len(result) == 16
+    for row in result.itertuples():
+        if strategy == 'bid_ask':
+            pnl = backtest_util.backtest_zscores_one_sided_bid_ask(
+                prices, PAIRS, row.threshold, 1000, row.stop_loss_limit, row.profit_limit, 'ex', 1,
+                maker_fee=row.maker_fee, window=window)
+        else:
+            pnl = backtest_util.backtest_zscores_one_sided_close(
+                prices, PAIRS, row.threshold, 1000, row.stop_loss_limit, row.profit_limit, row.maker_fee, True,
+                'ex', 1, window=window)
+        closed = pnl[pnl['action'] != 'Open Position'].astype({'net_pnl': np.float64})
+        assert row.trades == len(closed) > 0
+        assert row.gross_pnl == pytest.approx(closed['gross_pnl'].sum(), rel=1e-9, abs=1e-9)
+        assert row.net_pnl == pytest.approx(closed['net_pnl'].sum(), rel=1e-9, abs=1e-9)
+        assert row.sharpe == pytest.approx(daily_sharpe(closed, prices, 1000), rel=1e-9, nan_ok=True)
+
+def test_sweep_rejects_an_unknown_strategy():
+    with pytest.raises(ValueError, match='Unknown strategy'):
+        backtest_util.sweep_zscores_one_sided(make_prices(0), PAIRS, [1.0], [0.5], [0.5], [0.1], 1000, strategy='mid')
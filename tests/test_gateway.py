@@ -0,0 +1,51 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import pytest
+
+from trade.gateway import OrderGateway
+
+def exchange(lines):
+    """Send JSON lines to a fresh gateway over TCP and return one decoded response per line."""
+    async def run():
+        gateway = OrderGateway(Decimal('0.01'))
+        server = await gateway.start_tcp()
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(b''.join(json.dumps(line).encode() + b'\n' for line in lines))
+        await writer.drain()
+        responses = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in lines]
+        writer.close()
+        await gateway.close()
+        return responses
+    return asyncio.run(run())
+
+VALID = {'action': 'add', 'symbol': 'X', 'order_id': 'ok', 'side': 'BUY', 'price': '1.00', 'quantity': 5}
+
+@pytest.mark.parametrize('field, value', [
+    ('symbol', ['X']),
+    ('side', 'buy'),
+    ('quantity', -5),
+    ('quantity', 0),
+    ('quantity', 2.5),
+    ('quantity', True),
+    ('price', 'abc'),
+    ('price', None),
+    ('price', [1]),
+    ('time_in_force', 'DAY'),
+    ('owner', {'id': 1}),
+])
+def test_malformed_add_is_rejected_and_matching_continues(field, value):
+    bad = dict(VALID, order_id='bad', **{field: value})
+    rejected, accepted = exchange([bad, VALID])
+    assert rejected['type'] == 'reject'
+    assert accepted['type'] == 'ack'
+    assert accepted['order_id'] == 'ok' and accepted['status'] == 'ACTIVE'
+
+def test_malformed_amend_and_cancel_are_rejected():
+    responses = exchange([VALID,
+                          {'action': 'amend', 'symbol': 'X', 'order_id': 'ok', 'quantity': -1},
+                          {'action': 'cancel', 'symbol': {'a': 1}, 'order_id': 'ok'},
+                          {'action': 'cancel', 'symbol': 'X', 'order_id': 'ok'}])
+    assert [response['type'] for response in responses] == ['ack', 'reject', 'reject', 'ack']
+    assert responses[-1]['status'] == 'CANCELLED'
@@ -0,0 +1,26 @@
+from decimal import Decimal
+
+import pytest
+
+from trade.journal import EventJournal, JournalReader
+
+TICK_SIZE = Decimal('0.01')
+
+@pytest.mark.parametrize('capacity', [0, 1, 4])
+def test_journal_grows_from_any_capacity(tmp_path, capacity):
+    path = str(tmp_path / 'journal')
+    with EventJournal(path, TICK_SIZE, capacity=capacity) as journal:
+        for k in range(10):
+            journal.accept('BUY', 100 + k, 5, f'o{k}')
+    assert [record.order_id for record in JournalReader(path).records()] == [f'o{k}' for k in range(10)]
+
+def test_reopened_empty_journal_accepts_records(tmp_path):
+    path = str(tmp_path / 'journal')
+    EventJournal(path, TICK_SIZE).close()  # a session that wrote nothing is trimmed to the header
+    with EventJournal(path, TICK_SIZE) as journal:
+        assert journal.accept('SELL', 101, 3, 'a') == 1
+        journal.cancel('SELL', 101, 3, 'a')
+    with EventJournal(path, TICK_SIZE) as journal:
+        assert journal.sequence == 2
+        journal.accept('BUY', 99, 1, 'b')
+    assert [record.seq for record in JournalReader(path).records()] == [1, 2, 3]
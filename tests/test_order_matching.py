@@ -0,0 +1,86 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from trade.allocation import FifoLmmAllocation, ProRataAllocation
+from trade.order_matching import STP_MODES, Order, OrderBook
+
+# Run with ``python -m pytest`` from the repository root.
+
+TICK_SIZE = Decimal('0.01')
+NOW = datetime(2024, 1, 1)
+
+def order(order_id, side, price, quantity, owner=None, time_in_force='GTC'):
+    return Order(order_id, 'X', side, Decimal(price), quantity, NOW, time_in_force=time_in_force, owner=owner)
+
+def stp_book(stp_mode):
+    book = OrderBook(tick_size=TICK_SIZE, stp_mode=stp_mode, clock=lambda: NOW)
+    book.add_order(order('mine', 'SELL', '1.00', 5, owner='me'))
+    book.add_order(order('theirs', 'SELL', '1.01', 5, owner='other'))
+    return book
+
+@pytest.mark.parametrize('stp_mode', STP_MODES)
+def test_fok_does_not_count_same_owner_liquidity(stp_mode):
+    book = stp_book(stp_mode)
+    fok = order('fok', 'BUY', '1.01', 10, owner='me', time_in_force='FOK')
+    assert book.add_order(fok) == []
+    assert fok.status == 'CANCELLED'
+    assert fok.filled_quantity == 0
+    assert not book.bids
+    assert [o.status for o in (book.orders['mine'], book.orders['theirs'])] == ['ACTIVE', 'ACTIVE']
+
+def test_fok_fills_from_other_owners_past_cancelled_own_order():
+    book = stp_book('CANCEL_OLDEST')
+    fok = order('fok', 'BUY', '1.01', 5, owner='me', time_in_force='FOK')
+    trades = book.add_order(fok)
+    assert [(t.sell_order_id, t.quantity) for t in trades] == [('theirs', 5)]
+    assert fok.status == 'FILLED'
+    assert book.orders['mine'].status == 'CANCELLED'
+    assert not book.bids
+
+def test_fok_blocked_by_own_order_under_cancel_newest():
+    book = stp_book('CANCEL_NEWEST')
+    fok = order('fok', 'BUY', '1.01', 5, owner='me', time_in_force='FOK')
+    assert book.add_order(fok) == []
+    assert fok.status == 'CANCELLED'
+    assert book.orders['theirs'].quantity == 5
+
+POLICIES = {
+    'pro_rata': lambda: ProRataAllocation(),
+    'lmm': lambda: FifoLmmAllocation(lambda resting: resting.owner == 'me'),
+}
+
+def shared_level_book(stp_mode, policy):
+    # Another owner's order ahead of the FOK owner's own order at one price
+    book = OrderBook(tick_size=TICK_SIZE, stp_mode=stp_mode, allocation=POLICIES[policy](), clock=lambda: NOW)
+    book.add_order(order('theirs', 'SELL', '1.00', 20, owner='other'))
+    book.add_order(order('mine', 'SELL', '1.00', 10, owner='me'))
+    return book
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_fok_under_cancel_newest_refuses_a_level_the_policy_may_allocate_to_its_owner(policy):
+    book = shared_level_book('CANCEL_NEWEST', policy)
+    fok = order('fok', 'BUY', '1.00', 10, owner='me', time_in_force='FOK')
+    assert book.add_order(fok) == []
+    assert fok.status == 'CANCELLED'
+    assert fok.filled_quantity == 0
+    assert (book.orders['theirs'].quantity, book.orders['mine'].quantity) == (20, 10)
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_fok_under_cancel_newest_fills_before_a_level_holding_its_own_order(policy):
+    book = OrderBook(tick_size=TICK_SIZE, stp_mode='CANCEL_NEWEST', allocation=POLICIES[policy](), clock=lambda: NOW)
+    book.add_order(order('theirs', 'SELL', '1.00', 10, owner='other'))
+    book.add_order(order('mine', 'SELL', '1.01', 10, owner='me'))
+    fok = order('fok', 'BUY', '1.01', 10, owner='me', time_in_force='FOK')
+    assert [(t.sell_order_id, t.quantity) for t in book.add_order(fok)] == [('theirs', 10)]
+    assert fok.status == 'FILLED'
+
+@pytest.mark.parametrize('policy', POLICIES)
+def test_fok_under_cancel_oldest_fills_from_other_owners_in_a_shared_level(policy):
+    book = shared_level_book('CANCEL_OLDEST', policy)
+    fok = order('fok', 'BUY', '1.00', 10, owner='me', time_in_force='FOK')
+    assert sum(t.quantity for t in book.add_order(fok)) == 10
+    assert fok.status == 'FILLED'
+    assert book.orders['mine'].status == 'CANCELLED'
+    assert not book.bids
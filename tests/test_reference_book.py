@@ -0,0 +1,77 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from tests.reference_book import ReferenceBook, random_flow
+from trade.order_matching import Order, OrderBook
+
+# OrderBook against the brute-force ReferenceBook on seeded random flow,
+# with and without a tick size.
+
+NOW = datetime(2024, 1, 1)
+BOOK_OPTIONS = {'decimal': {}, 'ticks': {'tick_size': Decimal('0.1')}}
+SEEDS = range(5)
+EVENTS = 2000
+
+def new_order(fields) -> Order:
+    order_id, side, price, quantity, order_type, time_in_force = fields
+    return Order(order_id, 'X', side, price, quantity, NOW, order_type, time_in_force)
+
+def fills(trades):
+    return [(t.buy_order_id, t.sell_order_id, t.price, t.quantity) for t in trades]
+
+def depth(book: OrderBook):
+    snapshot = book.get_order_book_snapshot()
+    return [tuple(level) for level in snapshot['bids']], [tuple(level) for level in snapshot['asks']]
+
+@pytest.mark.parametrize('options', BOOK_OPTIONS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_time_in_force_and_market_orders_match_the_reference(options, seed):
+    reference, book = ReferenceBook(), OrderBook(**BOOK_OPTIONS[options])
+    for action, payload in random_flow(seed, EVENTS):
+        if action == 'add':
+            assert fills(book.add_order(new_order(payload))) == reference.add(*payload), payload
+            assert book.orders[payload[0]].status == reference.status[payload[0]], payload
+        else:
+            assert book.cancel_order(payload) == reference.cancel(payload)
+        assert depth(book) == reference.depth()
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_batches_match_single_adds(seed):
+    single, batched = OrderBook(tick_size=Decimal('0.1')), OrderBook(tick_size=Decimal('0.1'))
+    single_fills, batch_fills, pending = [], [], []
+    for action, payload in random_flow(seed, EVENTS):
+        if action == 'add':
+            single_fills += fills(single.add_order(new_order(payload)))
+            pending.append(new_order(payload))
+        else:
+            single.cancel_order(payload)
+            blotter = batched.add_orders(pending)
+            batch_fills += zip(blotter.buy_order_id, blotter.sell_order_id, blotter.price, blotter.quantity)
+            pending = []
+            batched.cancel_order(payload)
+    blotter = batched.add_orders(pending)
+    batch_fills += zip(blotter.buy_order_id, blotter.sell_order_id, blotter.price, blotter.quantity)
+    assert batch_fills == single_fills
+    assert batched.get_order_book_snapshot() == single.get_order_book_snapshot()
+    assert {k: o.status for k, o in batched.orders.items()} == {k: o.status for k, o in single.orders.items()}
+
+@pytest.mark.parametrize('options', BOOK_OPTIONS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_amends_and_queue_priority_match_the_reference(options, seed):
+    reference, book = ReferenceBook(), OrderBook(**BOOK_OPTIONS[options])
+    for action, payload in random_flow(seed, EVENTS, amends=0.3):
+        if action == 'add':
+            assert fills(book.add_order(new_order(payload))) == reference.add(*payload), payload
+        elif action == 'cancel':
+            assert book.cancel_order(payload) == reference.cancel(payload)
+        else:
+            trades, expected = book.amend_order(*payload), reference.amend(*payload)
+            assert (trades is None, trades and fills(trades)) == (expected is None, expected), payload
+        assert depth(book) == reference.depth()
+    for side, levels in (('BUY', book.bids), ('SELL', book.asks)):
+        for level in levels.values():
+            assert [order.order_id for order in level] == reference.queue(side, level.price)
+            assert level.quantity == sum(order.quantity for order in level)
+            assert level.count == len(list(level))
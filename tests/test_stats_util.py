@@ -0,0 +1,39 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.stats_util import RollingZScore, zscore
+
+def ratios(seed=0, count=5000):
+    """A random-walk ratio with NaN gaps and a flat stretch where the std is zero."""
+    rng = np.random.default_rng(seed)
+    values = 0.5 + np.cumsum(rng.normal(0, 1e-3, count))
+    values[rng.random(count) < 0.01] = np.nan
+    values[100:110] = values[100]
+    return values
+
+@pytest.mark.parametrize('window', [None, 1, 2, 60, 1440])
+def test_rolling_zscore_matches_zscore(window):
+    values = ratios()
+    rolling = RollingZScore(window)
+    streamed = np.array([rolling.update(value) for value in values])
+    assert np.isclose(streamed, zscore(pd.Series(values), window).to_numpy(), rtol=1e-6, atol=1e-6,
+                      equal_nan=True).all()
+
+@pytest.mark.parametrize('window', [None, 60])
+def test_zscore_does_not_look_ahead(window):
+    values = ratios()
+    head = zscore(pd.Series(values[:2000]), window).to_numpy()
+    assert np.array_equal(head, zscore(pd.Series(values), window).to_numpy()[:2000], equal_nan=True)
+
+def test_zscore_is_nan_while_the_std_is_zero():
+    assert zscore(pd.Series([1.0, 1.0, 1.0, 2.0])).iloc[:3].isna().all()
+    rolling = RollingZScore(2)
+    assert math.isnan(rolling.update(1.0)) and math.isnan(rolling.update(1.0))
+    assert rolling.update(3.0) == pytest.approx(1.0)
+
+def test_rolling_zscore_rejects_an_empty_window():
+    with pytest.raises(ValueError, match='at least 1'):
+        RollingZScore(0)
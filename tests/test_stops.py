@@ -0,0 +1,59 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from trade.journal import EventJournal
+from trade.order_matching import Order, OrderBook
+from trade.stops import StopBook, StopOrder
+from trade.trade_store import TradeStore
+
+TICK_SIZE = Decimal('0.01')
+NOW = datetime(2024, 1, 1)
+
+def order(order_id, side, price, quantity):
+    return Order(order_id, 'X', side, Decimal(price), quantity, NOW)
+
+def stop(order_id, stop_price, owner=None):
+    return StopOrder(order_id, 'X', 'BUY', Decimal(stop_price), 1, NOW, limit_price=Decimal('0.50'), owner=owner)
+
+def test_order_cannot_take_a_pending_stop_id():
+    stops = StopBook(OrderBook(tick_size=TICK_SIZE))
+    stops.add_stop(stop('s1', '1.00'))
+    with pytest.raises(ValueError, match='already exists'):
+        stops.add_order(order('s1', 'BUY', '0.10', 1))
+    stops.add_order(order('ask', 'SELL', '1.00', 1))
+    trades = stops.add_order(order('bid', 'BUY', '1.00', 1))
+    assert [(t.buy_order_id, t.sell_order_id) for t in trades] == [('bid', 'ask')]
+    assert stops.stops['s1'].status == 'TRIGGERED'
+    assert stops.book.orders['s1'].price == Decimal('0.50')
+
+def test_stop_id_too_long_for_the_trade_store_is_rejected():
+    book = OrderBook(tick_size=TICK_SIZE, trade_store=TradeStore(TICK_SIZE, capacity=8, id_size=4))
+    stops = StopBook(book)
+    with pytest.raises(ValueError, match='cannot be stored'):
+        stops.add_stop(stop('stop1', '1.00'))
+    assert not stops.stops and not stops.buy_stops
+
+def test_stop_id_or_owner_too_long_for_the_journal_is_rejected(tmp_path):
+    journal = EventJournal(str(tmp_path / 'journal'), TICK_SIZE)
+    stops = StopBook(OrderBook(tick_size=TICK_SIZE, journal=journal))
+    with pytest.raises(ValueError, match='longer than'):
+        stops.add_stop(stop('s' * 17, '1.00'))
+    with pytest.raises(ValueError, match='longer than'):
+        stops.add_stop(stop('s1', '1.00', owner='o' * 17))
+    assert not stops.stops and not stops.buy_stops
+    journal.close()
+
+def test_unfired_stops_stay_pending_when_the_book_raises():
+    book = OrderBook(tick_size=TICK_SIZE)
+    stops = StopBook(book)
+    for order_id in ('s1', 's2'):
+        stops.add_stop(stop(order_id, '1.00'))
+    # Bypasses the StopBook, so the book itself refuses s1 when it fires
+    book.add_order(order('s1', 'BUY', '0.10', 1))
+    book.add_order(order('ask', 'SELL', '1.00', 1))
+    with pytest.raises(ValueError, match='already exists'):
+        stops.add_order(order('bid', 'BUY', '1.00', 1))
+    assert [stop.status for stop in stops.stops.values()] == ['PENDING', 'PENDING']
+    assert list(stops.buy_stops[Decimal('1.00')]) == ['s1', 's2']
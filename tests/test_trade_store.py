@@ -0,0 +1,32 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from trade.order_matching import Order, OrderBook
+from trade.trade_store import TradeStore
+
+TICK_SIZE = Decimal('0.01')
+NOW = datetime(2024, 1, 1)
+
+def order(order_id, side, quantity):
+    return Order(order_id, 'X', side, Decimal('1.00'), quantity, NOW)
+
+def test_book_without_store_keeps_a_list():
+    assert OrderBook(tick_size=TICK_SIZE).trades == []
+
+def test_over_long_id_is_rejected_before_matching():
+    book = OrderBook(tick_size=TICK_SIZE, trade_store=TradeStore(TICK_SIZE, capacity=8))
+    book.add_order(order('resting', 'SELL', 5))
+    with pytest.raises(ValueError):
+        book.add_order(order('b' * 20, 'BUY', 5))
+    assert book.orders['resting'].quantity == 5
+    assert len(book.trades) == 0
+
+def test_batch_records_fills_before_the_failing_order():
+    book = OrderBook(tick_size=TICK_SIZE, trade_store=TradeStore(TICK_SIZE, capacity=8))
+    book.add_order(order('resting', 'SELL', 5))
+    with pytest.raises(ValueError, match='characters'):
+        book.add_orders([order('first', 'BUY', 2), order('b' * 20, 'BUY', 2)])
+    assert book.orders['resting'].quantity == 3
+    assert book.trades.to_numpy()['buy_order_id'].tolist() == [b'first']
@@ -0,0 +1,83 @@
+from typing import Callable, Iterable, List, Tuple
+
+# Allocation policies decide how a fill smaller than a price level's total
+# open quantity is split among the level's orders. ``allocate(level,
+# quantity)`` receives the PriceLevel (orders linked head to tail in time
+# priority, with aggregate ``quantity``) and returns (order, fill quantity)
+# pairs summing to ``quantity``, in the order the fills are to be recorded.
+# A level taken completely fills every order in full whatever the policy,
+# so the book never asks the policy about it.
+
+class FifoAllocation:
+    """Strict price-time priority: fill the oldest orders first."""
+    def allocate(self, level, quantity: int) -> Iterable[Tuple[object, int]]:
+        order = level.head
+        while quantity > 0:
+            fill = min(quantity, order.quantity)
+            next_order = order.next_order  # the book unlinks filled orders as it goes
+            yield order, fill
+            quantity -= fill
+            order = next_order
+
+class ProRataAllocation:
+    """Split the fill in proportion to each order's open quantity.
+
+    Every order gets floor(size * fill / level size); shares below
+    ``minimum`` are dropped, and the lots left over go to orders in time
+    priority.
+    """
+    def __init__(self, minimum: int = 1):
+        self.minimum = minimum
+
+    def allocate(self, level, quantity: int) -> List[Tuple[object, int]]:
+        total = level.quantity
+        minimum = self.minimum
+        shares = []
+        left = quantity
+        order = level.head
+        while order is not None:
+            share = order.quantity * quantity // total
+            if share < minimum:
+                share = 0
+            shares.append([order, share])
+            left -= share
+            order = order.next_order
+        for allocation in shares:
+            if not left:
+                break
+            extra = min(left, allocation[0].quantity - allocation[1])
+            allocation[1] += extra
+            left -= extra
+        return [(order, share) for order, share in shares if share]
+
+class FifoLmmAllocation:
+    """Price-time priority after a carve-out for lead market makers.
+
+    Orders for which ``is_lmm(order)`` is true first share up to ``share`` of
+    the fill between them in time priority; the rest of the fill then goes
+    to all orders, LMM ones included, in time priority.
+    """
+    def __init__(self, is_lmm: Callable[[object], bool], share: float = 0.4):
+        self.is_lmm = is_lmm
+        self.share = share
+
+    def allocate(self, level, quantity: int) -> List[Tuple[object, int]]:
+        is_lmm = self.is_lmm
+        allocations = {}
+        carve_out = int(quantity * self.share)
+        order = level.head
+        while order is not None and carve_out:
+            if is_lmm(order):
+                fill = min(carve_out, order.quantity)
+                allocations[order] = fill
+                carve_out -= fill
+            order = order.next_order
+        left = quantity - sum(allocations.values())
+        order = level.head
+        while left:
+            fill = min(left, order.quantity - allocations.get(order, 0))
+            if fill:
+                allocations[order] = allocations.get(order, 0) + fill
+                left -= fill
+            order = order.next_order
+        return list(allocations.items())
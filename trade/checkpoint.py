@@ -0,0 +1,242 @@
+import gc
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from decimal import Decimal
+from itertools import compress, islice
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+from trade.journal import SIDE_CODES, SIDE_NAMES, JournalReader
+from trade.order_matching import Order, OrderBook, PriceLevel
+from trade.replay import read_journal_events, replay
+
+# File header: magic, tick size as text, journal sequence the checkpoint was
+# taken at, L2 sequence, number of price levels and number of orders
+HEADER = struct.Struct('<8s32sQQQQ')
+MAGIC = b'OBCKPT03'
+# Every section after the header is a byte length followed by the bytes
+LENGTH = struct.Struct('<Q')
+SECTION_COUNT = 23
+# Strings in a section are each terminated by NUL, so ids and symbols may not contain it
+TERMINATOR = '\0'
+
+class Checkpoint(NamedTuple):
+    book: OrderBook
+    journal_seq: int
+
+def save_checkpoint(book: OrderBook, path: str, journal_seq: Optional[int] = None) -> int:
+    """Write every order in the book to a compact binary checkpoint at ``path``.
+
+    Orders are stored column-wise in order-ID index order, with repeated
+    symbols, prices, statuses, timestamps, order types, times in force and
+    owners dictionary-encoded, and each
+    price level as the positions of its orders in FIFO order. ``journal_seq``
+    (default: the attached journal's current sequence) is recorded so a
+    restore knows where the journal tail starts. The file is written beside
+    ``path`` and renamed over it, so a crash never leaves a torn checkpoint.
+    Returns the recorded journal sequence.
+    """
+    if journal_seq is None:
+        journal_seq = book.journal.sequence if book.journal is not None else 0
+    orders = list(book.orders.values())
+    position = {id(order): index for index, order in enumerate(orders)}
+    levels = [*book.bids.values(), *book.asks.values()]
+
+    symbols, symbol_index = _dictionary(order.symbol for order in orders)
+    prices, price_index = _dictionary(order.price for order in orders)
+    statuses, status_index = _dictionary(order.status for order in orders)
+    timestamps, timestamp_index = _dictionary(order.timestamp for order in orders)
+    order_types, order_type_index = _dictionary(order.order_type for order in orders)
+    times_in_force, time_in_force_index = _dictionary(order.time_in_force for order in orders)
+    owners, owner_index = _dictionary(order.owner for order in orders)
+    price_code = {price: code for code, price in enumerate(prices)}
+
+    sections = [
+        _pack_strings([order.order_id for order in orders]),
+        _pack_strings(symbols), _pack_array('I', symbol_index),
+        _pack_array('B', [SIDE_CODES[order.side] for order in orders]),
+        _pack_strings(['' if price is None else str(price) for price in prices]), _pack_array('I', price_index),
+        _pack_array('q', [order.quantity for order in orders]),
+        _pack_array('q', [order.filled_quantity for order in orders]),
+        _pack_strings(statuses), _pack_array('I', status_index),
+        _pack_strings(['' if timestamp is None else timestamp.isoformat() for timestamp in timestamps]),
+        _pack_array('I', timestamp_index),
+        _pack_strings(order_types), _pack_array('I', order_type_index),
+        _pack_strings(times_in_force), _pack_array('I', time_in_force_index),
+        _pack_strings(['' if owner is None else owner for owner in owners]), _pack_array('I', owner_index),
+        _pack_array('B', [1] * len(book.bids) + [2] * len(book.asks)),
+        _pack_array('I', [price_code[level.price] for level in levels]),
+        _pack_array('q', [level.count for level in levels]),
+        _pack_array('q', [level.quantity for level in levels]),
+        _pack_array('I', [position[id(order)] for level in levels for order in level]),
+    ]
+
+    tick_text = str(book.tick_size).encode() if book.tick_size is not None else b''
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, tick_text, journal_seq, book.l2_sequence, len(levels), len(orders)))
+        for section in sections:
+            f.write(LENGTH.pack(len(section)))
+            f.write(section)
+    os.replace(temp_path, path)
+    return journal_seq
+
+def load_checkpoint(path: str, journal=None, clock: Callable[[], datetime] = datetime.now,
+                    allocation=None, stp_mode: Optional[str] = None, ledger=None) -> Checkpoint:
+    """Rebuild the book saved by ``save_checkpoint`` and return it with its journal sequence.
+
+    The allocation policy, self-trade prevention mode and ledger are not part
+    of the checkpoint; pass the ones the book was running with.
+
+    Orders are created with bulk ``map`` calls over the decoded columns and
+    linked into their levels directly, without going through matching, and
+    the cyclic garbage collector is paused while the objects are built.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, tick_text, journal_seq, l2_sequence, level_count, order_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not an order book checkpoint")
+    tick_text = tick_text.rstrip(b'\0').decode()
+    book = OrderBook(tick_size=Decimal(tick_text) if tick_text else None, journal=journal, clock=clock,
+                     allocation=allocation, stp_mode=stp_mode, ledger=ledger)
+    sections = list(_sections(data, HEADER.size))
+    if len(sections) != SECTION_COUNT:
+        raise ValueError(f"{path} is truncated or corrupt")
+    sections = iter(sections)
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        order_ids = _unpack_strings(next(sections))
+        symbols = _unpack_strings(next(sections))
+        symbol_index = _unpack_array('I', next(sections))
+        side_codes = _unpack_array('B', next(sections))
+        prices = [Decimal(text) if text else None for text in _unpack_strings(next(sections))]
+        price_index = _unpack_array('I', next(sections))
+        quantities = _unpack_array('q', next(sections))
+        filled_quantities = _unpack_array('q', next(sections))
+        statuses = _unpack_strings(next(sections))
+        status_index = _unpack_array('I', next(sections))
+        timestamps = [datetime.fromisoformat(text) if text else None
+                      for text in _unpack_strings(next(sections))]
+        timestamp_index = _unpack_array('I', next(sections))
+        order_types = _unpack_strings(next(sections))
+        order_type_index = _unpack_array('I', next(sections))
+        times_in_force = _unpack_strings(next(sections))
+        time_in_force_index = _unpack_array('I', next(sections))
+        owners = [text or None for text in _unpack_strings(next(sections))]
+        owner_index = _unpack_array('I', next(sections))
+        level_sides = _unpack_array('B', next(sections))
+        level_prices = _unpack_array('I', next(sections))
+        level_counts = _unpack_array('q', next(sections))
+        level_quantities = _unpack_array('q', next(sections))
+        level_positions = _unpack_array('I', next(sections))
+
+        orders = list(map(Order, order_ids, map(symbols.__getitem__, symbol_index),
+                          map(SIDE_NAMES.__getitem__, side_codes), map(prices.__getitem__, price_index),
+                          quantities, map(timestamps.__getitem__, timestamp_index),
+                          map(order_types.__getitem__, order_type_index),
+                          map(times_in_force.__getitem__, time_in_force_index),
+                          map(owners.__getitem__, owner_index)))
+        keys = [_price_key(book, price) for price in prices]
+        active = statuses.index('ACTIVE') if 'ACTIVE' in statuses else -1
+        for order, price_code, status_code in zip(orders, price_index, status_index):
+            order.price_key = keys[price_code]
+            if status_code != active:
+                order.status = statuses[status_code]
+        for order, filled_quantity in compress(zip(orders, filled_quantities), filled_quantities):
+            order.filled_quantity = filled_quantity
+
+        bids: List[PriceLevel] = []
+        asks: List[PriceLevel] = []
+        start = 0
+        for side_code, price_code, count, quantity in zip(level_sides, level_prices, level_counts, level_quantities):
+            level = PriceLevel(keys[price_code], prices[price_code])
+            queue = list(map(orders.__getitem__, level_positions[start:start + count]))
+            start += count
+            for previous, order in zip(queue, islice(queue, 1, None)):
+                previous.next_order = order
+                order.prev_order = previous
+            level.head = queue[0]
+            level.tail = queue[-1]
+            level.count = count
+            level.quantity = quantity
+            (bids if side_code == SIDE_CODES['BUY'] else asks).append(level)
+
+        if len(orders) != order_count or len(bids) + len(asks) != level_count:
+            raise ValueError(f"{path} is truncated or corrupt")
+        book.orders = dict(zip(order_ids, orders))
+        book._load_levels(bids, asks)
+        book.l2_sequence = l2_sequence
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return Checkpoint(book, journal_seq)
+
+def restore(checkpoint_path: str, journal_path: Optional[str] = None,
+            clock: Callable[[], datetime] = datetime.now, allocation=None,
+            stp_mode: Optional[str] = None, ledger=None) -> OrderBook:
+    """Load a checkpoint and replay the journal records written after it.
+
+    The tail is replayed without a journal attached, so nothing is written
+    twice; to keep journaling, open an EventJournal on ``journal_path`` and
+    assign it to ``book.journal`` afterwards.
+    """
+    book, journal_seq = load_checkpoint(checkpoint_path, clock=clock, allocation=allocation,
+                                        stp_mode=stp_mode, ledger=ledger)
+    if journal_path is not None:
+        if JournalReader(journal_path).tick_size != book.tick_size:
+            raise ValueError("The journal and the checkpoint have different tick sizes")
+        result = replay(read_journal_events(journal_path, journal_seq), book=book)
+        if result.fills_match is False:
+            raise ValueError(f"Replaying {journal_path} from sequence {journal_seq} "
+                             f"did not reproduce the journaled fills")
+    return book
+
+def _price_key(book: OrderBook, price: Optional[Decimal]):
+    # Market orders never rest, so their key is not needed once they are done
+    if price is None or book.tick_size is None:
+        return price
+    return int(price / book.tick_size)
+
+def _dictionary(values) -> tuple:
+    """Split values into a table of distinct values and an index of table codes."""
+    codes: dict = {}
+    index = [codes.setdefault(value, len(codes)) for value in values]
+    return list(codes), index
+
+def _pack_strings(strings: List[str]) -> bytes:
+    text = TERMINATOR.join(strings) + TERMINATOR if strings else ''
+    if text.count(TERMINATOR) != len(strings):
+        raise ValueError("Checkpoint strings may not contain NUL characters")
+    return text.encode()
+
+def _unpack_strings(data) -> List[str]:
+    return bytes(data).decode().split(TERMINATOR)[:-1]
+
+def _pack_array(typecode: str, values) -> bytes:
+    # Arrays are stored little-endian
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def _unpack_array(typecode: str, data) -> array:
+    unpacked = array(typecode)
+    unpacked.frombytes(data)
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked
+
+def _sections(data: bytes, offset: int) -> Iterator[memoryview]:
+    view = memoryview(data)
+    while offset < len(data):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + length > len(data):
+            raise ValueError("Checkpoint section runs past the end of the file")
+        yield view[offset:offset + length]
+        offset += length
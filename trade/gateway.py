@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import json
+import struct
+from datetime import datetime
+from decimal import Decimal
+from functools import partial
+from typing import Dict, List, Optional, Set
+
+from trade.journal import ORDER_TYPE_NAMES, SIDE_CODES, SIDE_NAMES, TIME_IN_FORCE_NAMES
+from trade.order_matching import LevelUpdate, Order, OrderBook
+
+# Clients speak either newline-delimited JSON or fixed binary frames; the
+# first byte of a connection decides ('{' is JSON). Requests are
+#   {"action": "add", "symbol", "order_id", "side", "price", "quantity",
+#    "order_type", "time_in_force", "owner"}      (the last three optional)
+#   {"action": "cancel", "symbol", "order_id"}
+#   {"action": "amend", "symbol", "order_id", "quantity", "price"}  (either optional)
+#   {"action": "subscribe", "symbol"}             (L2 deltas for the symbol)
+# and responses are
+#   {"type": "ack", "action", "symbol", "order_id", "side", "status", "price", "quantity", "filled_quantity"}
+#   {"type": "trade", "symbol", "buy_order_id", "sell_order_id", "price", "quantity", "timestamp"}
+#   {"type": "l2", "symbol", "side", "price", "quantity", "count", "sequence"}
+#   {"type": "reject", "action", "symbol", "order_id", "reason"}
+# Binary frames carry the same fields with prices in ticks and names coded as
+# in the journal: REQUEST is action, side, order type, time in force, price
+# ticks (0: market order / unchanged), quantity (0: unchanged), order id,
+# symbol and owner; RESPONSE is type, action, side, status, price ticks,
+# quantity, filled quantity (count for l2), sequence, order id (buy order id
+# for trades, reject reason for rejects), contra id (sell order id for trades,
+# order id for rejects) and symbol.
+REQUEST = struct.Struct('<BBBB4xqq16s16s16s')
+RESPONSE = struct.Struct('<BBBB4xqqqq16s16s16s')
+ACTION_CODES = {'add': 1, 'cancel': 2, 'amend': 3, 'subscribe': 4}
+ACTION_NAMES = {code: name for name, code in ACTION_CODES.items()}
+TYPE_CODES = {'ack': 1, 'trade': 2, 'l2': 3, 'reject': 4}
+STATUS_CODES = {'ACTIVE': 1, 'FILLED': 2, 'CANCELLED': 3, 'REJECTED': 4}
+JSON_START = b'{'
+
+class _Session:
+    """One client connection: its protocol, bounded outbound queue and writer task."""
+    def __init__(self, gateway: 'OrderGateway', writer: asyncio.StreamWriter, binary: bool):
+        self.gateway = gateway
+        self.writer = writer
+        self.binary = binary
+        self.outbound: asyncio.Queue = asyncio.Queue(gateway.outbound_size)
+        # Set once the client has disconnected and only queued responses remain to be sent
+        self.closing = False
+        self.closed = False
+        self.task = asyncio.ensure_future(self._write())
+
+    def send(self, event: dict):
+        if self.closing or self.closed:
+            return
+        try:
+            self.outbound.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client that stops reading must not stall matching for everyone
+            self.close()
+
+    def finish(self):
+        """Close once the responses already queued have been written."""
+        self.send(None)
+        self.closing = True
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.gateway._drop(self)
+            self.task.cancel()
+            self.writer.close()
+
+    async def _write(self):
+        encode = self.gateway._encode_binary if self.binary else _encode_json
+        outbound = self.outbound
+        try:
+            finished = False
+            while not finished:
+                events = [await outbound.get()]
+                while not outbound.empty():
+                    events.append(outbound.get_nowait())
+                # finish() queues None last and nothing is queued after it
+                finished = events[-1] is None
+                if finished:
+                    events.pop()
+                self.writer.write(b''.join(map(encode, events)))
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.close()
+
+class OrderGateway:
+    """Asyncio front end feeding client orders to one OrderBook per symbol.
+
+    Connections are read concurrently, but every request goes through one
+    bounded inbound queue to a single matching task, so the books are only
+    touched from one place and requests are matched in arrival order. When
+    the queue is full, readers stop reading their sockets and the kernel's
+    flow control pushes back on the clients. The matching task takes up to
+    ``batch_size`` queued requests per wake-up, so under load event loop
+    switches and socket writes are paid per batch rather than per order.
+    Each client has a bounded outbound queue; a client that falls more than
+    ``outbound_size`` responses behind is disconnected. ``book_options``
+    are passed to every new OrderBook.
+    """
+    def __init__(self, tick_size: Decimal, queue_size: int = 4096, outbound_size: int = 16384,
+                 batch_size: int = 256, book_options: Optional[dict] = None):
+        self.tick_size = Decimal(str(tick_size))
+        self.queue_size = queue_size
+        self.outbound_size = outbound_size
+        self.batch_size = batch_size
+        self.book_options = book_options or {}
+        self.books: Dict[str, OrderBook] = {}
+        self._inbound: Optional[asyncio.Queue] = None
+        self._matcher: Optional[asyncio.Task] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._sessions: Set[_Session] = set()
+        # Who to send trades to, by (symbol, order id) of orders still in play,
+        # and who gets each symbol's L2 deltas
+        self._order_sessions: Dict[tuple, _Session] = {}
+        self._subscribers: Dict[str, Set[_Session]] = {}
+
+    def book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(tick_size=self.tick_size, **self.book_options)
+            book.subscribe_l2(partial(self._publish_l2, symbol))
+        return book
+
+    async def start_tcp(self, host: str = '127.0.0.1', port: int = 0,
+                        backlog: int = 1024) -> asyncio.AbstractServer:
+        self._start()
+        server = await asyncio.start_server(self._handle, host, port, backlog=backlog)
+        self._servers.append(server)
+        return server
+
+    async def start_unix(self, path: str, backlog: int = 1024) -> asyncio.AbstractServer:
+        # Load tests open many connections at once, more than asyncio's default backlog of 100
+        self._start()
+        server = await asyncio.start_unix_server(self._handle, path, backlog=backlog)
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        for session in list(self._sessions):
+            session.close()
+        if self._matcher is not None:
+            self._matcher.cancel()
+            self._matcher = None
+
+    def _start(self):
+        if self._matcher is None:
+            self._inbound = asyncio.Queue(self.queue_size)
+            self._matcher = asyncio.ensure_future(self._match())
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            first = await reader.readexactly(1)
+        except asyncio.IncompleteReadError:
+            writer.close()
+            return
+        session = _Session(self, writer, binary=first != JSON_START)
+        self._sessions.add(session)
+        inbound = self._inbound
+        try:
+            if session.binary:
+                data = first + await reader.readexactly(REQUEST.size - 1)
+                while True:
+                    await inbound.put((session, self._decode_binary(data)))
+                    data = await reader.readexactly(REQUEST.size)
+            else:
+                line = first + await reader.readline()
+                while line:
+                    await inbound.put((session, _decode_json(line)))
+                    line = await reader.readline()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # Queued behind the client's requests, so their responses go out first
+            await inbound.put((session, ('close', None)))
+
+    async def _match(self):
+        inbound = self._inbound
+        batch_size = self.batch_size
+        while True:
+            batch = [await inbound.get()]
+            while len(batch) < batch_size and not inbound.empty():
+                batch.append(inbound.get_nowait())
+            for session, request in batch:
+                # Any failure rejects its own request only; the task must keep serving everyone
+                try:
+                    self._apply(session, request)
+                except Exception as e:
+                    action, payload = request
+                    session.send({'type': 'reject', 'action': action, 'symbol': _symbol(action, payload),
+                                  'order_id': _order_id(action, payload), 'reason': str(e) or type(e).__name__})
+
+    def _apply(self, session: _Session, request: tuple):
+        action, payload = request
+        if action == 'add':
+            order = payload
+            book = self.book(order.symbol)
+            if order.order_id in book.orders:
+                raise ValueError(f"Order id {order.order_id} already exists")
+            self._order_sessions[order.symbol, order.order_id] = session
+            try:
+                trades = book.add_order(order)
+            except Exception:
+                if order.order_id not in book.orders:
+                    del self._order_sessions[order.symbol, order.order_id]
+                raise
+            self._ack(session, 'add', order)
+            self._send_trades(order.symbol, book, trades)
+            self._forget(order)
+        elif action == 'cancel':
+            symbol, order_id = payload
+            book = self.book(symbol)
+            if self._order_sessions.get((symbol, order_id)) is not session:
+                raise ValueError("Unknown order")
+            if not book.cancel_order(order_id):
+                raise ValueError("Order is not active")
+            self._ack(session, 'cancel', book.orders[order_id])
+            self._forget(book.orders[order_id])
+        elif action == 'amend':
+            symbol, order_id, quantity, price = payload
+            book = self.book(symbol)
+            if self._order_sessions.get((symbol, order_id)) is not session:
+                raise ValueError("Unknown order")
+            trades = book.amend_order(order_id, quantity, price)
+            if trades is None:
+                raise ValueError("Order is not active or would cross")
+            self._ack(session, 'amend', book.orders[order_id])
+            self._send_trades(symbol, book, trades)
+            self._forget(book.orders[order_id])
+        elif action == 'subscribe':
+            self.book(payload)
+            self._subscribers.setdefault(payload, set()).add(session)
+        elif action == 'invalid':
+            session.send(payload)
+        elif action == 'close':
+            session.finish()
+
+    def _forget(self, order: Order):
+        """Stop routing trades for an order that can no longer trade."""
+        if order.status != 'ACTIVE':
+            self._order_sessions.pop((order.symbol, order.order_id), None)
+
+    def _ack(self, session: _Session, action: str, order: Order):
+        session.send({'type': 'ack', 'action': action, 'symbol': order.symbol, 'order_id': order.order_id,
+                      'side': order.side, 'status': order.status, 'price': order.price,
+                      'quantity': order.quantity, 'filled_quantity': order.filled_quantity})
+
+    def _send_trades(self, symbol: str, book: OrderBook, trades):
+        sessions = self._order_sessions
+        for trade in trades:
+            event = {'type': 'trade', 'symbol': symbol, 'buy_order_id': trade.buy_order_id,
+                     'sell_order_id': trade.sell_order_id, 'price': trade.price, 'quantity': trade.quantity,
+                     'timestamp': trade.timestamp}
+            buyer = sessions.get((symbol, trade.buy_order_id))
+            seller = sessions.get((symbol, trade.sell_order_id))
+            if buyer is not None:
+                buyer.send(event)
+            if seller is not None and seller is not buyer:
+                seller.send(event)
+        # Forget the resting orders the trades finished
+        for trade in trades:
+            for order_id in (trade.buy_order_id, trade.sell_order_id):
+                if book.orders[order_id].status != 'ACTIVE':
+                    sessions.pop((symbol, order_id), None)
+
+    def _publish_l2(self, symbol: str, update: LevelUpdate):
+        subscribers = self._subscribers.get(symbol)
+        if subscribers:
+            event = {'type': 'l2', 'symbol': symbol, 'side': update.side, 'price': update.price,
+                     'quantity': update.quantity, 'count': update.count, 'sequence': update.seq}
+            for session in list(subscribers):
+                session.send(event)
+
+    def _drop(self, session: _Session):
+        self._sessions.discard(session)
+        for subscribers in self._subscribers.values():
+            subscribers.discard(session)
+
+    def _decode_binary(self, data: bytes) -> tuple:
+        (action, side, order_type, time_in_force, price_ticks, quantity,
+         order_id, symbol, owner) = REQUEST.unpack(data)
+        order_id = order_id.rstrip(b'\0').decode(errors='replace')
+        symbol = symbol.rstrip(b'\0').decode(errors='replace')
+        try:
+            name = ACTION_NAMES[action]
+            if name == 'add':
+                order_type = ORDER_TYPE_NAMES[order_type]
+                price = price_ticks * self.tick_size if order_type == 'LIMIT' else None
+                return 'add', Order(order_id, symbol, SIDE_NAMES[side], price, _quantity(quantity), datetime.now(),
+                                    order_type, TIME_IN_FORCE_NAMES[time_in_force],
+                                    owner.rstrip(b'\0').decode() or None)
+            if name == 'cancel':
+                return 'cancel', (symbol, order_id)
+            if name == 'amend':
+                return 'amend', (symbol, order_id, _quantity(quantity) if quantity else None,
+                                 price_ticks * self.tick_size if price_ticks else None)
+            return 'subscribe', symbol
+        except (KeyError, ValueError) as e:
+            reason = f"Unknown code {e}" if isinstance(e, KeyError) else str(e)
+            return 'invalid', {'type': 'reject', 'action': ACTION_NAMES.get(action), 'symbol': symbol,
+                               'order_id': order_id, 'reason': reason}
+
+    def _encode_binary(self, event: dict) -> bytes:
+        kind = event['type']
+        tick_size = self.tick_size
+        price = event.get('price')
+        price_ticks = int(price / tick_size) if price is not None else 0
+        if kind == 'ack':
+            return RESPONSE.pack(TYPE_CODES[kind], ACTION_CODES[event['action']], SIDE_CODES[event['side']],
+                                 STATUS_CODES[event['status']], price_ticks, event['quantity'],
+                                 event['filled_quantity'], 0, event['order_id'].encode(), b'',
+                                 event['symbol'].encode())
+        if kind == 'trade':
+            return RESPONSE.pack(TYPE_CODES[kind], 0, 0, 0, price_ticks, event['quantity'], 0, 0,
+                                 event['buy_order_id'].encode(), event['sell_order_id'].encode(),
+                                 event['symbol'].encode())
+        if kind == 'l2':
+            return RESPONSE.pack(TYPE_CODES[kind], 0, SIDE_CODES[event['side']], 0, price_ticks,
+                                 event['quantity'], event['count'], event['sequence'], b'', b'',
+                                 event['symbol'].encode())
+        return RESPONSE.pack(TYPE_CODES[kind], ACTION_CODES.get(event['action'], 0), 0, 0, 0, 0, 0, 0,
+                             event['reason'].encode()[:16], (event['order_id'] or '').encode(),
+                             (event['symbol'] or '').encode())
+
+def _decode_json(line: bytes) -> tuple:
+    message = {}
+    try:
+        message = json.loads(line)
+        action = message['action']
+        if action == 'add':
+            order_type = message.get('order_type', 'LIMIT')
+            price = _price(message['price']) if order_type == 'LIMIT' else None
+            side = message['side']
+            if side not in SIDE_CODES:
+                raise ValueError(f"Side must be BUY or SELL, not {side!r}")
+            return 'add', Order(str(message['order_id']), _text(message, 'symbol'), side, price,
+                                _quantity(message['quantity']), datetime.now(), order_type,
+                                message.get('time_in_force', 'GTC'),
+                                _text(message, 'owner') if message.get('owner') is not None else None)
+        if action == 'cancel':
+            return 'cancel', (_text(message, 'symbol'), str(message['order_id']))
+        if action == 'amend':
+            price, quantity = message.get('price'), message.get('quantity')
+            return 'amend', (_text(message, 'symbol'), str(message['order_id']),
+                             _quantity(quantity) if quantity is not None else None,
+                             _price(price) if price is not None else None)
+        if action == 'subscribe':
+            return 'subscribe', _text(message, 'symbol')
+        raise ValueError(f"Unknown action {action}")
+    except (ValueError, KeyError, TypeError, ArithmeticError) as e:
+        reason = f"Missing field {e}" if isinstance(e, KeyError) else str(e) or type(e).__name__
+        action = message.get('action') if isinstance(message, dict) else None
+        return 'invalid', {'type': 'reject', 'action': action, 'symbol': None, 'order_id': None, 'reason': reason}
+
+def _text(message: dict, field: str) -> str:
+    value = message[field]
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string, not {value!r}")
+    return value
+
+def _quantity(value) -> int:
+    # bool is an int subclass, and true must not mean a quantity of 1
+    if type(value) is not int or value <= 0:
+        raise ValueError(f"Quantity must be a positive integer, not {value!r}")
+    return value
+
+def _price(value) -> Decimal:
+    """A limit price given as a JSON number or a decimal string."""
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            price = Decimal(str(value))
+        except ArithmeticError:
+            price = None
+        if price is not None and price.is_finite() and price > 0:
+            return price
+    raise ValueError(f"Price must be a positive number, not {value!r}")
+
+def _encode_json(event: dict) -> bytes:
+    return json.dumps(event, default=_json_default, separators=(',', ':')).encode() + b'\n'
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _symbol(action: str, payload) -> Optional[str]:
+    if action == 'add':
+        return payload.symbol
+    return payload if action == 'subscribe' else payload[0]
+
+def _order_id(action: str, payload) -> Optional[str]:
+    if action == 'add':
+        return payload.order_id
+    return None if action == 'subscribe' else payload[1]
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve OrderBooks over a local TCP or Unix socket")
+    parser.add_argument('--tick-size', default='0.01', help="Tick size of every book")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    args = parser.parse_args()
+
+    async def serve():
+        gateway = OrderGateway(Decimal(args.tick_size))
+        server = await (gateway.start_unix(args.unix) if args.unix else gateway.start_tcp(args.host, args.port))
+        print(f"Order gateway listening on {args.unix or f'{args.host}:{args.port}'}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+if __name__ == "__main__":
+    main()
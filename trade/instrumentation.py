@@ -0,0 +1,199 @@
+from time import perf_counter_ns
+from typing import Dict, List, Optional
+
+# Optional timing and counters for an OrderBook. Nothing here runs unless a
+# BookMetrics is passed to the book: instrument() then shadows the book's
+# hot methods with timed wrappers on that one instance, so an
+# uninstrumented book executes exactly the code it always did.
+
+class Histogram:
+    """Fixed-bucket log-linear histogram in the style of HdrHistogram.
+
+    Values below 2**sub_bucket_bits are counted exactly; above that every
+    power of two is split into 2**(sub_bucket_bits - 1) equal buckets, so a
+    bucket is at most 1 / 2**(sub_bucket_bits - 1) of its value wide (about
+    3% with the default 5 bits). Values of 2**max_bits and above share the
+    last bucket. Recording is a few integer operations and one list store.
+    """
+    __slots__ = ('sub_bucket_bits', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, sub_bucket_bits: int = 5, max_bits: int = 40):
+        self.sub_bucket_bits = sub_bucket_bits
+        half = 1 << (sub_bucket_bits - 1)
+        self.counts: List[int] = [0] * ((1 << sub_bucket_bits) + (max_bits - sub_bucket_bits) * half)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value: int):
+        bits = self.sub_bucket_bits
+        if value >> bits:
+            shift = value.bit_length() - bits
+            index = (1 << bits) + (shift - 1) * (1 << (bits - 1)) + (value >> shift) - (1 << (bits - 1))
+            if index >= len(self.counts):
+                index = len(self.counts) - 1
+        else:
+            index = value
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def upper_bound(self, index: int) -> int:
+        """Largest value counted in bucket ``index``."""
+        bits = self.sub_bucket_bits
+        if index < 1 << bits:
+            return index
+        half = 1 << (bits - 1)
+        shift, offset = divmod(index - (1 << bits), half)
+        return ((half + offset + 1) << (shift + 1)) - 1
+
+    def percentile(self, quantile: float) -> int:
+        """Value at or below which ``quantile`` of the recorded values fall (bucket upper bound)."""
+        if not self.count:
+            return 0
+        target = max(1, quantile * self.count)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+    def buckets(self):
+        """(upper bound, cumulative count) for every non-empty bucket, in increasing order."""
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                yield min(self.upper_bound(index), self.max), seen
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0,
+            'p50': self.percentile(0.50),
+            'p90': self.percentile(0.90),
+            'p99': self.percentile(0.99),
+            'p99_9': self.percentile(0.999),
+            'max': self.max,
+        }
+
+class BookMetrics:
+    """Latency histograms and match counters collected by an instrumented OrderBook.
+
+    Latencies are perf_counter_ns deltas. ``add_order`` covers one order's
+    admission, matching and resting, whether it came through add_order or
+    add_orders; ``match`` covers each sweep of the opposite side. Per
+    sweep, ``queue_depth`` records the orders queued at the best opposite
+    level when it started, ``levels_touched`` the price levels it traded at
+    and ``fills_per_aggressor`` its fills.
+    """
+    LATENCIES = ('add_order', 'cancel_order', 'amend_order', 'match')
+    DISTRIBUTIONS = ('levels_touched', 'fills_per_aggressor', 'queue_depth')
+
+    def __init__(self, sub_bucket_bits: int = 5):
+        self.latency: Dict[str, Histogram] = {name: Histogram(sub_bucket_bits) for name in self.LATENCIES}
+        self.distributions: Dict[str, Histogram] = {name: Histogram(sub_bucket_bits)
+                                                    for name in self.DISTRIBUTIONS}
+        self.fills = 0
+        self.traded_quantity = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'latency_ns': {name: histogram.to_dict() for name, histogram in self.latency.items()},
+            **{name: histogram.to_dict() for name, histogram in self.distributions.items()},
+            'fills': self.fills,
+            'traded_quantity': self.traded_quantity,
+        }
+
+    def to_prometheus(self, prefix: str = 'orderbook', labels: Optional[Dict[str, str]] = None) -> str:
+        """Render the metrics in the Prometheus text exposition format.
+
+        Latencies become ``<prefix>_<operation>_seconds`` histograms with one
+        ``le`` bucket per non-empty histogram bucket.
+        """
+        label_text = ','.join(f'{key}="{value}"' for key, value in (labels or {}).items())
+        lines = []
+
+        def histogram(name: str, help_text: str, values: Histogram, scale: float):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            separator = ',' if label_text else ''
+            for bound, cumulative in values.buckets():
+                lines.append(f'{name}_bucket{{{label_text}{separator}le="{bound * scale:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text}{separator}le="+Inf"}} {values.count}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f'{name}_sum{suffix} {values.sum * scale:g}')
+            lines.append(f'{name}_count{suffix} {values.count}')
+
+        for name, values in self.latency.items():
+            histogram(f'{prefix}_{name}_seconds', f'Latency of {name.replace("_", " ")}', values, 1e-9)
+        for name, values in self.distributions.items():
+            histogram(f'{prefix}_{name}', f'{name.replace("_", " ").capitalize()} per sweep', values, 1)
+        suffix = f'{{{label_text}}}' if label_text else ''
+        for name, value, help_text in (('fills_total', self.fills, 'Fills executed'),
+                                       ('traded_quantity_total', self.traded_quantity, 'Quantity traded')):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            lines.append(f'{prefix}_{name}{suffix} {value}')
+        return '\n'.join(lines) + '\n'
+
+def instrument(book, metrics: BookMetrics) -> BookMetrics:
+    """Time ``book``'s operations into ``metrics`` by shadowing its methods on the instance.
+
+    OrderBook calls this when constructed with ``metrics``; call it directly
+    for a book built another way, such as one loaded from a checkpoint.
+    """
+    clock = perf_counter_ns
+    add_latency = metrics.latency['add_order'].record
+    cancel_latency = metrics.latency['cancel_order'].record
+    amend_latency = metrics.latency['amend_order'].record
+    match_latency = metrics.latency['match'].record
+    levels_touched = metrics.distributions['levels_touched'].record
+    fills_per_aggressor = metrics.distributions['fills_per_aggressor'].record
+    queue_depth = metrics.distributions['queue_depth'].record
+    process_order = book._process_order
+    cancel_order = book.cancel_order
+    amend_order = book.amend_order
+    sweep = book._sweep
+
+    def timed_process_order(order, price_key, record, timestamp):
+        start = clock()
+        process_order(order, price_key, record, timestamp)
+        add_latency(clock() - start)
+
+    def timed_cancel_order(order_id):
+        start = clock()
+        cancelled = cancel_order(order_id)
+        cancel_latency(clock() - start)
+        return cancelled
+
+    def timed_amend_order(order_id, quantity=None, price=None):
+        start = clock()
+        trades = amend_order(order_id, quantity, price)
+        amend_latency(clock() - start)
+        return trades
+
+    def timed_sweep(order, record, timestamp):
+        # Only called once the order crosses, so the best opposite level exists
+        level = book._best_ask if order.side == 'BUY' else book._best_bid
+        queue_depth(level.count)
+        fills = []
+        start = clock()
+        sweep(order, fills.append, timestamp)
+        match_latency(clock() - start)
+        fills_per_aggressor(len(fills))
+        levels_touched(len({fill[2] for fill in fills}))
+        metrics.fills += len(fills)
+        for fill in fills:
+            metrics.traded_quantity += fill[3]
+            record(fill)
+
+    book._process_order = timed_process_order
+    book.cancel_order = timed_cancel_order
+    book.amend_order = timed_amend_order
+    book._sweep = timed_sweep
+    book.metrics = metrics
+    return metrics
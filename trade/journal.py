@@ -0,0 +1,191 @@
+import mmap
+import os
+import struct
+from decimal import Decimal
+from typing import Iterator, NamedTuple
+
+# Event types
+ACCEPT = 1
+CANCEL = 2
+AMEND = 3
+FILL = 4
+
+EVENT_NAMES = {ACCEPT: 'ACCEPT', CANCEL: 'CANCEL', AMEND: 'AMEND', FILL: 'FILL'}
+SIDE_CODES = {'BUY': 1, 'SELL': 2}
+SIDE_NAMES = {code: side for side, code in SIDE_CODES.items()}
+# Zero codes are the defaults, so records written before these fields existed read as LIMIT/GTC
+ORDER_TYPE_CODES = {'LIMIT': 0, 'MARKET': 1}
+ORDER_TYPE_NAMES = {code: name for name, code in ORDER_TYPE_CODES.items()}
+TIME_IN_FORCE_CODES = {'GTC': 0, 'IOC': 1, 'FOK': 2, 'POST_ONLY': 3}
+TIME_IN_FORCE_NAMES = {code: name for name, code in TIME_IN_FORCE_CODES.items()}
+
+# File header: magic, tick size as text, padding to one 64-byte record
+HEADER = struct.Struct('<8s32s24x')
+MAGIC = b'OBJRNL01'
+# Fixed-width event record (64 bytes): sequence number, event type, side,
+# order type, time in force, price in ticks, quantity, order id and contra
+# order id (UTF-8, NUL padded)
+RECORD = struct.Struct('<QBBBB4xqq16s16s')
+ORDER_ID_SIZE = 16
+# Records a new journal has room for, and the least a full one grows by
+DEFAULT_CAPACITY = 1 << 16
+
+class JournalRecord(NamedTuple):
+    seq: int
+    event: int
+    side: str
+    price_ticks: int
+    quantity: int
+    order_id: str
+    contra_order_id: str
+    order_type: str
+    time_in_force: str
+
+class EventJournal:
+    """Append-only market-by-order event log in a memory-mapped file.
+
+    Every book mutation is written as one fixed 64-byte RECORD with a
+    monotonic sequence number, packed straight into the mapping so no Python
+    object is kept per event. ACCEPT records carry the order's limit price
+    (0 for market orders), size, order type, time in force and owner (in the
+    contra_order_id field), CANCEL records the quantity left open, AMEND the new price and open
+    quantity, and FILL the aggressor (order_id), the resting order
+    (contra_order_id), the level price and the fill size. The file grows by
+    doubling and is trimmed to its used length on close, and an existing
+    journal is reopened for appending.
+    """
+    def __init__(self, path: str, tick_size: Decimal, capacity: int = DEFAULT_CAPACITY):
+        self.path = path
+        self.tick_size = Decimal(str(tick_size))
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER.size
+        self._file = open(path, 'r+b' if exists else 'w+b')
+        if exists:
+            size = os.path.getsize(path)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+            magic, tick_text = HEADER.unpack_from(self._mmap, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an order book journal")
+            if Decimal(tick_text.rstrip(b'\0').decode()) != self.tick_size:
+                raise ValueError(f"{path} was written with a different tick size")
+            used = _count_records(self._mmap, size)
+            self._offset = HEADER.size + used * RECORD.size
+            self.sequence = RECORD.unpack_from(self._mmap, self._offset - RECORD.size)[0] if used else 0
+        else:
+            size = HEADER.size + capacity * RECORD.size
+            self._file.truncate(size)
+            self._mmap = mmap.mmap(self._file.fileno(), size)
+            HEADER.pack_into(self._mmap, 0, MAGIC, str(self.tick_size).encode())
+            self.sequence = 0
+            self._offset = HEADER.size
+        self._size = size
+
+    def append(self, event: int, side: str, price_ticks: int, quantity: int, order_id: str,
+               contra_order_id: str = '', order_type: str = 'LIMIT', time_in_force: str = 'GTC') -> int:
+        """Write one event and return its sequence number."""
+        order_id_bytes = order_id.encode()
+        if len(order_id_bytes) > ORDER_ID_SIZE:
+            raise ValueError(f"Order id {order_id} is longer than {ORDER_ID_SIZE} bytes")
+        if self._offset + RECORD.size > self._size:
+            self._grow()
+        self.sequence += 1
+        RECORD.pack_into(self._mmap, self._offset, self.sequence, event, SIDE_CODES[side],
+                         ORDER_TYPE_CODES[order_type], TIME_IN_FORCE_CODES[time_in_force],
+                         price_ticks, quantity, order_id_bytes, contra_order_id.encode())
+        self._offset += RECORD.size
+        return self.sequence
+
+    def accept(self, side: str, price_ticks: int, quantity: int, order_id: str,
+               order_type: str = 'LIMIT', time_in_force: str = 'GTC', owner: str = '') -> int:
+        if len(owner.encode()) > ORDER_ID_SIZE:
+            raise ValueError(f"Owner {owner} is longer than {ORDER_ID_SIZE} bytes")
+        return self.append(ACCEPT, side, price_ticks, quantity, order_id, owner, order_type, time_in_force)
+
+    def cancel(self, side: str, price_ticks: int, quantity: int, order_id: str) -> int:
+        return self.append(CANCEL, side, price_ticks, quantity, order_id)
+
+    def amend(self, side: str, price_ticks: int, quantity: int, order_id: str) -> int:
+        return self.append(AMEND, side, price_ticks, quantity, order_id)
+
+    def fill(self, side: str, price_ticks: int, quantity: int, order_id: str, contra_order_id: str) -> int:
+        return self.append(FILL, side, price_ticks, quantity, order_id, contra_order_id)
+
+    def __len__(self):
+        return (self._offset - HEADER.size) // RECORD.size
+
+    def flush(self):
+        self._mmap.flush()
+
+    def close(self):
+        """Flush, trim the file to the records written and release the mapping."""
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+            self._file.truncate(self._offset)
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _grow(self):
+        # Doubling alone would never grow a file with no record slots (an
+        # empty journal trimmed on close, or capacity=0)
+        records = (self._size - HEADER.size) // RECORD.size
+        self._size = HEADER.size + max(2 * records, DEFAULT_CAPACITY) * RECORD.size
+        self._mmap.close()
+        self._file.truncate(self._size)
+        self._mmap = mmap.mmap(self._file.fileno(), self._size)
+
+def _count_records(buffer, size: int) -> int:
+    """Number of written records: slots are filled in order, so binary search for the first zero sequence."""
+    low, high = 0, (size - HEADER.size) // RECORD.size
+    while low < high:
+        middle = (low + high) // 2
+        if struct.unpack_from('<Q', buffer, HEADER.size + middle * RECORD.size)[0]:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def _iter_records(buffer, size: int, start: int = 0) -> Iterator[tuple]:
+    """Yield raw record tuples for the written slots of a journal buffer, from slot ``start``."""
+    end = HEADER.size + _count_records(buffer, size) * RECORD.size
+    view = memoryview(buffer)[min(HEADER.size + start * RECORD.size, end):end]
+    records = RECORD.iter_unpack(view)
+    try:
+        yield from records
+    finally:
+        del records
+        view.release()
+
+class JournalReader:
+    """Iterate the JournalRecords of a journal file in sequence order."""
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, tick_text = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an order book journal")
+        self.tick_size = Decimal(tick_text.rstrip(b'\0').decode())
+
+    def records(self, after_seq: int = 0) -> Iterator[JournalRecord]:
+        """Yield records with a sequence number greater than ``after_seq``.
+
+        Sequence numbers start at 1 and match the record's slot, so the
+        reader seeks straight to the first wanted record.
+        """
+        size = os.path.getsize(self.path)
+        if size <= HEADER.size:
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as buffer:
+            for (seq, event, side, order_type, time_in_force, price_ticks, quantity,
+                 order_id, contra_order_id) in _iter_records(buffer, size, after_seq):
+                yield JournalRecord(seq, event, SIDE_NAMES[side], price_ticks, quantity,
+                                    order_id.rstrip(b'\0').decode(), contra_order_id.rstrip(b'\0').decode(),
+                                    ORDER_TYPE_NAMES[order_type], TIME_IN_FORCE_NAMES[time_in_force])
+
+    def __iter__(self) -> Iterator[JournalRecord]:
+        return self.records()
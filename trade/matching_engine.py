@@ -0,0 +1,160 @@
+import multiprocessing as mp
+import queue
+import zlib
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from trade.order_matching import Order, OrderBook
+
+# Input messages are (action, payload) tuples sent to a shard in batches:
+#   ('add', Order), ('cancel', (symbol, order_id)),
+#   ('amend', (symbol, order_id, quantity, price)), ('snapshot', symbol)
+# Output messages are (kind, symbol, payload) tuples returned in batches:
+#   ('trade', symbol, Trade), ('cancel', symbol, (order_id, ok)), ('amend', symbol, (order_id, ok)),
+#   ('snapshot', symbol, dict), ('error', symbol, message)
+
+def _run_shard(input_queue, output_queue, tick_size: Optional[Decimal], allocation=None,
+               stp_mode: Optional[str] = None):
+    """Worker loop: own the books for one shard and process batches in arrival order."""
+    books: Dict[str, OrderBook] = {}
+
+    def book_for(symbol: str) -> OrderBook:
+        book = books.get(symbol)
+        if book is None:
+            book = books[symbol] = OrderBook(tick_size=tick_size, allocation=allocation, stp_mode=stp_mode)
+        return book
+
+    while True:
+        batch = input_queue.get()
+        if batch is None:
+            break
+        events = []
+        for action, payload in batch:
+            symbol = payload.symbol if action == 'add' else payload if action == 'snapshot' else payload[0]
+            try:
+                if action == 'add':
+                    for trade in book_for(symbol).add_order(payload):
+                        events.append(('trade', symbol, trade))
+                elif action == 'cancel':
+                    order_id = payload[1]
+                    events.append(('cancel', symbol, (order_id, book_for(symbol).cancel_order(order_id))))
+                elif action == 'amend':
+                    _, order_id, quantity, price = payload
+                    trades = book_for(symbol).amend_order(order_id, quantity, price)
+                    for trade in trades or ():
+                        events.append(('trade', symbol, trade))
+                    events.append(('amend', symbol, (order_id, trades is not None)))
+                elif action == 'snapshot':
+                    events.append(('snapshot', symbol, book_for(symbol).get_order_book_snapshot()))
+            except Exception as e:
+                events.append(('error', symbol, str(e)))
+        if events:
+            output_queue.put(events)
+
+class MatchingEngine:
+    """Route orders by symbol to worker processes that each own a shard of order books.
+
+    Every symbol maps to exactly one shard and each shard reads a single FIFO
+    input queue, so orders for a symbol are matched in submission order while
+    different symbols match in parallel. Messages are buffered per shard and
+    sent in batches of ``batch_size``; call ``flush`` to push out a partial
+    batch. Results come back on one output queue, read with ``poll``.
+    ``allocation`` is the allocation policy of every book and must be
+    picklable, as each worker receives a copy. ``stp_mode`` is the
+    self-trade prevention mode of every book.
+    """
+    def __init__(self, num_workers: Optional[int] = None, tick_size: Optional[Decimal] = None,
+                 batch_size: int = 256, start_method: Optional[str] = None, allocation=None,
+                 stp_mode: Optional[str] = None):
+        context = mp.get_context(start_method)
+        self.num_workers = num_workers or context.cpu_count()
+        self.batch_size = batch_size
+        self.input_queues = [context.Queue() for _ in range(self.num_workers)]
+        self.output_queue = context.Queue()
+        self.workers = [
+            context.Process(target=_run_shard,
+                            args=(input_queue, self.output_queue, tick_size, allocation, stp_mode), daemon=True)
+            for input_queue in self.input_queues
+        ]
+        self._pending: List[List[Tuple[str, object]]] = [[] for _ in range(self.num_workers)]
+        self._started = False
+
+    def start(self):
+        """Start the worker processes."""
+        if not self._started:
+            for worker in self.workers:
+                worker.start()
+            self._started = True
+
+    def stop(self) -> List[tuple]:
+        """Flush pending messages, shut the workers down and return any unread events.
+
+        The output queue is drained while waiting, since a worker cannot exit
+        until the events it has put on the queue are consumed.
+        """
+        events: List[tuple] = []
+        if self._started:
+            self.flush()
+            for input_queue in self.input_queues:
+                input_queue.put(None)
+            while any(worker.is_alive() for worker in self.workers):
+                events.extend(self.poll(timeout=0.05))
+            while True:
+                batch = self.poll(timeout=0.05)
+                if not batch:
+                    break
+                events.extend(batch)
+            for worker in self.workers:
+                worker.join()
+            self._started = False
+        return events
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def shard_for(self, symbol: str) -> int:
+        """Stable shard index for a symbol."""
+        return zlib.crc32(symbol.encode()) % self.num_workers
+
+    def submit(self, order: Order):
+        """Queue a new order for matching on its symbol's shard."""
+        self._send(order.symbol, ('add', order))
+
+    def cancel(self, symbol: str, order_id: str):
+        """Queue a cancel; the result comes back as a ('cancel', ...) event."""
+        self._send(symbol, ('cancel', (symbol, order_id)))
+
+    def amend(self, symbol: str, order_id: str, quantity: Optional[int] = None,
+              price: Optional[Decimal] = None):
+        """Queue an amend; any trades come back first, then an ('amend', ...) event."""
+        self._send(symbol, ('amend', (symbol, order_id, quantity, price)))
+
+    def request_snapshot(self, symbol: str):
+        """Queue a snapshot request; the book comes back as a ('snapshot', ...) event."""
+        self._send(symbol, ('snapshot', symbol))
+
+    def flush(self):
+        """Send every partially filled batch to its shard."""
+        for shard, pending in enumerate(self._pending):
+            if pending:
+                self.input_queues[shard].put(pending)
+                self._pending[shard] = []
+
+    def poll(self, timeout: Optional[float] = None) -> List[tuple]:
+        """Return the next batch of output events, or [] if none arrives within timeout."""
+        try:
+            return self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+    def _send(self, symbol: str, message: Tuple[str, object]):
+        shard = self.shard_for(symbol)
+        pending = self._pending[shard]
+        pending.append(message)
+        if len(pending) >= self.batch_size:
+            self.input_queues[shard].put(pending)
+            self._pending[shard] = []
@@ -1,28 +1,68 @@
-from collections import defaultdict
 from decimal import Decimal
+import gc
 from datetime import datetime
-from typing import List, Dict, Optional
+from collections import deque
+from contextlib import suppress
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Union
 import heapq
+from sortedcontainers import SortedDict
+
+from trade.allocation import FifoAllocation
+from trade.instrumentation import instrument
+
+# Integer ticks when the book has a tick size, otherwise the Decimal price
+PriceKey = Union[int, Decimal]
+
+ORDER_TYPES = ('LIMIT', 'MARKET')
+# GTC rests any remainder, IOC cancels it, FOK fills completely or not at all,
+# POST_ONLY rests without matching and is rejected if it would cross
+TIMES_IN_FORCE = ('GTC', 'IOC', 'FOK', 'POST_ONLY')
+
+# Keys market orders match at: they cross every level on the other side
+MARKET_BUY_KEY = float('inf')
+MARKET_SELL_KEY = float('-inf')
+
+# What happens when an order would trade against a resting order of the same
+# owner: cancel the incoming order's remainder, cancel the resting order, or
+# take the smaller open quantity off both without a trade
+STP_MODES = ('CANCEL_NEWEST', 'CANCEL_OLDEST', 'DECREMENT_BOTH')
 
 class Order:
-    def __init__(self, order_id: str, symbol: str, side: str, price: Decimal, 
-                 quantity: int, timestamp: datetime):
+    __slots__ = ('order_id', 'symbol', 'side', 'price', 'price_key', 'quantity',
+                 'filled_quantity', 'status', 'timestamp', 'order_type', 'time_in_force',
+                 'owner', 'prev_order', 'next_order')
+
+    def __init__(self, order_id: str, symbol: str, side: str, price: Optional[Decimal],
+                 quantity: int, timestamp: datetime, order_type: str = 'LIMIT',
+                 time_in_force: str = 'GTC', owner: Optional[str] = None):
         self.order_id = order_id
         self.symbol = symbol  # Add symbol field
         self.side = side
+        # None for market orders
         self.price = price
+        # Price as keyed in the book; set by OrderBook when the order is accepted
+        self.price_key = None
         self.quantity = quantity
         self.filled_quantity = 0
         self.status = 'ACTIVE'
         self.timestamp = timestamp
+        self.order_type = order_type
+        self.time_in_force = time_in_force
+        # Account the order belongs to, for self-trade prevention and ledgers
+        self.owner = owner
+        # Neighbours in the price level queue while the order is resting
+        self.prev_order: Optional['Order'] = None
+        self.next_order: Optional['Order'] = None
 
     def __str__(self):
         return (f"Order(id={self.order_id}, symbol={self.symbol}, "
-                f"side={self.side}, price={self.price}, "
+                f"side={self.side}, type={self.order_type}, tif={self.time_in_force}, price={self.price}, "
                 f"quantity={self.quantity}, filled={self.filled_quantity}, "
                 f"status={self.status})")
 
 class Trade:
+    __slots__ = ('buy_order_id', 'sell_order_id', 'price', 'quantity', 'timestamp')
+
     def __init__(self, buy_order_id: str, sell_order_id: str, price: Decimal, quantity: int, timestamp: datetime):
         self.buy_order_id = buy_order_id
         self.sell_order_id = sell_order_id
@@ -33,39 +73,319 @@ class Trade:
     def __repr__(self):
         return f"Trade(buy={self.buy_order_id}, sell={self.sell_order_id}, {self.price} x {self.quantity})"
 
-class OrderBook:
+class LevelUpdate(NamedTuple):
+    """New state of one price level after a book change (market-by-price delta)."""
+    side: str
+    price: Decimal
+    quantity: int
+    count: int
+    seq: int
+
+class LevelUpdateBuffer:
+    """Ring buffer subscriber for level updates; keeps the most recent ``maxlen``."""
+    def __init__(self, maxlen: Optional[int] = 65536):
+        self.updates: deque = deque(maxlen=maxlen)
+
+    def __call__(self, update: LevelUpdate):
+        self.updates.append(update)
+
+    def drain(self) -> List[LevelUpdate]:
+        """Return and clear the buffered updates, oldest first."""
+        updates = list(self.updates)
+        self.updates.clear()
+        return updates
+
+class TradeBlotter:
+    """Columnar trade record: one list per trade field, in fill order."""
+    __slots__ = ('buy_order_id', 'sell_order_id', 'price', 'quantity', 'timestamp')
+
+    def __init__(self, fills: Iterable[tuple] = ()):
+        columns = list(zip(*fills)) or [()] * len(self.__slots__)
+        self.buy_order_id: List[str] = list(columns[0])
+        self.sell_order_id: List[str] = list(columns[1])
+        self.price: List[Decimal] = list(columns[2])
+        self.quantity: List[int] = list(columns[3])
+        self.timestamp: List[datetime] = list(columns[4])
+
+    def __len__(self):
+        return len(self.quantity)
+
+    def extend(self, other: 'TradeBlotter'):
+        """Append another blotter's trades after this one's."""
+        for name in self.__slots__:
+            getattr(self, name).extend(getattr(other, name))
+
+    def to_dict(self) -> Dict[str, list]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_dict())
+
+def _as_str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+def orders_from_array(array) -> Iterable[Order]:
+    """Yield Orders from the rows of a NumPy structured array.
+
+    A datetime64 timestamp field becomes datetimes at microsecond precision
+    (NaT becomes None), whatever its unit; ``tolist()`` alone would turn
+    nanosecond stamps into plain integers.
+    """
+    fields = array.dtype.names
+    columns = {name: (array[name].astype('M8[us]') if array.dtype[name].kind == 'M' else array[name]).tolist()
+               for name in fields}
+    count = len(array)
+    symbols = columns.get('symbol', [''] * count)
+    timestamps = columns.get('timestamp', [None] * count)
+    order_types = columns.get('order_type', ['LIMIT'] * count)
+    times_in_force = columns.get('time_in_force', ['GTC'] * count)
+    owners = columns.get('owner', [None] * count)
+    for order_id, symbol, side, price, quantity, timestamp, order_type, time_in_force, owner in zip(
+            columns['order_id'], symbols, columns['side'], columns['price'], columns['quantity'], timestamps,
+            order_types, times_in_force, owners):
+        yield Order(_as_str(order_id), _as_str(symbol), _as_str(side), price, quantity, timestamp,
+                    _as_str(order_type), _as_str(time_in_force), _as_str(owner) if owner else None)
+
+class AccountLedger:
+    """Running position and cash per owner, updated on every fill.
+
+    A buy adds the quantity to the owner's position and spends price *
+    quantity of cash, a sell does the opposite, so a risk check is a dict
+    lookup rather than a pass over past trades. Orders without an owner
+    are booked under None.
+    """
     def __init__(self):
-        # Price levels for buy orders (bids)
-        self.bids: Dict[Decimal, List[Order]] = defaultdict(list)
-        # Price levels for sell orders (asks)
-        self.asks: Dict[Decimal, List[Order]] = defaultdict(list)
+        self.positions: Dict[Optional[str], int] = {}
+        self.cash: Dict[Optional[str], Decimal] = {}
+
+    def record_fill(self, buyer: Optional[str], seller: Optional[str], price: Decimal, quantity: int):
+        notional = price * quantity
+        positions = self.positions
+        cash = self.cash
+        positions[buyer] = positions.get(buyer, 0) + quantity
+        cash[buyer] = cash.get(buyer, 0) - notional
+        positions[seller] = positions.get(seller, 0) - quantity
+        cash[seller] = cash.get(seller, 0) + notional
+
+    def position(self, owner: Optional[str]) -> int:
+        return self.positions.get(owner, 0)
+
+    def balance(self, owner: Optional[str]) -> Decimal:
+        return self.cash.get(owner, Decimal(0))
+
+class PriceLevel:
+    """FIFO queue of the orders resting at one price.
+
+    The queue is a doubly linked list threaded through the orders themselves,
+    so appending, popping the head and removing an order by reference are all
+    O(1). The level also keeps its aggregate open quantity and order count,
+    updated as orders join, fill and leave.
+    """
+    __slots__ = ('price_key', 'price', 'head', 'tail', 'count', 'quantity')
+
+    def __init__(self, price_key: PriceKey, price: Decimal):
+        self.price_key = price_key
+        self.price = price
+        self.head: Optional[Order] = None
+        self.tail: Optional[Order] = None
+        self.count = 0
+        self.quantity = 0
+
+    def append(self, order: Order):
+        """Queue an order behind the current tail."""
+        order.prev_order = self.tail
+        order.next_order = None
+        if self.tail is None:
+            self.head = order
+        else:
+            self.tail.next_order = order
+        self.tail = order
+        self.count += 1
+        self.quantity += order.quantity
+
+    def remove(self, order: Order):
+        """Unlink an order from anywhere in the queue."""
+        if order.prev_order is None:
+            self.head = order.next_order
+        else:
+            order.prev_order.next_order = order.next_order
+        if order.next_order is None:
+            self.tail = order.prev_order
+        else:
+            order.next_order.prev_order = order.prev_order
+        order.prev_order = None
+        order.next_order = None
+        self.count -= 1
+        self.quantity -= order.quantity
+
+    def pop_all(self):
+        """Empty the level, yielding each order with its open quantity, head first."""
+        order = self.head
+        self.head = self.tail = None
+        self.count = 0
+        self.quantity = 0
+        while order is not None:
+            next_order = order.next_order
+            order.prev_order = order.next_order = None
+            yield order, order.quantity
+            order = next_order
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        order = self.head
+        while order is not None:
+            yield order
+            order = order.next_order
+
+class OrderBook:
+    def __init__(self, tick_size: Optional[Decimal] = None, journal=None,
+                 clock: Callable[[], datetime] = datetime.now, allocation=None,
+                 stp_mode: Optional[str] = None, ledger: Optional[AccountLedger] = None, trade_store=None,
+                 metrics=None):
+        # Minimum price increment. When set, prices are normalized to integer
+        # ticks on entry and the book is keyed and matched on ints.
+        self.tick_size: Optional[Decimal] = Decimal(str(tick_size)) if tick_size is not None else None
+        # Optional trade.journal.EventJournal receiving every accept, fill and cancel
+        if journal is not None and journal.tick_size != self.tick_size:
+            raise ValueError("A journal needs a book with the same tick size")
+        self.journal = journal
+        # Source of trade timestamps; inject a deterministic clock for replays
+        self.clock = clock
+        # Splits partial level fills among resting orders (see trade.allocation)
+        self.allocation = allocation if allocation is not None else FifoAllocation()
+        # Self-trade prevention mode (one of STP_MODES), applied between orders with the same owner
+        if stp_mode is not None and stp_mode not in STP_MODES:
+            raise ValueError(f"Unknown self-trade prevention mode {stp_mode}")
+        self.stp_mode = stp_mode
+        # Optional AccountLedger updated with every fill
+        self.ledger = ledger
+        # Price levels for buy orders (bids), kept sorted by price key
+        self.bids: Dict[PriceKey, PriceLevel] = SortedDict()
+        # Price levels for sell orders (asks), kept sorted by price key
+        self.asks: Dict[PriceKey, PriceLevel] = SortedDict()
         # Quick lookup for orders by ID
         self.orders: Dict[str, Order] = {}
-        # Store trades
-        self.trades: List[Trade] = []
+        # Optional trade.trade_store.TradeStore recording every trade; see the trades property
+        self.trades = trade_store if trade_store is not None else []
         # Keep track of best bid and ask
         self.best_bid_price: Optional[Decimal] = None
         self.best_ask_price: Optional[Decimal] = None
+        # Best levels themselves, maintained as levels are created and emptied
+        self._best_bid: Optional[PriceLevel] = None
+        self._best_ask: Optional[PriceLevel] = None
+        # Level update subscribers and the sequence number of the last update
+        self._l2_subscribers: List[Callable[[LevelUpdate], None]] = []
+        self.l2_sequence = 0
+        # Optional trade.instrumentation.BookMetrics; when given, the hot methods
+        # are replaced on this instance by timed wrappers, otherwise nothing changes
+        self.metrics = None
+        if metrics is not None:
+            instrument(self, metrics)
+
+    @property
+    def trades(self):
+        """The book's TradeStore, or a list (the default) when fills are not recorded."""
+        return self._trades
+
+    @trades.setter
+    def trades(self, trades):
+        store = None if isinstance(trades, list) else trades
+        if store is not None:
+            if store.tick_size != self.tick_size:
+                raise ValueError("A trade store needs a book with the same tick size")
+            if any(len(order_id) > store.id_size for order_id in self.orders):
+                raise ValueError(f"The book holds order ids longer than the store's {store.id_size} characters")
+        self._trades = trades
+        self._trade_store = store
 
     def add_order(self, order: Order) -> List[Trade]:
         """Add a new order and return list of trades if any matches occur."""
-        if order.order_id in self.orders:
-            raise ValueError(f"Order id {order.order_id} already exists")
-
-        self.orders[order.order_id] = order
-        trades = []
-
-        if order.side == 'BUY':
-            trades = self._match_buy_order(order)
-            if order.quantity > 0:  # If order is not fully filled
-                self._add_to_bids(order)
-        else:  # SELL
-            trades = self._match_sell_order(order)
-            if order.quantity > 0:  # If order is not fully filled
-                self._add_to_asks(order)
-
+        fills: List[tuple] = []
+        self._process_order(order, self._price_key(order), fills.append, self.clock())
         self._update_best_prices()
-        return trades
+        if fills and self._trade_store is not None:
+            self._trade_store.extend(fills)
+        return [Trade(*fill) for fill in fills]
+
+    def add_orders(self, orders: Iterable[Order]) -> TradeBlotter:
+        """Add many orders in one pass and return their trades as a TradeBlotter.
+
+        ``orders`` is an iterable of Order objects or a NumPy structured array
+        with order_id, side, price and quantity fields (symbol, timestamp,
+        order_type, time_in_force and owner are optional). Trades are recorded
+        column-wise without building Trade objects, all fills share one
+        timestamp taken at the start of the batch, and best prices are
+        refreshed once at the end. The cyclic garbage collector is paused for
+        the batch; matching creates no garbage cycles.
+        """
+        if getattr(orders, 'dtype', None) is not None:
+            orders = orders_from_array(orders)
+
+        fills: List[tuple] = []
+        record = fills.append
+        process_order = self._process_order
+        price_key = self._price_key
+        timestamp = self.clock()
+        # Raw price -> (Decimal price, key), so each distinct price is parsed once
+        prices: Dict[object, tuple] = {}
+        store = self._trade_store
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for order in orders:
+                raw_price = order.price
+                cached = prices.get(raw_price) if order.order_type == 'LIMIT' else None
+                if cached is None:
+                    key = price_key(order)
+                    if order.order_type == 'LIMIT':
+                        prices[raw_price] = (order.price, key)
+                else:
+                    order.price, key = cached
+                process_order(order, key, record, timestamp)
+        except BaseException:
+            # The orders before the failing one have traded; record their
+            # fills, but never in place of the original error
+            if fills and store is not None:
+                with suppress(Exception):
+                    store.extend(fills)
+            raise
+        else:
+            if fills and store is not None:
+                store.extend(fills)
+        finally:
+            if gc_enabled:
+                gc.enable()
+            self._update_best_prices()
+        return TradeBlotter(fills)
+
+    def save_checkpoint(self, path: str) -> int:
+        """Write the book to a binary checkpoint file; see trade.checkpoint."""
+        from trade.checkpoint import save_checkpoint  # trade.checkpoint imports this module
+        return save_checkpoint(self, path)
+
+    @classmethod
+    def load_checkpoint(cls, path: str, journal=None, clock: Callable[[], datetime] = datetime.now,
+                        allocation=None, stp_mode: Optional[str] = None,
+                        ledger: Optional[AccountLedger] = None) -> 'OrderBook':
+        """Rebuild a book from a checkpoint written by ``save_checkpoint``."""
+        from trade.checkpoint import load_checkpoint
+        return load_checkpoint(path, journal, clock, allocation, stp_mode, ledger).book
+
+    def subscribe_l2(self, callback: Callable[[LevelUpdate], None]) -> Callable[[LevelUpdate], None]:
+        """Call ``callback`` with a LevelUpdate whenever a price level changes.
+
+        Updates are emitted once per level touched by an add, cancel or
+        sweep, in the order the changes happen. Pass a LevelUpdateBuffer to
+        collect them for draining instead.
+        """
+        self._l2_subscribers.append(callback)
+        return callback
+
+    def unsubscribe_l2(self, callback: Callable[[LevelUpdate], None]):
+        self._l2_subscribers.remove(callback)
 
     def cancel_order(self, order_id: str) -> bool:
         """Cancel an existing order. Returns True if successful."""
@@ -77,6 +397,8 @@ class OrderBook:
             return False
 
         order.status = 'CANCELLED'
+        if self.journal is not None:
+            self.journal.cancel(order.side, order.price_key, order.quantity, order_id)
         if order.side == 'BUY':
             self._remove_from_bids(order)
         else:
@@ -85,118 +407,428 @@ class OrderBook:
         self._update_best_prices()
         return True
 
-    def _match_buy_order(self, buy_order: Order) -> List[Trade]:
-        """Match a buy order against the order book."""
-        trades = []
-        while buy_order.quantity > 0 and self.asks:
-            best_ask_price = min(self.asks.keys())
-            if buy_order.price < best_ask_price:
-                break
+    def amend_order(self, order_id: str, quantity: Optional[int] = None,
+                    price: Optional[Decimal] = None) -> Optional[List[Trade]]:
+        """Change a resting order's open quantity and/or limit price.
+
+        Reducing the quantity at the same price is done in place and keeps the
+        order's queue priority. A price change or a size increase takes the
+        order out of its level and re-enters it like a new order, so it may
+        trade and any remainder joins the back of the queue. Returns the
+        trades, or None if the order is not active or a post-only order's new
+        price would cross.
+        """
+        order = self.orders.get(order_id)
+        if order is None or order.status != 'ACTIVE':
+            return None
+        if quantity is None:
+            quantity = order.quantity
+        if quantity <= 0:
+            raise ValueError("Amended quantity must be positive; use cancel_order to remove an order")
+        if price is None:
+            price, price_key = order.price, order.price_key
+        else:
+            price, price_key = self._normalize_price(price)
+
+        if price_key == order.price_key and quantity <= order.quantity:
+            if quantity < order.quantity:
+                if self.journal is not None:
+                    self.journal.amend(order.side, price_key, quantity, order_id)
+                side = self.bids if order.side == 'BUY' else self.asks
+                level = side[price_key]
+                level.quantity -= order.quantity - quantity
+                order.quantity = quantity
+                if self._l2_subscribers:
+                    self._publish_level(order.side, level)
+            return []
+        if order.time_in_force == 'POST_ONLY' and self._crosses(order.side, price_key):
+            return None
+
+        if self.journal is not None:
+            self.journal.amend(order.side, price_key, quantity, order_id)
+        if order.side == 'BUY':
+            self._remove_from_bids(order)
+        else:
+            self._remove_from_asks(order)
+        order.price = price
+        order.quantity = quantity
+        fills: List[tuple] = []
+        self._execute(order, price_key, fills.append, self.clock())
+        self._update_best_prices()
+        if fills and self._trade_store is not None:
+            self._trade_store.extend(fills)
+        return [Trade(*fill) for fill in fills]
+
+    def _process_order(self, order: Order, price_key: PriceKey, record: Callable, timestamp: datetime):
+        """Match an incoming order and rest any remainder its time in force allows.
+
+        Each fill is passed to ``record`` as a (buy_order_id, sell_order_id,
+        price, quantity, timestamp) tuple. A post-only order that would cross
+        ends REJECTED and a FOK order that cannot fill completely ends
+        CANCELLED, both without touching the book or the journal; the unfilled
+        remainder of an IOC, FOK or market order is CANCELLED instead of resting.
+        """
+        if order.order_id in self.orders:
+            raise ValueError(f"Order id {order.order_id} already exists")
+        if order.time_in_force not in TIMES_IN_FORCE:
+            raise ValueError(f"Unknown time in force {order.time_in_force}")
+        # Checked before matching, so the book never trades an id its store cannot record
+        store = self._trade_store
+        if store is not None and len(order.order_id) > store.id_size:
+            raise ValueError(f"Order ids longer than {store.id_size} characters cannot be stored")
+        order.price_key = price_key
+        if order.time_in_force != 'GTC' and not self._admit(order, price_key):
+            self.orders[order.order_id] = order
+            return
+        if self.journal is not None:
+            self.journal.accept(order.side, price_key if order.order_type == 'LIMIT' else 0,
+                                order.quantity, order.order_id, order.order_type, order.time_in_force,
+                                order.owner or '')
 
-            # Match against best ask price
-            sell_orders = self.asks[best_ask_price]
-            while sell_orders and buy_order.quantity > 0:
-                sell_order = sell_orders[0]
-                match_qty = min(buy_order.quantity, sell_order.quantity)
-                
-                # Create trade
-                trade = Trade(
-                    buy_order_id=buy_order.order_id,
-                    sell_order_id=sell_order.order_id,
-                    price=best_ask_price,
-                    quantity=match_qty,
-                    timestamp=datetime.now()
-                )
-                trades.append(trade)
-
-                # Update orders
-                buy_order.quantity -= match_qty
-                buy_order.filled_quantity += match_qty
-                sell_order.quantity -= match_qty
-                sell_order.filled_quantity += match_qty
-
-                if sell_order.quantity == 0:
-                    sell_order.status = 'FILLED'
-                    sell_orders.pop(0)
-                    if not sell_orders:
-                        del self.asks[best_ask_price]
-
-        return trades
-
-    def _match_sell_order(self, sell_order: Order) -> List[Trade]:
-        """Match a sell order against the order book."""
-        trades = []
-        while sell_order.quantity > 0 and self.bids:
-            best_bid_price = max(self.bids.keys())
-            if sell_order.price > best_bid_price:
-                break
+        self.orders[order.order_id] = order
+        self._execute(order, price_key, record, timestamp)
 
-            # Match against best bid price
-            buy_orders = self.bids[best_bid_price]
-            while buy_orders and sell_order.quantity > 0:
-                buy_order = buy_orders[0]
-                match_qty = min(sell_order.quantity, buy_order.quantity)
-
-                # Create trade
-                trade = Trade(
-                    buy_order_id=buy_order.order_id,
-                    sell_order_id=sell_order.order_id,
-                    price=best_bid_price,
-                    quantity=match_qty,
-                    timestamp=datetime.now()
-                )
-                trades.append(trade)
-
-                # Update orders
-                sell_order.quantity -= match_qty
-                sell_order.filled_quantity += match_qty
-                buy_order.quantity -= match_qty
-                buy_order.filled_quantity += match_qty
-
-                if buy_order.quantity == 0:
-                    buy_order.status = 'FILLED'
-                    buy_orders.pop(0)
-                    if not buy_orders:
-                        del self.bids[best_bid_price]
-
-        return trades
+    def _execute(self, order: Order, price_key: PriceKey, record: Callable, timestamp: datetime):
+        """Match an accepted order, then rest or cancel what is left of it."""
+        order.price_key = price_key
+        if order.side == 'BUY':
+            if self._best_ask is not None and price_key >= self._best_ask.price_key:
+                self._sweep(order, record, timestamp)
+                if order.status != 'ACTIVE':  # cancelled by self-trade prevention
+                    return
+            if order.quantity > 0:  # If order is not fully filled
+                if order.time_in_force in ('IOC', 'FOK') or order.order_type == 'MARKET':
+                    order.status = 'CANCELLED'
+                else:
+                    self._add_to_bids(order)
+        else:  # SELL
+            if self._best_bid is not None and price_key <= self._best_bid.price_key:
+                self._sweep(order, record, timestamp)
+                if order.status != 'ACTIVE':  # cancelled by self-trade prevention
+                    return
+            if order.quantity > 0:  # If order is not fully filled
+                if order.time_in_force in ('IOC', 'FOK') or order.order_type == 'MARKET':
+                    order.status = 'CANCELLED'
+                else:
+                    self._add_to_asks(order)
+        if order.quantity == 0:
+            order.status = 'FILLED'
+
+    def _crosses(self, side: str, price_key: PriceKey) -> bool:
+        """Whether an order on ``side`` at ``price_key`` would match on arrival."""
+        if side == 'BUY':
+            return self._best_ask is not None and price_key >= self._best_ask.price_key
+        return self._best_bid is not None and price_key <= self._best_bid.price_key
+
+    def _admit(self, order: Order, price_key: PriceKey) -> bool:
+        """Run the pre-match checks of a non-GTC order; False if it is turned away."""
+        time_in_force = order.time_in_force
+        if time_in_force == 'IOC':
+            return True
+        if time_in_force == 'POST_ONLY':
+            if order.order_type == 'MARKET':
+                raise ValueError("A market order cannot be post-only")
+            if self._crosses(order.side, price_key):
+                order.status = 'REJECTED'
+                return False
+            return True
+        # FOK
+        if not self._can_fill(order, price_key):
+            order.status = 'CANCELLED'
+            return False
+        return True
+
+    def _can_fill(self, order: Order, price_key: PriceKey) -> bool:
+        """Whether the levels crossing ``price_key`` can fill ``order`` completely.
+
+        Level aggregates are summed unless self-trade prevention applies to
+        the order. Then the levels are walked order by order and same-owner
+        quantity, which STP cancels or decrements rather than trades, does
+        not count. Under CANCEL_NEWEST, an allocation to a same-owner order
+        would cancel the order part-filled, so it cannot fill if it meets
+        one: with FIFO allocation that is a same-owner order ahead of the
+        quantity it needs, with any other policy a same-owner order anywhere
+        in a level it reaches, since the policy may allocate to it first.
+        """
+        quantity = order.quantity
+        if order.side == 'BUY':
+            levels, keys = self.asks, self.asks.irange(maximum=price_key)
+        else:
+            levels, keys = self.bids, self.bids.irange(minimum=price_key, reverse=True)
+        owner = order.owner
+        if self.stp_mode is None or owner is None:
+            for key in keys:
+                quantity -= levels[key].quantity
+                if quantity <= 0:
+                    return True
+            return False
+        cancel_newest = self.stp_mode == 'CANCEL_NEWEST'
+        queue_order = isinstance(self.allocation, FifoAllocation)
+        for key in keys:
+            level = levels[key]
+            if cancel_newest and not queue_order and any(resting.owner == owner for resting in level):
+                return False
+            for resting in level:
+                if resting.owner != owner:
+                    quantity -= resting.quantity
+                    if quantity <= 0:
+                        return True
+                elif cancel_newest:
+                    return False
+        return False
+
+    def _price_key(self, order: Order) -> PriceKey:
+        """Normalize an order's price and return the key it is booked under."""
+        if order.order_type not in ORDER_TYPES:
+            raise ValueError(f"Unknown order type {order.order_type}")
+        if order.order_type == 'MARKET':
+            order.price = None  # a market order takes the resting orders' prices
+            return MARKET_BUY_KEY if order.side == 'BUY' else MARKET_SELL_KEY
+        order.price, key = self._normalize_price(order.price)
+        return key
+
+    def _normalize_price(self, price) -> tuple:
+        """Return a limit price as a Decimal together with its book key."""
+        if not isinstance(price, Decimal):
+            price = Decimal(str(price))
+        if self.tick_size is None:
+            return price, price
+        ticks, remainder = divmod(price, self.tick_size)
+        if remainder:
+            raise ValueError(f"Price {price} is not a multiple of tick size {self.tick_size}")
+        return price, int(ticks)
+
+    def _sweep(self, order: Order, record: Callable, timestamp: datetime):
+        """Match an incoming order against the opposite side, best level first.
+
+        A level the order can take completely is filled in queue order and
+        dropped in one go; only a partial fill of the last level touched is
+        split by the allocation policy. Each fill is passed to ``record``.
+        """
+        if self.stp_mode is not None and order.owner is not None:
+            return self._sweep_with_stp(order, record, timestamp)
+        buying = order.side == 'BUY'
+        if buying:
+            contra_side, delete_level = 'SELL', self._delete_ask_level
+        else:
+            contra_side, delete_level = 'BUY', self._delete_bid_level
+        order_id = order.order_id
+        price_key = order.price_key
+        journal = self.journal
+        ledger = self.ledger
+        while order.quantity > 0:
+            level = self._best_ask if buying else self._best_bid
+            if level is None or (price_key < level.price_key if buying else price_key > level.price_key):
+                break
+            whole = order.quantity >= level.quantity
+            fill = level.quantity if whole else order.quantity
+            allocations = level.pop_all() if whole else self.allocation.allocate(level, fill)
+            price = level.price
+            for resting, quantity in allocations:
+                # Record trade
+                if buying:
+                    record((order_id, resting.order_id, price, quantity, timestamp))
+                else:
+                    record((resting.order_id, order_id, price, quantity, timestamp))
+                if journal is not None:
+                    journal.fill(order.side, level.price_key, quantity, order_id, resting.order_id)
+                if ledger is not None:
+                    if buying:
+                        ledger.record_fill(order.owner, resting.owner, price, quantity)
+                    else:
+                        ledger.record_fill(resting.owner, order.owner, price, quantity)
+
+                resting.quantity -= quantity
+                resting.filled_quantity += quantity
+                if resting.quantity == 0:
+                    resting.status = 'FILLED'
+                    if not whole:
+                        level.remove(resting)
+
+            order.quantity -= fill
+            order.filled_quantity += fill
+            if whole:
+                delete_level(level)
+            else:
+                level.quantity -= fill
+            if self._l2_subscribers:
+                self._publish_level(contra_side, level)
+
+    def _sweep_with_stp(self, order: Order, record: Callable, timestamp: datetime):
+        """Sweep fill by fill, applying self-trade prevention to same-owner resting orders.
+
+        Levels are allocated by the allocation policy as in ``_sweep``; an
+        allocation to an order of the same owner becomes the STP action
+        instead of a fill, which is one owner comparison per allocation, and
+        the level is then allocated afresh without the cancelled quantity.
+        STP cancels and decrements are journaled as CANCEL and AMEND records.
+        """
+        buying = order.side == 'BUY'
+        if buying:
+            contra_side, delete_level = 'SELL', self._delete_ask_level
+        else:
+            contra_side, delete_level = 'BUY', self._delete_bid_level
+        order_id = order.order_id
+        owner = order.owner
+        price_key = order.price_key
+        stp_mode = self.stp_mode
+        journal = self.journal
+        ledger = self.ledger
+        while order.quantity > 0 and order.status == 'ACTIVE':
+            level = self._best_ask if buying else self._best_bid
+            if level is None or (price_key < level.price_key if buying else price_key > level.price_key):
+                break
+            price = level.price
+            allocations = list(self.allocation.allocate(level, min(order.quantity, level.quantity)))
+            for resting, quantity in allocations:
+                if resting.owner == owner:
+                    if stp_mode == 'CANCEL_NEWEST':
+                        self._stp_cancel(order)
+                        break
+                    if stp_mode == 'CANCEL_OLDEST':
+                        self._stp_cancel(resting, level)
+                        break
+                    # DECREMENT_BOTH
+                    decrement = min(order.quantity, resting.quantity)
+                    order.quantity -= decrement
+                    resting.quantity -= decrement
+                    level.quantity -= decrement
+                    if resting.quantity == 0:
+                        self._stp_cancel(resting, level)
+                    elif journal is not None:
+                        journal.amend(resting.side, level.price_key, resting.quantity, resting.order_id)
+                    if order.quantity == 0:
+                        self._stp_cancel(order)
+                    break
+
+                quantity = min(quantity, order.quantity)
+                if quantity == 0:
+                    break
+                if buying:
+                    record((order_id, resting.order_id, price, quantity, timestamp))
+                else:
+                    record((resting.order_id, order_id, price, quantity, timestamp))
+                if journal is not None:
+                    journal.fill(order.side, level.price_key, quantity, order_id, resting.order_id)
+                if ledger is not None:
+                    if buying:
+                        ledger.record_fill(owner, resting.owner, price, quantity)
+                    else:
+                        ledger.record_fill(resting.owner, owner, price, quantity)
+                order.quantity -= quantity
+                order.filled_quantity += quantity
+                resting.quantity -= quantity
+                resting.filled_quantity += quantity
+                level.quantity -= quantity
+                if resting.quantity == 0:
+                    resting.status = 'FILLED'
+                    level.remove(resting)
+
+            if not level:
+                delete_level(level)
+            if self._l2_subscribers:
+                self._publish_level(contra_side, level)
+
+    def _stp_cancel(self, order: Order, level: Optional[PriceLevel] = None):
+        """Cancel an order for self-trade prevention, unlinking it from ``level`` if it rests."""
+        order.status = 'CANCELLED'
+        if self.journal is not None:
+            self.journal.cancel(order.side, order.price_key if order.order_type == 'LIMIT' else 0,
+                                order.quantity, order.order_id)
+        if level is not None:
+            level.remove(order)
 
     def _add_to_bids(self, order: Order):
         """Add a buy order to the order book."""
-        self.bids[order.price].append(order)
-        self._update_best_prices()
+        level = self.bids.get(order.price_key)
+        if level is None:
+            level = self.bids[order.price_key] = PriceLevel(order.price_key, order.price)
+            if self._best_bid is None or order.price_key > self._best_bid.price_key:
+                self._best_bid = level
+        else:
+            order.price = level.price  # share one price object per level
+        level.append(order)
+        if self._l2_subscribers:
+            self._publish_level('BUY', level)
 
     def _add_to_asks(self, order: Order):
         """Add a sell order to the order book."""
-        self.asks[order.price].append(order)
-        self._update_best_prices()
+        level = self.asks.get(order.price_key)
+        if level is None:
+            level = self.asks[order.price_key] = PriceLevel(order.price_key, order.price)
+            if self._best_ask is None or order.price_key < self._best_ask.price_key:
+                self._best_ask = level
+        else:
+            order.price = level.price  # share one price object per level
+        level.append(order)
+        if self._l2_subscribers:
+            self._publish_level('SELL', level)
 
     def _remove_from_bids(self, order: Order):
         """Remove a buy order from the order book."""
-        if order.price in self.bids:
-            self.bids[order.price] = [o for o in self.bids[order.price] if o.order_id != order.order_id]
-            if not self.bids[order.price]:
-                del self.bids[order.price]
-        self._update_best_prices()
+        level = self.bids.get(order.price_key)
+        if level is not None:
+            level.remove(order)
+            if not level:
+                self._delete_bid_level(level)
+            if self._l2_subscribers:
+                self._publish_level('BUY', level)
 
     def _remove_from_asks(self, order: Order):
         """Remove a sell order from the order book."""
-        if order.price in self.asks:
-            self.asks[order.price] = [o for o in self.asks[order.price] if o.order_id != order.order_id]
-            if not self.asks[order.price]:
-                del self.asks[order.price]
+        level = self.asks.get(order.price_key)
+        if level is not None:
+            level.remove(order)
+            if not level:
+                self._delete_ask_level(level)
+            if self._l2_subscribers:
+                self._publish_level('SELL', level)
+
+    def _delete_bid_level(self, level: PriceLevel):
+        """Drop an empty bid level, moving the best bid to the next level down."""
+        del self.bids[level.price_key]
+        if level is self._best_bid:
+            self._best_bid = self.bids.peekitem(-1)[1] if self.bids else None
+
+    def _delete_ask_level(self, level: PriceLevel):
+        """Drop an empty ask level, moving the best ask to the next level up."""
+        del self.asks[level.price_key]
+        if level is self._best_ask:
+            self._best_ask = self.asks.peekitem(0)[1] if self.asks else None
+
+    def _load_levels(self, bids: Iterable[PriceLevel], asks: Iterable[PriceLevel]):
+        """Install prebuilt, populated price levels, as a checkpoint load does."""
+        self.bids = SortedDict((level.price_key, level) for level in bids)
+        self.asks = SortedDict((level.price_key, level) for level in asks)
+        self._best_bid = self.bids.peekitem(-1)[1] if self.bids else None
+        self._best_ask = self.asks.peekitem(0)[1] if self.asks else None
         self._update_best_prices()
 
-    def _update_best_prices(self):
-        """Update the best bid and ask prices."""
-        self.best_bid_price = max(self.bids.keys()) if self.bids else None
-        self.best_ask_price = min(self.asks.keys()) if self.asks else None
+    def _publish_level(self, side: str, level: PriceLevel):
+        """Send the level's current quantity and order count to L2 subscribers."""
+        self.l2_sequence += 1
+        update = LevelUpdate(side, level.price, level.quantity, level.count, self.l2_sequence)
+        for callback in self._l2_subscribers:
+            callback(update)
 
-    def get_order_book_snapshot(self) -> dict:
-        """Get current state of the order book."""
+    def _update_best_prices(self):
+        """Publish the best bid and ask prices from the tracked best levels."""
+        self.best_bid_price = self._best_bid.price if self._best_bid is not None else None
+        self.best_ask_price = self._best_ask.price if self._best_ask is not None else None
+
+    def get_order_book_snapshot(self, depth: Optional[int] = None) -> dict:
+        """Get current state of the order book, limited to the best ``depth`` levels per side if given."""
+        if depth is None:
+            bid_keys = reversed(self.bids.keys())
+            ask_keys = iter(self.asks.keys())
+        else:
+            bid_keys = self.bids.islice(max(len(self.bids) - depth, 0), reverse=True)
+            ask_keys = self.asks.islice(0, depth)
+        bid_levels = map(self.bids.__getitem__, bid_keys)
+        ask_levels = map(self.asks.__getitem__, ask_keys)
         return {
-            'bids': [(price, sum(o.quantity for o in orders)) for price, orders in sorted(self.bids.items(), reverse=True)],
-            'asks': [(price, sum(o.quantity for o in orders)) for price, orders in sorted(self.asks.items())],
+            'bids': [(level.price, level.quantity) for level in bid_levels],
+            'asks': [(level.price, level.quantity) for level in ask_levels],
             'best_bid': self.best_bid_price,
             'best_ask': self.best_ask_price
         }
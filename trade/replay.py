@@ -0,0 +1,215 @@
+import argparse
+import csv
+import gc
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from trade.journal import ACCEPT, AMEND, CANCEL, FILL, JournalReader
+from trade.order_matching import STP_MODES, Order, OrderBook, TradeBlotter
+
+# Replay events are (action, payload) tuples:
+#   ('add', Order), ('cancel', order_id), ('amend', (order_id, price, quantity)),
+#   ('fill', (buy_order_id, sell_order_id, price, quantity)) - a recorded fill to verify against
+ReplayEvent = Tuple[str, object]
+
+# Fixed trade timestamp used when no clock is given, so replays are reproducible
+REPLAY_EPOCH = datetime(1970, 1, 1)
+
+class ReplayResult:
+    def __init__(self, book: OrderBook, trades: TradeBlotter, events: int, seconds: float,
+                 fills_match: Optional[bool], snapshot_match: Optional[bool]):
+        self.book = book
+        self.trades = trades
+        self.events = events
+        self.seconds = seconds
+        # None when the stream carried no recorded fills / no snapshot was given
+        self.fills_match = fills_match
+        self.snapshot_match = snapshot_match
+
+    @property
+    def events_per_second(self) -> float:
+        return self.events / self.seconds if self.seconds else float('inf')
+
+    def __repr__(self):
+        return (f"ReplayResult(events={self.events}, trades={len(self.trades)}, "
+                f"events_per_second={self.events_per_second:,.0f}, "
+                f"fills_match={self.fills_match}, snapshot_match={self.snapshot_match})")
+
+def replay(events: Iterable[ReplayEvent], tick_size: Optional[Decimal] = None,
+           clock: Optional[Callable[[], datetime]] = None, expected_snapshot: Optional[dict] = None,
+           book: Optional[OrderBook] = None, allocation=None, stp_mode: Optional[str] = None) -> ReplayResult:
+    """Rebuild an order book from an order/cancel stream as fast as possible.
+
+    Adds between cancels and amends are fed to ``OrderBook.add_orders`` in one batch, the
+    garbage collector is paused for the run, and the book's clock defaults to
+    the constant REPLAY_EPOCH, so a replay makes no time syscalls and produces
+    the same trades every run. Recorded fills in the stream are compared with
+    the fills the replay produces, and the final snapshot with
+    ``expected_snapshot`` when one is given. Pass ``book`` to continue from an
+    existing book, such as one loaded from a checkpoint. A new book uses
+    ``allocation`` as its allocation policy (FIFO by default) and ``stp_mode``
+    for self-trade prevention; a journal must be replayed with the mode it was
+    recorded under, its STP cancels and amends then being no-ops.
+    """
+    if book is None:
+        book = OrderBook(tick_size=tick_size, clock=clock or (lambda: REPLAY_EPOCH), allocation=allocation,
+                         stp_mode=stp_mode)
+    elif clock is not None:
+        book.clock = clock
+    trades = TradeBlotter()
+    expected_fills: List[tuple] = []
+    pending: List[Order] = []
+    count = 0
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    start = time.perf_counter()
+    try:
+        for action, payload in events:
+            count += 1
+            if action == 'add':
+                pending.append(payload)
+            elif action == 'fill':
+                expected_fills.append(payload)
+            elif action == 'cancel' or action == 'amend':
+                if pending:
+                    trades.extend(book.add_orders(pending))
+                    pending = []
+                if action == 'cancel':
+                    book.cancel_order(payload)
+                else:
+                    order_id, price, quantity = payload
+                    amended = book.amend_order(order_id, quantity, price)
+                    if amended:
+                        trades.extend(TradeBlotter((trade.buy_order_id, trade.sell_order_id, trade.price,
+                                                    trade.quantity, trade.timestamp) for trade in amended))
+            else:
+                raise ValueError(f"Unknown replay action {action}")
+        if pending:
+            trades.extend(book.add_orders(pending))
+    finally:
+        seconds = time.perf_counter() - start
+        if gc_enabled:
+            gc.enable()
+
+    fills_match = None
+    if expected_fills:
+        produced = list(zip(trades.buy_order_id, trades.sell_order_id, trades.price, trades.quantity))
+        fills_match = produced == expected_fills
+    snapshot_match = None
+    if expected_snapshot is not None:
+        snapshot_match = _same_snapshot(book.get_order_book_snapshot(), expected_snapshot)
+    return ReplayResult(book, trades, count, seconds, fills_match, snapshot_match)
+
+def _same_snapshot(actual: dict, expected: dict) -> bool:
+    """Compare snapshots by value, so a JSON-loaded expectation matches Decimal prices."""
+    def normalize(snapshot):
+        levels = {side: [(Decimal(str(price)), int(quantity)) for price, quantity in snapshot[side]]
+                  for side in ('bids', 'asks')}
+        best = {key: Decimal(str(snapshot[key])) if snapshot[key] is not None else None
+                for key in ('best_bid', 'best_ask')}
+        return levels, best
+    return normalize(actual) == normalize(expected)
+
+def events_from_rows(rows: Iterable[dict]) -> Iterator[ReplayEvent]:
+    """Turn order/cancel rows into replay events.
+
+    Each row has an ``action`` of add, cancel or amend and an ``order_id``;
+    adds also carry ``side``, ``price`` and ``quantity``, and optionally
+    ``symbol``, ``order_type``, ``time_in_force`` and ``owner``. Market orders may leave
+    the price empty. Amends carry the new ``price`` and/or ``quantity``; an
+    empty one is left unchanged.
+    """
+    for row in rows:
+        action = row['action'].lower()
+        if action == 'add':
+            order_type = (row.get('order_type') or 'LIMIT').upper()
+            price = Decimal(str(row['price'])) if order_type == 'LIMIT' else None
+            owner = row.get('owner')
+            yield 'add', Order(str(row['order_id']), row.get('symbol') or '', row['side'].upper(),
+                               price, int(row['quantity']), REPLAY_EPOCH, order_type,
+                               (row.get('time_in_force') or 'GTC').upper(),
+                               str(owner) if _present(owner) else None)
+        elif action == 'cancel':
+            yield 'cancel', str(row['order_id'])
+        elif action == 'amend':
+            price, quantity = row.get('price'), row.get('quantity')
+            yield 'amend', (str(row['order_id']), Decimal(str(price)) if _present(price) else None,
+                            int(quantity) if _present(quantity) else None)
+        else:
+            raise ValueError(f"Unknown replay action {row['action']}")
+
+def _present(value) -> bool:
+    """False for the empty cells of CSV ('') and Parquet (None/NaN) rows."""
+    return value is not None and value != '' and value == value
+
+def read_csv_events(path: str) -> Iterator[ReplayEvent]:
+    with open(path, newline='') as f:
+        yield from events_from_rows(csv.DictReader(f))
+
+def read_parquet_events(path: str) -> Iterator[ReplayEvent]:
+    import pandas as pd
+    yield from events_from_rows(pd.read_parquet(path).to_dict('records'))
+
+def read_journal_events(path: str, after_seq: int = 0) -> Iterator[ReplayEvent]:
+    """Turn journal records into replay events, with FILL records as fills to verify."""
+    reader = JournalReader(path)
+    tick_size = reader.tick_size
+    prices = {}
+    for (_, event, side, price_ticks, quantity, order_id, contra_order_id,
+         order_type, time_in_force) in reader.records(after_seq):
+        price = prices.get(price_ticks)
+        if price is None:
+            price = prices[price_ticks] = price_ticks * tick_size
+        if event == ACCEPT:
+            # ACCEPT records carry the owner in the contra order id field
+            yield 'add', Order(order_id, '', side, price, quantity, REPLAY_EPOCH, order_type, time_in_force,
+                               contra_order_id or None)
+        elif event == CANCEL:
+            yield 'cancel', order_id
+        elif event == AMEND:
+            yield 'amend', (order_id, price, quantity)
+        elif event == FILL:
+            if side == 'BUY':
+                yield 'fill', (order_id, contra_order_id, price, quantity)
+            else:
+                yield 'fill', (contra_order_id, order_id, price, quantity)
+
+def read_events(path: str) -> Iterator[ReplayEvent]:
+    """Pick a reader from the file extension: .csv, .parquet, anything else is a journal."""
+    if path.endswith('.csv'):
+        return read_csv_events(path)
+    if path.endswith('.parquet'):
+        return read_parquet_events(path)
+    return read_journal_events(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an order stream into an OrderBook")
+    parser.add_argument('path', help="CSV, Parquet or binary journal file")
+    parser.add_argument('--tick-size', help="Tick size (read from the header for journals)")
+    parser.add_argument('--expect', help="JSON file with the expected final snapshot")
+    parser.add_argument('--stp-mode', choices=STP_MODES, help="Self-trade prevention mode the stream was recorded with")
+    args = parser.parse_args()
+
+    tick_size = Decimal(args.tick_size) if args.tick_size else None
+    if tick_size is None and not args.path.endswith(('.csv', '.parquet')):
+        tick_size = JournalReader(args.path).tick_size
+    expected = None
+    if args.expect:
+        with open(args.expect) as f:
+            expected = json.load(f)
+
+    result = replay(read_events(args.path), tick_size=tick_size, expected_snapshot=expected,
+                    stp_mode=args.stp_mode)
+    print(f"Replayed {result.events} events in {result.seconds:.3f}s "
+          f"({result.events_per_second:,.0f} events/s), {len(result.trades)} trades")
+    if result.fills_match is not None:
+        print(f"Fills match journal: {result.fills_match}")
+    if result.snapshot_match is not None:
+        print(f"Final snapshot matches: {result.snapshot_match}")
+
+if __name__ == "__main__":
+    main()
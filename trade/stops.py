@@ -0,0 +1,174 @@
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sortedcontainers import SortedDict
+
+from trade.journal import ORDER_ID_SIZE as JOURNAL_ID_SIZE
+from trade.order_matching import Order, OrderBook, Trade
+
+class StopOrder:
+    """A pending order that enters the book once a trade prints at its stop price.
+
+    A buy stop triggers on a trade at or above ``stop_price``, a sell stop on
+    a trade at or below it. With a ``limit_price`` it enters as a GTC limit
+    order (stop-limit), without one as a market order (stop-market).
+    """
+    __slots__ = ('order_id', 'symbol', 'side', 'stop_price', 'limit_price', 'quantity',
+                 'timestamp', 'owner', 'status')
+
+    def __init__(self, order_id: str, symbol: str, side: str, stop_price: Decimal, quantity: int,
+                 timestamp: datetime, limit_price: Optional[Decimal] = None, owner: Optional[str] = None):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.stop_price = stop_price
+        self.limit_price = limit_price
+        self.quantity = quantity
+        self.timestamp = timestamp
+        self.owner = owner
+        self.status = 'PENDING'  # then TRIGGERED or CANCELLED
+
+    def __str__(self):
+        return (f"StopOrder(id={self.order_id}, symbol={self.symbol}, side={self.side}, "
+                f"stop={self.stop_price}, limit={self.limit_price}, quantity={self.quantity}, "
+                f"status={self.status})")
+
+class StopBook:
+    """Pending stop and stop-limit orders kept alongside an OrderBook.
+
+    Stops are indexed by stop price in one SortedDict per side, each price
+    holding its stops in arrival order. Send orders through ``add_order``
+    (and amends through ``amend_order``) so their trades are seen: after
+    each call only the triggered price range is popped from the index and
+    the stops in it are fed back through matching, whose trades can trigger
+    further stops. Stops fire in generations, each generation's buy stops
+    by ascending stop price and then its sell stops by descending stop
+    price, in arrival order within a price, so a cascade always plays out
+    the same way.
+    """
+    def __init__(self, book: OrderBook):
+        self.book = book
+        # Stop price -> {order_id: StopOrder} in arrival order
+        self.buy_stops: Dict[Decimal, Dict[str, StopOrder]] = SortedDict()
+        self.sell_stops: Dict[Decimal, Dict[str, StopOrder]] = SortedDict()
+        # Quick lookup for stops by ID
+        self.stops: Dict[str, StopOrder] = {}
+        self.last_price: Optional[Decimal] = None
+
+    def add_stop(self, stop: StopOrder) -> List[Trade]:
+        """Queue a stop, or fire it at once if the last trade already reached its stop price."""
+        if stop.order_id in self.stops or stop.order_id in self.book.orders:
+            raise ValueError(f"Order id {stop.order_id} already exists")
+        self._check_ids(stop)
+        stop.stop_price = self.book._normalize_price(stop.stop_price)[0]
+        if stop.limit_price is not None:
+            stop.limit_price = self.book._normalize_price(stop.limit_price)[0]
+        self.stops[stop.order_id] = stop
+
+        last_price = self.last_price
+        if last_price is not None and (stop.stop_price <= last_price if stop.side == 'BUY'
+                                       else stop.stop_price >= last_price):
+            return self._fire(deque([stop]))
+        self._queue(stop)
+        return []
+
+    def cancel_stop(self, order_id: str) -> bool:
+        """Cancel a pending stop. Returns True if successful."""
+        stop = self.stops.get(order_id)
+        if stop is None or stop.status != 'PENDING':
+            return False
+        stop.status = 'CANCELLED'
+        index = self.buy_stops if stop.side == 'BUY' else self.sell_stops
+        level = index[stop.stop_price]
+        del level[order_id]
+        if not level:
+            del index[stop.stop_price]
+        return True
+
+    def add_order(self, order: Order) -> List[Trade]:
+        """Add an order to the book and return its trades followed by those of any stops it set off."""
+        # A stop's id is taken from the moment it is queued, or it could not enter the book when triggered
+        if order.order_id in self.stops:
+            raise ValueError(f"Order id {order.order_id} already exists")
+        trades = self.book.add_order(order)
+        return self._cascade(trades) if trades else trades
+
+    def amend_order(self, order_id: str, quantity: Optional[int] = None,
+                    price: Optional[Decimal] = None) -> Optional[List[Trade]]:
+        """Amend a resting order as OrderBook.amend_order does, firing any stops its trades set off."""
+        trades = self.book.amend_order(order_id, quantity, price)
+        return self._cascade(trades) if trades else trades
+
+    def _cascade(self, trades: List[Trade]) -> List[Trade]:
+        triggered = self._triggered(trades)
+        if not triggered:
+            return trades
+        return trades + self._fire(triggered)
+
+    def _check_ids(self, stop: StopOrder):
+        """Reject a stop whose id or owner the book's trade store or journal could not take when it fires."""
+        store = self.book._trade_store
+        if store is not None and len(stop.order_id) > store.id_size:
+            raise ValueError(f"Order ids longer than {store.id_size} characters cannot be stored")
+        if self.book.journal is not None:
+            if len(stop.order_id.encode()) > JOURNAL_ID_SIZE:
+                raise ValueError(f"Order id {stop.order_id} is longer than {JOURNAL_ID_SIZE} bytes")
+            if stop.owner is not None and len(stop.owner.encode()) > JOURNAL_ID_SIZE:
+                raise ValueError(f"Owner {stop.owner} is longer than {JOURNAL_ID_SIZE} bytes")
+
+    def _queue(self, stop: StopOrder):
+        """Index a pending stop under its stop price, behind the stops already there."""
+        index = self.buy_stops if stop.side == 'BUY' else self.sell_stops
+        level = index.get(stop.stop_price)
+        if level is None:
+            level = index[stop.stop_price] = {}
+        level[stop.order_id] = stop
+
+    def _fire(self, triggered: deque) -> List[Trade]:
+        """Enter triggered stops into the book one by one, queueing the stops their trades trigger.
+
+        If the book raises on a stop, that stop and the triggered stops not
+        yet entered go back into the index as pending before the error
+        propagates.
+        """
+        trades: List[Trade] = []
+        try:
+            while triggered:
+                stop = triggered[0]
+                if stop.limit_price is None:
+                    order = Order(stop.order_id, stop.symbol, stop.side, None, stop.quantity,
+                                  stop.timestamp, order_type='MARKET', time_in_force='IOC', owner=stop.owner)
+                else:
+                    order = Order(stop.order_id, stop.symbol, stop.side, stop.limit_price, stop.quantity,
+                                  stop.timestamp, owner=stop.owner)
+                fills = self.book.add_order(order)
+                triggered.popleft()
+                stop.status = 'TRIGGERED'
+                if fills:
+                    trades.extend(fills)
+                    triggered.extend(self._triggered(fills))
+        finally:
+            for stop in triggered:
+                self._queue(stop)
+        return trades
+
+    def _triggered(self, trades: List[Trade]) -> deque:
+        """Pop the stops reached by the trades' price range, in firing order."""
+        self.last_price = trades[-1].price
+        triggered = deque()
+        prices = None
+        # Check the nearest stop on each side before touching the index
+        if self.buy_stops:
+            prices = [trade.price for trade in trades]
+            high = max(prices)
+            if self.buy_stops.peekitem(0)[0] <= high:
+                for stop_price in list(self.buy_stops.irange(maximum=high)):
+                    triggered.extend(self.buy_stops.pop(stop_price).values())
+        if self.sell_stops:
+            low = min(prices or [trade.price for trade in trades])
+            if self.sell_stops.peekitem(-1)[0] >= low:
+                for stop_price in list(self.sell_stops.irange(minimum=low, reverse=True)):
+                    triggered.extend(self.sell_stops.pop(stop_price).values())
+        return triggered
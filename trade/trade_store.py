@@ -0,0 +1,178 @@
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Order ids are stored as fixed-width bytes, the same width the journal allows
+ORDER_ID_SIZE = 16
+# Fewer fills than this are written element by element, more as whole arrays
+SMALL_BATCH = 32
+# Timestamps are written as int64 microseconds since the epoch (NaT for None);
+# numpy's own datetime conversion costs several microseconds per element
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+NAT = np.iinfo(np.int64).min
+
+def trade_dtype(id_size: int = ORDER_ID_SIZE) -> np.dtype:
+    """Record layout of a spill file: one little-endian row per trade."""
+    return np.dtype([('price_ticks', '<i8'), ('quantity', '<i8'), ('buy_order_id', f'S{id_size}'),
+                     ('sell_order_id', f'S{id_size}'), ('timestamp', '<M8[us]')])
+
+class TradeStore:
+    """Bounded columnar trade record backed by preallocated NumPy arrays.
+
+    Each trade field has its own buffer of twice ``capacity`` rows. Trades
+    are appended at the end; when the buffers fill up the oldest
+    ``capacity`` rows are dropped, after being appended to ``spill_path``
+    when one is given, and the newest ``capacity`` rows are moved to the
+    front, so appends cost amortized O(1) and the retained trades are always
+    contiguous. ``to_numpy`` and ``to_pandas`` return views of the most
+    recent ``capacity`` trades without copying; they see the buffers as they
+    are, so copy them before more trades are recorded if they must not
+    change. Prices are kept as integer ticks of ``tick_size``.
+    """
+    def __init__(self, tick_size: Decimal, capacity: int = 1 << 16, spill_path: Optional[str] = None,
+                 id_size: int = ORDER_ID_SIZE):
+        if capacity <= 0:
+            raise ValueError("Trade store capacity must be positive")
+        self.tick_size = Decimal(str(tick_size))
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.id_size = id_size
+        self.dtype = trade_dtype(id_size)
+        size = 2 * capacity
+        self.price_ticks = np.zeros(size, dtype='<i8')
+        self.quantity = np.zeros(size, dtype='<i8')
+        self.buy_order_id = np.zeros(size, dtype=f'S{id_size}')
+        self.sell_order_id = np.zeros(size, dtype=f'S{id_size}')
+        self.timestamp = np.zeros(size, dtype='<M8[us]')
+        self._timestamp_us = self.timestamp.view('<i8')
+        # Rows in use, and trades recorded since creation (spilled or dropped ones included)
+        self._end = 0
+        self.total = 0
+        # Price -> ticks, so each distinct price is divided once
+        self._ticks: Dict[Decimal, int] = {}
+
+    def __len__(self):
+        return min(self._end, self.capacity)
+
+    def append(self, buy_order_id: str, sell_order_id: str, price: Decimal, quantity: int, timestamp):
+        self.extend([(buy_order_id, sell_order_id, price, quantity, timestamp)])
+
+    def extend(self, fills: Iterable[tuple]):
+        """Record (buy_order_id, sell_order_id, price, quantity, timestamp) fills, as the book produces them."""
+        fills = list(fills)
+        while fills:
+            room = len(self.quantity) - self._end
+            if not room:
+                self._evict()
+                continue
+            self._write(fills[:room])
+            fills = fills[room:]
+
+    def _write(self, fills: list):
+        ticks = self._ticks
+        tick_size = self.tick_size
+        # Fills of one order share a timestamp, so convert each distinct one once
+        micros = {}
+        if len(fills) < SMALL_BATCH:
+            # Element stores beat building arrays for the few fills of a single order
+            row = self._end
+            for buy_order_id, sell_order_id, price, quantity, timestamp in fills:
+                if len(buy_order_id) > self.id_size or len(sell_order_id) > self.id_size:
+                    raise ValueError(f"Order ids longer than {self.id_size} characters cannot be stored")
+                tick = ticks.get(price)
+                if tick is None:
+                    tick = ticks[price] = int(price / tick_size)
+                self.buy_order_id[row] = buy_order_id
+                self.sell_order_id[row] = sell_order_id
+                self.price_ticks[row] = tick
+                self.quantity[row] = quantity
+                us = micros.get(timestamp)
+                if us is None:
+                    us = micros[timestamp] = _microseconds(timestamp)
+                self._timestamp_us[row] = us
+                row += 1
+            self._end = row
+            self.total += len(fills)
+            return
+        buy_ids, sell_ids, prices, quantities, timestamps = zip(*fills)
+        price_ticks = []
+        for price in prices:
+            tick = ticks.get(price)
+            if tick is None:
+                tick = ticks[price] = int(price / tick_size)
+            price_ticks.append(tick)
+        timestamp_us = []
+        for timestamp in timestamps:
+            us = micros.get(timestamp)
+            if us is None:
+                us = micros[timestamp] = _microseconds(timestamp)
+            timestamp_us.append(us)
+        start, end = self._end, self._end + len(fills)
+        self.buy_order_id[start:end] = self._ids(buy_ids)
+        self.sell_order_id[start:end] = self._ids(sell_ids)
+        self.price_ticks[start:end] = price_ticks
+        self.quantity[start:end] = quantities
+        self._timestamp_us[start:end] = timestamp_us
+        self._end = end
+        self.total += len(fills)
+
+    def _ids(self, ids: tuple) -> np.ndarray:
+        ids = np.array(ids, dtype=str)
+        if ids.dtype.itemsize // 4 > self.id_size:
+            raise ValueError(f"Order ids longer than {self.id_size} characters cannot be stored")
+        return ids.astype(f'S{self.id_size}')
+
+    def _evict(self):
+        """Spill and drop the oldest ``capacity`` rows, moving the rest to the front."""
+        capacity = self.capacity
+        if self.spill_path is not None:
+            self._spill(0, capacity)
+        for column in self._columns():
+            column[:capacity] = column[capacity:]
+        self._end = capacity
+
+    def _spill(self, start: int, end: int):
+        rows = np.empty(end - start, dtype=self.dtype)
+        for name, column in zip(self.dtype.names, self._columns()):
+            rows[name] = column[start:end]
+        with open(self.spill_path, 'ab') as f:
+            rows.tofile(f)
+
+    def _columns(self) -> tuple:
+        return self.price_ticks, self.quantity, self.buy_order_id, self.sell_order_id, self.timestamp
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        """Views of the most recent ``capacity`` trades, one array per field, oldest first."""
+        start, end = max(0, self._end - self.capacity), self._end
+        return {name: column[start:end] for name, column in zip(self.dtype.names, self._columns())}
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_numpy(), copy=False)
+
+    def spilled(self) -> np.ndarray:
+        """The trades spilled to ``spill_path`` so far, memory-mapped read-only."""
+        if self.spill_path is None or not os.path.exists(self.spill_path) or not os.path.getsize(self.spill_path):
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.spill_path, dtype=self.dtype, mode='r')
+
+    def history(self) -> np.ndarray:
+        """Every trade still on disk or in memory as one structured array (a copy).
+
+        With a spill path that is every trade recorded, in fill order.
+        """
+        rows = np.empty(self._end, dtype=self.dtype)
+        for name, column in zip(self.dtype.names, self._columns()):
+            rows[name] = column[:self._end]
+        return np.concatenate([self.spilled(), rows])
+
+def _microseconds(timestamp: Optional[datetime]) -> int:
+    if timestamp is None:
+        return NAT
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // MICROSECOND
@@ -5,11 +5,15 @@ import ccxt
 from plotly.subplots import make_subplots
 import numpy as np
 import plotly.express as px
-from util import exchange_util, plot_util
-from scipy.stats import zscore
+from utils import exchange_util, plot_util
+from utils.stats_util import zscore
+from utils.panel_util import PricePanel
 from datetime import datetime
 import time
 import itertools
+import heapq
+import multiprocessing as mp
+from multiprocessing import shared_memory
 
 def get_pairs(crypto_symbols):
     # Generate all permutations of the crypto symbols
@@ -31,10 +35,6 @@ def get_ask(mid, spread_percentage):
     ask = mid * (1 + 0.5 * spread_percentage / 100)
     return ask
     
-# Calculate z-score
-def zscore(series):
-    return (series - series.mean()) / np.std(series)
-
 def initialize_position(positions, symbol_pair):
     """Initializes the position status for a given symbol pair if not already present."""
     if symbol_pair not in positions:
@@ -49,24 +49,14 @@ def get_merge_key(timestamp_series):
     # Rounds the given timestamp Series to the nearest minute using 'min' instead of deprecated 'T'
     return timestamp_series.dt.floor('min')
 
-def merge_and_calculate_ratios(prices, asset1, asset2):
-    # Filter prices for each asset and ensure timestamp is in datetime format
-    prices_asset1 = prices[prices['symbol'] == asset1].copy()
-    prices_asset2 = prices[prices['symbol'] == asset2].copy()
-    prices_asset1['timestamp'] = pd.to_datetime(prices_asset1['timestamp'])
-    prices_asset2['timestamp'] = pd.to_datetime(prices_asset2['timestamp'])
-
-    # Create a merge key based on rounded timestamps
-    prices_asset1['merge_key'] = get_merge_key(prices_asset1['timestamp'])
-    prices_asset2['merge_key'] = get_merge_key(prices_asset2['timestamp'])
-
-    # Perform an inner join on the merge key to ensure matching timestamps
-    merged_prices = pd.merge(prices_asset1, prices_asset2, on='merge_key', suffixes=('_asset1', '_asset2'), how='inner')
+def merge_and_calculate_ratios(prices, asset1, asset2, window=None):
+    # Inner join of both assets' rows on the minute, sliced from the dataset's price panel
+    merged_prices = PricePanel.of(prices).merge(asset1, asset2)
 
     # Calculate price ratios and z-scores
     if not merged_prices.empty:
         price_ratios = merged_prices['close_asset1'] / merged_prices['close_asset2']
-        z_scores = zscore(price_ratios)
+        z_scores = zscore(price_ratios, window)
     else:
         z_scores = []  # Handle the case where no matching timestamps are found
 
@@ -123,8 +113,79 @@ def close_position(position, pnl_list, symbol_pair, timestamp, z_score, exit_bid
         return global_gross_cum_pnl, global_net_cum_pnl, adjusted_position_size  # Return the original values in case of an error
 
 
+# Trade state machine over contiguous float arrays. A pair's position is
+# either flat, waiting for the first row that can open it, or open, waiting
+# for the first row whose price hits the stop loss or profit limit. Both
+# waits are vectorized searches, so only the rows where a trade opens or
+# closes are visited in Python.
+
+def _next_open(open_rows, start):
+    """First row at or after ``start`` in the sorted ``open_rows``, or -1."""
+    k = open_rows.searchsorted(start)
+    return int(open_rows[k]) if k < len(open_rows) else -1
+
+def _next_close(exit_prices, start, entry_price, stop_loss_limit, profit_limit, window=64):
+    """First row at or after ``start`` where the move from ``entry_price`` reaches a limit.
+
+    Returns the row and its change, or (-1, None). Rows are scanned in
+    doubling windows so a trade that closes soon costs a short scan.
+    """
+    n = len(exit_prices)
+    while start < n:
+        stop = min(n, start + window)
+        change = (exit_prices[start:stop] - entry_price) / entry_price
+        hits = np.flatnonzero((change <= -stop_loss_limit) | (change >= profit_limit))
+        if len(hits):
+            return start + int(hits[0]), change[hits[0]]
+        start = stop
+        window *= 2
+    return -1, None
+
+def _stamp_rows(records, timestamps, key):
+    """Replace the row numbers held under ``key`` in ``records`` with those rows' timestamps.
+
+    Looking the rows up in one batch is much cheaper than boxing a
+    timestamp per trade.
+    """
+    rows = [record[key] for record in records]
+    for record, timestamp in zip(records, pd.Index(timestamps)[rows].tolist()):
+        record[key] = timestamp
+
+def _close_action(change_percentage, stop_loss_limit):
+    return 'Closed with Stop Loss' if change_percentage <= -stop_loss_limit else 'Closed with Profit'
+
+def _trade_bid_ask_pair(position, pnl_list, symbol_pair, z, asks, bids, threshold, stop_loss_limit, profit_limit,
+                        maker_fee, adjusted_position_size, reinvest, global_gross_cum_pnl, global_net_cum_pnl,
+                        exchange, run_id):
+    """Trade one pair of backtest_zscores_one_sided_bid_ask, recording row numbers as timestamps.
+
+    Returns the updated cumulative gross and net PnL.
+    """
+    open_rows = np.flatnonzero(z < -threshold)
+    i = 0
+    while True:
+        if not position['open']:
+            i = _next_open(open_rows, i)
+            if i < 0:
+                break
+            open_position(position, pnl_list, symbol_pair, i, z[i], asks[i],
+                          adjusted_position_size, global_gross_cum_pnl, global_net_cum_pnl, exchange, run_id)
+        else:
+            i, change_percentage = _next_close(bids, i, position['entry_price'], stop_loss_limit, profit_limit)
+            if i < 0:
+                break
+            global_gross_cum_pnl, global_net_cum_pnl, adjusted_position_size = close_position(
+                position, pnl_list, symbol_pair, i, z[i], bids[i], maker_fee, adjusted_position_size, 
+                global_gross_cum_pnl, global_net_cum_pnl, _close_action(change_percentage, stop_loss_limit),
+                reinvest, exchange, run_id
+            )
+        # A row that opens or closes a position does nothing else
+        i += 1
+    return global_gross_cum_pnl, global_net_cum_pnl
+
 def backtest_zscores_one_sided_bid_ask(prices, sorted_pairs, threshold, position_size, 
-                                       stop_loss_limit, profit_limit, exchange, run_id, maker_fee=0.1, reinvest=True):
+                                       stop_loss_limit, profit_limit, exchange, run_id, maker_fee=0.1, reinvest=True,
+                                       window=None):
     pnl_list = []
     global_gross_cum_pnl = 0
     global_net_cum_pnl = 0
@@ -143,26 +204,18 @@ def backtest_zscores_one_sided_bid_ask(prices, sorted_pairs, threshold, position
         adjusted_position_size = position_size / len(sorted_pairs) if len(sorted_pairs) > 0 else 0
 
         try:
-            merged_prices, z_scores = merge_and_calculate_ratios(prices, asset1, asset2)
-
-            for i, z_score in enumerate(z_scores):
-                timestamp = merged_prices.iloc[i]['timestamp_asset1']
-                position = positions[symbol_pair]
-
-                if not position['open'] and z_score < -threshold:
-                    entry_ask_price = merged_prices.iloc[i]['ask_asset1']
-                    open_position(position, pnl_list, symbol_pair, timestamp, z_score, entry_ask_price, 
-                                  adjusted_position_size, global_gross_cum_pnl, global_net_cum_pnl, exchange, run_id)
-
-                elif position['open']:
-                    exit_bid_price = merged_prices.iloc[i]['bid_asset1']
-                    change_percentage = (exit_bid_price - position['entry_price']) / position['entry_price']
-                    action = 'Closed with Stop Loss' if change_percentage <= -stop_loss_limit else 'Closed with Profit'
-                    if change_percentage <= -stop_loss_limit or change_percentage >= profit_limit:
-                        global_gross_cum_pnl, global_net_cum_pnl, adjusted_position_size = close_position(
-                            position, pnl_list, symbol_pair, timestamp, z_score, exit_bid_price, maker_fee, adjusted_position_size, 
-                            global_gross_cum_pnl, global_net_cum_pnl, action, reinvest, exchange, run_id
-                        )
+            merged_prices, z_scores = merge_and_calculate_ratios(prices, asset1, asset2, window)
+            if not len(z_scores):
+                continue
+            first_record = len(pnl_list)
+            global_gross_cum_pnl, global_net_cum_pnl = _trade_bid_ask_pair(
+                positions[symbol_pair], pnl_list, symbol_pair, np.asarray(z_scores, dtype=np.float64),
+                merged_prices['ask_asset1'].to_numpy(dtype=np.float64),
+                merged_prices['bid_asset1'].to_numpy(dtype=np.float64),
+                threshold, stop_loss_limit, profit_limit, maker_fee, adjusted_position_size, reinvest,
+                global_gross_cum_pnl, global_net_cum_pnl, exchange, run_id
+            )
+            _stamp_rows(pnl_list[first_record:], merged_prices['timestamp_asset1'], 'timestamp')
 
         except Exception as e:
             print(f"Error processing {symbol_pair}: {e}")
@@ -175,11 +228,68 @@ def backtest_zscores_one_sided_bid_ask(prices, sorted_pairs, threshold, position
     pnl_df['gross_pnl'] = pd.to_numeric(pnl_df['gross_pnl'], errors='coerce').fillna(0)
     return pnl_df
 
+def _close_pair_arrays(closes1, closes2, window=None):
+    """Z-scores and asset1 close prices of a pair of close series aligned on the price panel's minutes.
+
+    The ratio keeps a row for every minute, NaN where either close is
+    missing, so each z-score stays on the minute it was computed at; the
+    rolling and expanding statistics skip the NaN rows, and NaN z-scores
+    never open a position.
+    """
+    z = zscore(pd.Series(closes1 / closes2), window).to_numpy(dtype=np.float64)
+    return z, closes1
+
+def _trade_close_pair(position, pnl_list, symbol_pair, z, closes, threshold, stop_loss_limit, profit_limit,
+                      maker_fee, position_size_per_pair, global_gross_cum_pnl, global_net_cum_pnl, exchange, run_id):
+    """Trade one pair of backtest_zscores_one_sided_close, recording row numbers as timestamps.
+
+    Returns the updated cumulative gross and net PnL.
+    """
+    open_rows = np.flatnonzero((z < -threshold) & (closes > 0))
+    i = 0
+    while True:
+        if not position['open']:
+            i = _next_open(open_rows, i)
+            if i < 0:
+                break
+            entry_price = closes[i]
+            position['open'] = True
+            position['entry_price'] = entry_price
+            # Use position_size_per_pair to calculate lots
+            position['lots'] = position_size_per_pair / entry_price
+            pnl_list.append({
+                'pair': symbol_pair, 'timestamp': i, 'action': 'Open Position',
+                'z_score': z[i], 'strategy': 'One-sided', 'price': entry_price, 'lots': position['lots'],
+                'gross_pnl': '', 'net_pnl': '', 'cumulative_gross_pnl': global_gross_cum_pnl, 'cumulative_net_pnl': global_net_cum_pnl, 
+                'exchange': exchange, 'run_id': run_id
+            })
+        else:
+            i, change_percentage = _next_close(closes, i, position['entry_price'], stop_loss_limit, profit_limit)
+            if i < 0:
+                break
+            exit_price = closes[i]
+            position['open'] = False
+            gross_pnl = position['lots'] * (exit_price - position['entry_price'])
+            net_pnl = gross_pnl - maker_fee * position_size_per_pair  # Use position_size_per_pair for fee calculation
+            global_gross_cum_pnl += gross_pnl
+            global_net_cum_pnl += net_pnl
+            pnl_list.append({
+                'pair': symbol_pair, 'timestamp': i, 'action': _close_action(change_percentage, stop_loss_limit),
+                'z_score': z[i], 'strategy': 'One-sided', 'price': exit_price, 'lots': position['lots'],
+                'gross_pnl': gross_pnl, 'net_pnl': net_pnl, 'cumulative_gross_pnl': global_gross_cum_pnl, 'cumulative_net_pnl': global_net_cum_pnl, 
+                'exchange': exchange, 'run_id': run_id
+            })
+        i += 1
+    return global_gross_cum_pnl, global_net_cum_pnl
+
 def backtest_zscores_one_sided_close(prices, sorted_pairs, threshold, 
-                                    position_size, stop_loss_limit, profit_limit, maker_fee, reinvest_profits, exchange, run_id):
+                                    position_size, stop_loss_limit, profit_limit, maker_fee, reinvest_profits, exchange, run_id,
+                                    window=None):
     pnl_list = []
     positions = {}
-    pivot_prices = prices.pivot(index='timestamp', columns='symbol', values='close')
+    # Pairs are matched on the panel's minutes, so symbols stamped at different
+    # seconds within a minute still line up (an exact-timestamp join found no rows)
+    panel = PricePanel.of(prices)
     global_gross_cum_pnl = 0  # Initialize cumulative PnL as a global variable
     global_net_cum_pnl = 0  # Initialize cumulative PnL as a global variable
     
@@ -199,47 +309,255 @@ def backtest_zscores_one_sided_close(prices, sorted_pairs, threshold,
         if symbol_pair not in positions:
             positions[symbol_pair] = {'open': False, 'entry_price': 0, 'lots': 0}
 
-        if asset1 in pivot_prices.columns and asset2 in pivot_prices.columns:
-            price_ratios = pivot_prices[asset1] / pivot_prices[asset2]
-            z_scores = zscore(price_ratios.dropna())
-
-            for timestamp, z_score in zip(price_ratios.index, z_scores):
-                position = positions[symbol_pair]
-
-                if not position['open'] and z_score < -threshold:
-                    entry_price = pivot_prices.loc[timestamp, asset1]
-                    if entry_price > 0:
-                        position['open'] = True
-                        position['entry_price'] = entry_price
-                        # Use position_size_per_pair to calculate lots
-                        position['lots'] = position_size_per_pair / entry_price
-                        pnl_list.append({
-                            'pair': symbol_pair, 'timestamp': timestamp, 'action': 'Open Position',
-                            'z_score': z_score, 'strategy': 'One-sided', 'price': entry_price, 'lots': position['lots'],
-                            'gross_pnl': '', 'net_pnl': '', 'cumulative_gross_pnl': global_gross_cum_pnl, 'cumulative_net_pnl': global_net_cum_pnl, 
-                            'exchange': exchange, 'run_id': run_id
-                        })
-
-                elif position['open']:
-                    exit_price = pivot_prices.loc[timestamp, asset1]
-                    change_percentage = (exit_price - position['entry_price']) / position['entry_price']
-                    if change_percentage <= -stop_loss_limit or change_percentage >= profit_limit:
-                        position['open'] = False
-                        gross_pnl = position['lots'] * (exit_price - position['entry_price'])
-                        net_pnl = gross_pnl - maker_fee * position_size_per_pair  # Use position_size_per_pair for fee calculation
-                        global_gross_cum_pnl += gross_pnl
-                        global_net_cum_pnl += net_pnl
-                        action = 'Closed with Stop Loss' if change_percentage <= -stop_loss_limit else 'Closed with Profit'
-                        pnl_list.append({
-                            'pair': symbol_pair, 'timestamp': timestamp, 'action': action,
-                            'z_score': z_score, 'strategy': 'One-sided', 'price': exit_price, 'lots': position['lots'],
-                            'gross_pnl': gross_pnl, 'net_pnl': net_pnl, 'cumulative_gross_pnl': global_gross_cum_pnl, 'cumulative_net_pnl': global_net_cum_pnl, 
-                            'exchange': exchange, 'run_id': run_id
-                        })
+        if panel.has(asset1) and panel.has(asset2):
+            z, closes = _close_pair_arrays(panel.column('close', asset1), panel.column('close', asset2), window)
+            first_record = len(pnl_list)
+            global_gross_cum_pnl, global_net_cum_pnl = _trade_close_pair(
+                positions[symbol_pair], pnl_list, symbol_pair, z, closes, threshold, stop_loss_limit, profit_limit,
+                maker_fee, position_size_per_pair, global_gross_cum_pnl, global_net_cum_pnl, exchange, run_id
+            )
+            _stamp_rows(pnl_list[first_record:], panel.minutes, 'timestamp')
+    pnl_df = pd.DataFrame(pnl_list)
+    pnl_df['gross_pnl'] = pd.to_numeric(pnl_df['gross_pnl'], errors='coerce').fillna(0)
+    return pnl_df
+
+# Parallel pair backtests. The dataset's price panel is copied once into a
+# float64 (field, symbol, minute) matrix in shared memory, which every pool
+# worker maps without copying. Workers trade their pairs with the same
+# per-pair functions as the serial backtests, each starting from zero
+# cumulative PnL; the parent merges the per-pair records and recomputes
+# the cumulative columns in the merged order.
+
+PARALLEL_STRATEGIES = ('bid_ask', 'close')
+_CLOSE, _PRESENT, _BID, _ASK = range(4)
+
+_worker_panel = None  # (shared memory, matrix, symbol -> column, strategy, window, parameters) in a pool worker
+
+def _attach_panel(name, shape, symbols, strategy, window, parameters):
+    global _worker_panel
+    block = shared_memory.SharedMemory(name=name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+    _worker_panel = (block, matrix, {symbol: k for k, symbol in enumerate(symbols)}, strategy, window, parameters)
+
+def _backtest_pair_worker(pair):
+    """Records of one pair, with panel row numbers as timestamps and per-pair cumulative PnL."""
+    _, matrix, columns, strategy, window, parameters = _worker_panel
+    asset1, asset2 = pair
+    symbol_pair = f"{asset1}-{asset2}"
+    position = {'open': False, 'entry_price': 0, 'lots': 0}
+    records = []
+    if asset1 not in columns or asset2 not in columns:
+        return records
+    k1, k2 = columns[asset1], columns[asset2]
+    try:
+        if strategy == 'bid_ask':
+            # The serial backtest inner-joins the two assets' rows
+            rows = np.flatnonzero(~np.isnan(matrix[_PRESENT, k1]) & ~np.isnan(matrix[_PRESENT, k2]))
+            if not len(rows):
+                return records
+            z = zscore(matrix[_CLOSE, k1, rows] / matrix[_CLOSE, k2, rows], window).to_numpy(dtype=np.float64)
+            _trade_bid_ask_pair(position, records, symbol_pair, z, matrix[_ASK, k1, rows], matrix[_BID, k1, rows],
+                                global_gross_cum_pnl=0, global_net_cum_pnl=0, **parameters)
+            for record in records:
+                record['timestamp'] = int(rows[record['timestamp']])
+        else:
+            z, closes = _close_pair_arrays(matrix[_CLOSE, k1], matrix[_CLOSE, k2], window)
+            _trade_close_pair(position, records, symbol_pair, z, closes,
+                              global_gross_cum_pnl=0, global_net_cum_pnl=0, **parameters)
+    except Exception as e:
+        print(f"Error processing {symbol_pair}: {e}")
+        return []
+    return records
+
+def backtest_zscores_one_sided_parallel(prices, sorted_pairs, threshold, position_size, stop_loss_limit, profit_limit,
+                                        exchange, run_id, maker_fee=0.1, reinvest=True, strategy='bid_ask',
+                                        order='timestamp', processes=None, chunksize=None, start_method=None,
+                                        window=None):
+    """Run backtest_zscores_one_sided_bid_ask or _close over ``sorted_pairs`` on a process pool.
+
+    Each pair trades exactly as in the serial backtest. With
+    ``order='pair'`` the records come back in pair order with the same
+    cumulative PnL as the serial version; with ``order='timestamp'`` the
+    per-pair streams are merged by timestamp (ties in pair order) and
+    cumulative PnL accumulates across all pairs in time.
+    """
+    if strategy not in PARALLEL_STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; choose from {', '.join(PARALLEL_STRATEGIES)}")
+    if order not in ('timestamp', 'pair'):
+        raise ValueError(f"Unknown order {order!r}; choose 'timestamp' or 'pair'")
+
+    num_pairs = len(sorted_pairs)
+    position_size_per_pair = position_size / num_pairs if num_pairs > 0 else 0
+    stop_loss_limit /= 100
+    profit_limit /= 100
+    maker_fee /= 100
+    parameters = {'threshold': threshold, 'stop_loss_limit': stop_loss_limit, 'profit_limit': profit_limit,
+                  'maker_fee': maker_fee, 'exchange': exchange, 'run_id': run_id}
+    if strategy == 'bid_ask':
+        parameters.update(adjusted_position_size=position_size_per_pair, reinvest=reinvest)
+        fields = ['close', 'present', 'bid', 'ask']
+    else:
+        parameters.update(position_size_per_pair=position_size_per_pair)
+        fields = ['close']
+
+    panel = PricePanel.of(prices)
+    symbols = list(panel.symbols)
+    shape = (len(fields), len(symbols), len(panel.minutes))
+    block = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        for f, field in enumerate(fields):
+            # Transposed so every symbol's series is contiguous
+            matrix[f] = (np.where(panel.present, 1.0, np.nan) if field == 'present' else panel.fields[field]).T
+        del matrix
+
+        pairs = list(zip(sorted_pairs['Asset1'], sorted_pairs['Asset2']))
+        context = mp.get_context(start_method)
+        processes = processes or context.cpu_count()
+        chunksize = chunksize or max(1, len(pairs) // (processes * 4))
+        with context.Pool(processes, initializer=_attach_panel,
+                          initargs=(block.name, shape, symbols, strategy, window, parameters)) as pool:
+            streams = pool.map(_backtest_pair_worker, pairs, chunksize)
+    finally:
+        block.close()
+        block.unlink()
+
+    for (asset1, _), stream in zip(pairs, streams):
+        _stamp_rows(stream, panel.timestamps(asset1) if strategy == 'bid_ask' else panel.minutes, 'timestamp')
+    if order == 'timestamp':
+        pnl_list = list(heapq.merge(*streams, key=lambda record: record['timestamp']))
+    else:
+        pnl_list = [record for stream in streams for record in stream]
+
+    global_gross_cum_pnl = 0
+    global_net_cum_pnl = 0
+    for record in pnl_list:
+        closed = record['action'] != 'Open Position'
+        if closed and strategy == 'close':
+            # The close backtest reports cumulative PnL including the row's own
+            global_gross_cum_pnl += record['gross_pnl']
+            global_net_cum_pnl += record['net_pnl']
+        record['cumulative_gross_pnl'] = global_gross_cum_pnl
+        record['cumulative_net_pnl'] = global_net_cum_pnl
+        if closed and strategy == 'bid_ask':
+            global_gross_cum_pnl += record['gross_pnl']
+            global_net_cum_pnl += record['net_pnl']
+
     pnl_df = pd.DataFrame(pnl_list)
     pnl_df['gross_pnl'] = pd.to_numeric(pnl_df['gross_pnl'], errors='coerce').fillna(0)
     return pnl_df
 
+# Parameter sweeps. Ratios and z-scores depend only on the pair, so they
+# are computed once per pair; the trade path depends on threshold, stop
+# loss and profit limit and is walked once per combination of those; the
+# maker fee only scales PnL, so every fee is evaluated at once on the
+# same trades as a vectorized (fee, trade) pass.
+
+SWEEP_STRATEGIES = ('bid_ask', 'close')
+
+def _trade_rows(open_rows, exit_prices, entry_prices, stop_loss_limit, profit_limit):
+    """Open and close rows of every completed trade of the one-sided state machine."""
+    opens, closes = [], []
+    i = 0
+    while True:
+        i = _next_open(open_rows, i)
+        if i < 0:
+            break
+        j, _ = _next_close(exit_prices, i + 1, entry_prices[i], stop_loss_limit, profit_limit)
+        if j < 0:
+            break
+        opens.append(i)
+        closes.append(j)
+        i = j + 1
+    return np.array(opens, dtype=np.int64), np.array(closes, dtype=np.int64)
+
+def _day_numbers(timestamps):
+    """UTC days since the epoch of ``timestamps``."""
+    stamps = pd.DatetimeIndex(pd.to_datetime(timestamps, utc=True)).tz_convert(None)
+    return stamps.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def _sweep_pairs(prices, sorted_pairs, strategy, window):
+    """(z-scores, entry prices, exit prices, rows that may open, day numbers) of every pair with data."""
+    if strategy == 'bid_ask':
+        for asset1, asset2 in zip(sorted_pairs['Asset1'], sorted_pairs['Asset2']):
+            merged_prices, z_scores = merge_and_calculate_ratios(prices, asset1, asset2, window)
+            if len(z_scores):
+                yield (np.asarray(z_scores, dtype=np.float64),
+                       merged_prices['ask_asset1'].to_numpy(dtype=np.float64),
+                       merged_prices['bid_asset1'].to_numpy(dtype=np.float64),
+                       True, _day_numbers(merged_prices['timestamp_asset1']))
+    else:
+        panel = PricePanel.of(prices)
+        days = _day_numbers(panel.minutes)
+        for asset1, asset2 in zip(sorted_pairs['Asset1'], sorted_pairs['Asset2']):
+            if panel.has(asset1) and panel.has(asset2):
+                z, closes = _close_pair_arrays(panel.column('close', asset1), panel.column('close', asset2), window)
+                yield z, closes, closes, closes > 0, days[:len(z)]
+
+def sweep_zscores_one_sided(prices, sorted_pairs, thresholds, stop_loss_limits, profit_limits, maker_fees,
+                            position_size, strategy='bid_ask', reinvest=True, periods_per_year=365, window=None):
+    """Evaluate a one-sided z-score backtest over the full parameter grid.
+
+    Trades follow backtest_zscores_one_sided_bid_ask (``reinvest`` as
+    there) or backtest_zscores_one_sided_close, with limits and fees in
+    percent as those take them. Returns one row per combination of
+    threshold, stop_loss_limit, profit_limit and maker_fee with the number
+    of completed trades, total gross and net PnL, and the Sharpe ratio of
+    daily net PnL relative to ``position_size``, annualized by
+    ``periods_per_year`` (NaN when the daily PnL does not vary).
+    ``window`` is the z-score window, as in stats_util.zscore.
+    """
+    if strategy not in SWEEP_STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; choose from {', '.join(SWEEP_STRATEGIES)}")
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    stop_loss_limits = np.asarray(stop_loss_limits, dtype=np.float64)
+    profit_limits = np.asarray(profit_limits, dtype=np.float64)
+    fees = np.asarray(maker_fees, dtype=np.float64)
+    limits = list(itertools.product(range(len(thresholds)), range(len(stop_loss_limits)), range(len(profit_limits))))
+    position_size_per_pair = position_size / len(sorted_pairs) if len(sorted_pairs) > 0 else 0
+    compound = reinvest and strategy == 'bid_ask'
+
+    pairs = list(_sweep_pairs(prices, sorted_pairs, strategy, window))
+    first_day = min((days.min() for *_, days in pairs if len(days)), default=0)
+    last_day = max((days.max() for *_, days in pairs if len(days)), default=0)
+    trades = np.zeros(len(limits), dtype=np.int64)
+    gross = np.zeros((len(limits), len(fees)))
+    net = np.zeros((len(limits), len(fees)))
+    daily_net = np.zeros((len(limits), len(fees), last_day - first_day + 1))
+
+    fee_rates = fees[:, None] / 100
+    for z, entry_prices, exit_prices, tradable, days in pairs:
+        open_rows = [np.flatnonzero((z < -threshold) & tradable) for threshold in thresholds]
+        for c, (t, s, p) in enumerate(limits):
+            opens, closes = _trade_rows(open_rows[t], exit_prices, entry_prices,
+                                        stop_loss_limits[s] / 100, profit_limits[p] / 100)
+            if not len(opens):
+                continue
+            # Gross return of each trade on the capital it was opened with
+            returns = (exit_prices[closes] - entry_prices[opens]) / entry_prices[opens]
+            if compound:
+                # Reinvesting grows each trade's capital by the previous trades' net returns
+                growth = np.cumprod(1 + returns[None, :] - fee_rates, axis=1)
+                sizes = position_size_per_pair * np.concatenate([np.ones((len(fees), 1)), growth[:, :-1]], axis=1)
+            else:
+                sizes = np.full((len(fees), len(opens)), float(position_size_per_pair))
+            trade_gross = sizes * returns[None, :]
+            trade_net = trade_gross - fee_rates * sizes
+            trades[c] += len(opens)
+            gross[c] += trade_gross.sum(axis=1)
+            net[c] += trade_net.sum(axis=1)
+            np.add.at(daily_net[c], (slice(None), days[closes] - first_day), trade_net)
+
+    daily_returns = daily_net / position_size if position_size else daily_net
+    with np.errstate(invalid='ignore', divide='ignore'):
+        volatility = daily_returns.std(axis=2, ddof=1) if daily_returns.shape[2] > 1 else np.full(net.shape, np.nan)
+        sharpe = np.where(volatility > 0, daily_returns.mean(axis=2) / volatility * np.sqrt(periods_per_year), np.nan)
+
+    rows = [(thresholds[t], stop_loss_limits[s], profit_limits[p], fee, trades[c], gross[c, f], net[c, f], sharpe[c, f])
+            for c, (t, s, p) in enumerate(limits) for f, fee in enumerate(fees)]
+    return pd.DataFrame(rows, columns=['threshold', 'stop_loss_limit', 'profit_limit', 'maker_fee',
+                                       'trades', 'gross_pnl', 'net_pnl', 'sharpe'])
+
 def get_correlation_pairs(returns):
     # Compute the correlation matrix
     correlation_matrix = returns.corr()
@@ -282,10 +600,12 @@ def calculate_returns(all_data):
 
     return returns
     
-def backtest_zscores_one_sided_ba_synthetic(prices, sorted_pairs, threshold, position_size, stop_loss_limit, profit_limit, maker_fee=0.1):
+def backtest_zscores_one_sided_ba_synthetic(prices, sorted_pairs, threshold, position_size, stop_loss_limit, profit_limit, maker_fee=0.1,
+                                            window=None):
     pnl_list = []
     positions = {}
-    pivot_prices = prices.pivot(index='timestamp', columns='symbol', values='close')
+    # Pairs line up on the minute, as in backtest_zscores_one_sided_close
+    panel = PricePanel.of(prices)
     global_gross_cum_pnl = 0  # Initialize cumulative PnL as a global variable
     global_net_cum_pnl = 0  # Initialize cumulative PnL as a global variable
     stop_loss_limit = stop_loss_limit / 100
@@ -301,42 +621,46 @@ def backtest_zscores_one_sided_ba_synthetic(prices, sorted_pairs, threshold, pos
         if symbol_pair not in positions:
             positions[symbol_pair] = {'open': False, 'entry_price': 0, 'lots': 0}
 
-        if asset1 in pivot_prices.columns and asset2 in pivot_prices.columns:
-            price_ratios = pivot_prices[asset1] / pivot_prices[asset2]
-            z_scores = zscore(price_ratios.dropna())
-
-            for timestamp, z_score in zip(price_ratios.index, z_scores):
-                position = positions[symbol_pair]
-
-                if not position['open'] and z_score < -threshold:
-                    entry_price = pivot_prices.loc[timestamp, asset1]
-                    entry_price = get_ask(entry_price, spread)
-                    
-                    if entry_price > 0:
-                        position['open'] = True
-                        position['entry_price'] = entry_price
-                        position['lots'] = position_size / entry_price
-                        pnl_list.append({
-                            'Pair': symbol_pair, 'Timestamp': timestamp, 'Action': 'Open Position',
-                            'Z-Score': z_score, 'Strategy': 'One-sided', 'Price': entry_price, 'Lots': position['lots'], 'Gross PnL': '', 'Net PnL': '',
-                            'Cumulative Gross PnL': global_gross_cum_pnl, 'Cumulative Net PnL': global_net_cum_pnl
-                        })
-
-                elif position['open']:
-                    exit_price = pivot_prices.loc[timestamp, asset1]
-                    exit_price = get_bid(entry_price, spread)
-                    change_percentage = (exit_price - position['entry_price']) / position['entry_price']                    
-                    if change_percentage <= -stop_loss_limit or change_percentage >= profit_limit:
-                        position['open'] = False
-                        gross_pnl = position['lots'] * (exit_price - position['entry_price'])
-                        net_pnl = position['lots'] * (exit_price - position['entry_price']) - maker_fee * position_size
-                        global_gross_cum_pnl += gross_pnl
-                        global_net_cum_pnl += net_pnl
-                        action = 'Closed with Stop Loss' if change_percentage <= -stop_loss_limit else 'Closed with Profit'
-                        pnl_list.append({
-                            'Pair': symbol_pair, 'Timestamp': timestamp, 'Action': action,
-                            'Z-Score': z_score, 'Strategy': 'One-sided', 'Price': exit_price, 'Gross PnL': gross_pnl, 'Net PnL': net_pnl,
-                            'Cumulative Gross PnL': global_gross_cum_pnl, 'Cumulative Net PnL': global_net_cum_pnl
-                        })
+        if panel.has(asset1) and panel.has(asset2):
+            z, closes = _close_pair_arrays(panel.column('close', asset1), panel.column('close', asset2), window)
+            asks = get_ask(closes, spread)
+            open_rows = np.flatnonzero((z < -threshold) & (asks > 0))
+            position = positions[symbol_pair]
+            first_record = len(pnl_list)
+
+            i = 0
+            while True:
+                if not position['open']:
+                    i = _next_open(open_rows, i)
+                    if i < 0:
+                        break
+                    entry_price = asks[i]
+                    position['open'] = True
+                    position['entry_price'] = entry_price
+                    position['lots'] = position_size / entry_price
+                    pnl_list.append({
+                        'Pair': symbol_pair, 'Timestamp': i, 'Action': 'Open Position',
+                        'Z-Score': z[i], 'Strategy': 'One-sided', 'Price': entry_price, 'Lots': position['lots'], 'Gross PnL': '', 'Net PnL': '',
+                        'Cumulative Gross PnL': global_gross_cum_pnl, 'Cumulative Net PnL': global_net_cum_pnl
+                    })
+                else:
+                    # The synthetic exit is the bid around the entry, the same on every row
+                    exit_price = get_bid(position['entry_price'], spread)
+                    i, change_percentage = _next_close(np.broadcast_to(exit_price, len(z)), i, position['entry_price'],
+                                                       stop_loss_limit, profit_limit)
+                    if i < 0:
+                        break
+                    position['open'] = False
+                    gross_pnl = position['lots'] * (exit_price - position['entry_price'])
+                    net_pnl = position['lots'] * (exit_price - position['entry_price']) - maker_fee * position_size
+                    global_gross_cum_pnl += gross_pnl
+                    global_net_cum_pnl += net_pnl
+                    pnl_list.append({
+                        'Pair': symbol_pair, 'Timestamp': i, 'Action': _close_action(change_percentage, stop_loss_limit),
+                        'Z-Score': z[i], 'Strategy': 'One-sided', 'Price': exit_price, 'Gross PnL': gross_pnl, 'Net PnL': net_pnl,
+                        'Cumulative Gross PnL': global_gross_cum_pnl, 'Cumulative Net PnL': global_net_cum_pnl
+                    })
+                i += 1
+            _stamp_rows(pnl_list[first_record:], panel.minutes, 'Timestamp')
 
     return pd.DataFrame(pnl_list)
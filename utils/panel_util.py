@@ -0,0 +1,97 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# Long-format prices (one row per timestamp and symbol) pivoted once into
+# minute-by-symbol matrices, so that pairing two symbols is a column slice
+# instead of a boolean mask, copy, timestamp parse and merge over the whole
+# frame. PricePanel.of() memoizes the panel per prices DataFrame for the
+# backtests and z-score plots.
+
+PANEL_FIELDS = ('close', 'bid', 'ask')
+
+class PricePanel:
+    """Minute-aligned wide view of long-format prices.
+
+    Rows are the minutes (timestamps floored to the minute) at which any
+    symbol has a row, in order, and columns are the symbols. ``fields``
+    maps each of close, bid and ask present in the data to a float64
+    matrix stored column-major, so a symbol's series is a contiguous
+    slice, and ``present`` marks the minutes each symbol has a row. If a
+    symbol has several rows in a minute the last one is kept.
+    """
+    _cache = {}  # id(prices) -> (weak reference to prices, shape, panel)
+
+    def __init__(self, prices):
+        stamps = pd.DatetimeIndex(pd.to_datetime(prices['timestamp']))
+        rows, self.minutes = pd.factorize(stamps.floor('min'), sort=True)
+        columns, self.symbols = pd.factorize(prices['symbol'], sort=True)
+        shape = (len(self.minutes), len(self.symbols))
+        # Rows without a timestamp or symbol have no cell
+        keep = np.flatnonzero((rows >= 0) & (columns >= 0))
+        rows, columns = rows[keep], columns[keep]
+
+        # Scatter every row into its (minute, symbol) cell; a later row overwrites an earlier one
+        self.present = np.zeros(shape, dtype=bool, order='F')
+        self.present[rows, columns] = True
+        self._stamps = np.full(shape, np.iinfo(np.int64).min, dtype=np.int64, order='F')
+        self._stamps[rows, columns] = stamps.asi8[keep]
+        self._stamp_unit = stamps.unit
+        self._stamp_tz = stamps.tz
+        self.fields = {}
+        for field in PANEL_FIELDS:
+            if field in prices.columns:
+                matrix = np.full(shape, np.nan, order='F')
+                matrix[rows, columns] = prices[field].to_numpy(dtype=np.float64)[keep]
+                self.fields[field] = matrix
+        self._columns = {symbol: k for k, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def of(cls, prices):
+        """The panel of ``prices``, built on first use and reused while that DataFrame lives.
+
+        Reuse is keyed on the DataFrame object and its shape, so build a
+        new PricePanel after changing a frame's values in place.
+        """
+        key = id(prices)
+        cached = cls._cache.get(key)
+        if cached is not None and cached[0]() is prices and cached[1] == prices.shape:
+            return cached[2]
+        panel = cls(prices)
+        cls._cache[key] = (weakref.ref(prices, lambda _: cls._cache.pop(key, None)), prices.shape, panel)
+        return panel
+
+    def has(self, symbol):
+        return symbol in self._columns
+
+    def column(self, field, symbol):
+        """``field`` prices of ``symbol`` for every minute, NaN where it has none (a view)."""
+        return self.fields[field][:, self._columns[symbol]]
+
+    def timestamps(self, symbol):
+        """``symbol``'s own timestamp at every minute, NaT where it has none."""
+        index = pd.DatetimeIndex(self._stamps[:, self._columns[symbol]].view(f'M8[{self._stamp_unit}]'))
+        return index.tz_localize('UTC').tz_convert(self._stamp_tz) if self._stamp_tz is not None else index
+
+    def pair_rows(self, asset1, asset2):
+        """Minutes, as row numbers, at which both symbols have a row."""
+        if not (self.has(asset1) and self.has(asset2)):
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(self.present[:, self._columns[asset1]] & self.present[:, self._columns[asset2]])
+
+    def merge(self, asset1, asset2):
+        """Inner join of two symbols' rows on the minute, with the merge_and_calculate_ratios column names."""
+        rows = self.pair_rows(asset1, asset2)
+        columns = ['timestamp', 'symbol', *self.fields]
+        if not len(rows):
+            return pd.DataFrame(columns=[column + suffix for suffix in ('_asset1', '_asset2') for column in columns]
+                                + ['merge_key'])
+        merged = {}
+        for suffix, symbol in (('_asset1', asset1), ('_asset2', asset2)):
+            merged['timestamp' + suffix] = self.timestamps(symbol)[rows]
+            merged['symbol' + suffix] = symbol
+            for field in self.fields:
+                merged[field + suffix] = self.column(field, symbol)[rows]
+        merged['merge_key'] = self.minutes[rows]
+        return pd.DataFrame(merged)
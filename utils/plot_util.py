@@ -6,6 +6,8 @@ from plotly.subplots import make_subplots
 import numpy as np
 import plotly.express as px
 import statsmodels.api as sm
+from utils.stats_util import zscore
+from utils.panel_util import PricePanel
 
 def plot_benchmark_returns(cumulative_portfolio_returns, cumulative_benchmark_returns, benchmark_ticker='SPY'):
     # Normalize the returns to start at 1 (100%) for better comparison
@@ -63,29 +65,25 @@ def plot_equity_line(signals):
 
     st.plotly_chart(fig)
 
-def plot_zscore(all_data, asset1, asset2):
-    # Filter data for each asset
-    data_asset1 = all_data[all_data['symbol'] == asset1]
-    data_asset2 = all_data[all_data['symbol'] == asset2]
-
-    # Ensure matching timestamps
-    merged_data = pd.merge(data_asset1, data_asset2, on='timestamp', suffixes=('_asset1', '_asset2'))
+def plot_zscore(all_data, asset1, asset2, window=None):
+    # Both assets' rows at matching minutes, sliced from the dataset's price panel
+    merged_data = PricePanel.of(all_data).merge(asset1, asset2)
 
     # Calculate the ratio of the two assets' prices
     ratios = merged_data['close_asset1'] / merged_data['close_asset2']
 
     # Calculate z-score
-    z_scores = zscore(ratios)
+    z_scores = zscore(ratios, window)
 
     # Create a plot
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=merged_data['timestamp'], y=z_scores, mode='lines', name='Z-Score'))
+    fig.add_trace(go.Scatter(x=merged_data['merge_key'], y=z_scores, mode='lines', name='Z-Score'))
     fig.update_layout(title=f'Z-Score Over Time for {asset1} vs {asset2}', xaxis_title='Timestamp', yaxis_title='Z-Score')
 
     # Display the plot in Streamlit
     st.plotly_chart(fig)
 
-def plot_all_zscores(all_data, sorted_pairs, page, pairs_per_page=5, subplot_height=300):
+def plot_all_zscores(all_data, sorted_pairs, page, pairs_per_page=5, subplot_height=300, window=None):
     # Start and end indices for the current page
     start_index = page * pairs_per_page
     end_index = start_index + pairs_per_page
@@ -98,21 +96,17 @@ def plot_all_zscores(all_data, sorted_pairs, page, pairs_per_page=5, subplot_hei
         asset1 = row['Asset1']
         asset2 = row['Asset2']
 
-        # Filter data for each asset
-        data_asset1 = all_data[all_data['symbol'] == asset1]
-        data_asset2 = all_data[all_data['symbol'] == asset2]
-
-        # Ensure matching timestamps
-        merged_data = pd.merge(data_asset1, data_asset2, on='timestamp', suffixes=('_asset1', '_asset2'))
+        # Both assets' rows at matching minutes, sliced from the dataset's price panel
+        merged_data = PricePanel.of(all_data).merge(asset1, asset2)
 
         # Calculate the ratio of the two assets' prices and z-score
         ratios = merged_data['close_asset1'] / merged_data['close_asset2']
-        z_scores = zscore(ratios)
+        z_scores = zscore(ratios, window)
         
         subplot_title = f'{asset1} vs {asset2}'
         fig.update_yaxes(title=subplot_title, row=i+1, col=1)
         # Add trace to the subplot
-        fig.add_trace(go.Scatter(x=merged_data['timestamp'], y=z_scores, mode='lines', name=f'{asset1} vs {asset2}'), row=i+1, col=1)
+        fig.add_trace(go.Scatter(x=merged_data['merge_key'], y=z_scores, mode='lines', name=f'{asset1} vs {asset2}'), row=i+1, col=1)
 
     # Update layout
     fig.update_layout(height=subplot_height*len(pairs_subset), width=800, title_text="Z-Scores for Asset Pairs")
@@ -267,6 +261,3 @@ def plot_correlations(returns):
     st.dataframe(sorted_pairs[['Asset1', 'Asset2', 'Correlation']])
     return sorted_pairs
 
-# Calculate z-score
-def zscore(series):
-    return (series - series.mean()) / np.std(series)
@@ -1,3 +1,7 @@
+import math
+from collections import deque
+
+import numpy as np
 import pandas as pd
 
 def calculate_returns(all_data):
@@ -34,4 +38,85 @@ def sort_correlations(corr_matrix):
     sorted_pairs = corr_pairs.sort_values(by='Absolute Correlation', ascending=False)
 
     # Display the sorted list of correlated pairs in Streamlit
-    return sorted_pairs
\ No newline at end of file
+    return sorted_pairs
+
+# Z-scores without look-ahead. Each value is scored against the mean and
+# population std of the trailing ``window`` values, itself included, or of
+# every value so far when ``window`` is None, as in vbt_util. zscore() does
+# a whole series at once for backtests and plots; RollingZScore gives the
+# same values one price at a time for a live loop.
+
+def zscore(series, window=None):
+    """Z-score of each value against the values up to and including it."""
+    series = series if isinstance(series, pd.Series) else pd.Series(series)
+    stats = series.expanding(min_periods=1) if window is None else series.rolling(window, min_periods=1)
+    std = stats.std(ddof=0)
+    return (series - stats.mean()) / std.replace(0, np.nan)
+
+class RollingZScore:
+    """Streaming z-score with O(1) updates.
+
+    Mean and variance are kept with Welford's update, and with its inverse
+    as a value leaves a ``window``-long ring buffer. Removals lose
+    precision when the window's values are close together, so every
+    ``window`` updates the statistics are recomputed from the buffer,
+    which keeps updates amortized O(1). NaN values take a slot in the
+    window but stay out of the statistics, as in pandas windows.
+    """
+    def __init__(self, window=None):
+        if window is not None and window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        self.window = window
+        self.values = deque(maxlen=window) if window is not None else None
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+
+    @property
+    def std(self):
+        return math.sqrt(max(self._m2, 0.0) / self.count) if self.count else math.nan
+
+    def update(self, value):
+        """Add ``value`` and return its z-score; NaN while the std is zero."""
+        value = float(value)
+        if self.values is not None:
+            if len(self.values) == self.window:
+                self._remove(self.values[0])
+            self.values.append(value)
+            self._updates += 1
+        if self._updates == self.window:
+            self._recompute()
+        elif not math.isnan(value):
+            self._add(value)
+        if math.isnan(value):
+            return math.nan
+        std = self.std
+        return (value - self.mean) / std if std > 0 else math.nan
+
+    def _add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def _recompute(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._updates = 0
+        for value in self.values:
+            if not math.isnan(value):
+                self._add(value)
+
+    def _remove(self, value):
+        if math.isnan(value):
+            return
+        self.count -= 1
+        if not self.count:
+            self.mean = 0.0
+            self._m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self._m2 -= delta * (value - self.mean)
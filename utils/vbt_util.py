@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 import numpy as np
 import re
 import numpy as np
+from utils.stats_util import zscore
 
 def simulate_trades(entries, prices, stop_loss_pct, take_profit_pct):
     try:
@@ -62,9 +63,7 @@ def backtest_zscore(asset1, asset2, window, threshold, position_size, stop_loss_
 
         # Calculate the price ratio using aligned data
         price_ratio = asset1_data_aligned / asset2_data_aligned
-        mean = price_ratio.rolling(window, min_periods=1).mean()
-        std = price_ratio.rolling(window, min_periods=1).std(ddof=0)
-        z_scores = (price_ratio - mean) / std.replace(0, np.nan)
+        z_scores = zscore(price_ratio, window)
 
         # Entry and exit signals based on Z-Score threshold
         entries = z_scores < -threshold